@@ -1,10 +1,33 @@
 import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
 import os
-from pathlib import Path
-from agents import Agent, ItemHelpers, Runner, function_tool, ModelSettings
+import time
+from agents import Agent, ItemHelpers, Runner, RunConfig, function_tool, ModelSettings
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
 
-SYSTEM_PROMPT = """ 
-# Archaeologist Agent Version 1.2
+from artifact_index import DEFAULT_MAX_BYTES, DEFAULT_MAX_TOKENS, format_response
+from artifact_store import DATA_DIR, STORE, artifact_id
+from caching import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS, ResponseCache, memoize_tool
+from conversation import active_conversation, dedupe_tool_output
+from fact_sheets import fact_sheets_for
+from instrumentation import record_span, span, traced_tool
+from knowledge_graph import format_graph_response, query_graph
+from privacy import REDACTION, privacy_filter, redact_tool_output
+from router import route, tier_models
+from semantic_index import TOP_K, retrieve
+from tools import PREDEFINED_ARTIFACTS
+
+logger = logging.getLogger(__name__)
+
+# Every prompt variant is static text: nothing per run or per user goes into the
+# instructions, so instructions + tool schemas form a byte-identical prefix that the
+# provider can serve from its prompt cache. The question only appears in the input.
+SYSTEM_PROMPTS = {}
+
+SYSTEM_PROMPTS["v1.2"] = """# Archaeologist Agent Version 1.2
 
 ## Overview
 - You are an Archaeologist Agent that can access a list of artifacts.
@@ -13,7 +36,7 @@ SYSTEM_PROMPT = """
 - Maintain an optimistic, kind, patient, and empathetic tone.
 
 ## Primary Behavior Rules
-- IMPORTANT: Only call the tool once per user interaction.
+- IMPORTANT: Only call a tool once per user interaction.
 - Be super optimistic and supportive.
 - Only present information you know for a fact (no hallucination).
 - Act as a detail-oriented informant who explains both what you're saying and why.
@@ -22,6 +45,7 @@ SYSTEM_PROMPT = """
 
 ## Tools and Data Handling
 - Prioritize tool outputs: when a question relates to artifacts, use the tools first.
+- For questions that compare or connect several artifacts (shared materials, sites, years, finds or uses), use `query_artifact_graph`; for details about specific artifacts, use `get_artifact_details`.
 - If tools lack an answer, use training data as a fallback — but you MUST cite your sources
 
 ## Response Structure & Style
@@ -45,10 +69,7 @@ SYSTEM_PROMPT = """
   - If artifact names or specifications seem incorrect, propose a likely correction or ask for clarification.
 
 ## Location & Privacy
-- Do not reveal the location of an artifact unless it is explicitly available in a public museum listing:
-- If asked about locations that are not public, respond with:
-  - "The information regarding the location of the artifacts is not available to the public."
-- If the artifact location is public, you may say so.
+- Locations that are not public are removed from tool data. If asked for a location you do not have, respond with: "The information regarding the location of the artifacts is not available to the public."
 
 ## Training Data Policy (Fallback)
 - Only use your training data as a fallback (if tools don't answer).
@@ -80,72 +101,357 @@ SYSTEM_PROMPT = """
 - Check user grammar and spelling: correct if needed or ask for clarification.
 - Keep responses short and focused; split longer answers into readable chunks.
 - Use clarifying follow-up questions when the user's intent is unclear.
+"""
+
+# About half the tokens of v1.2 with the same rules, merged and without the duplicated ones
+SYSTEM_PROMPTS["v1.2-lite"] = """# Archaeologist Agent Version 1.2-lite
+
+You answer questions about a repository of artifacts. Be accurate, optimistic, kind and concise (under 500 words), like explaining to a friend.
+
+## Tools
+- Call at most one tool per question. Use `query_artifact_graph` for questions that compare or connect artifacts (shared materials, sites, years, finds or uses) and `get_artifact_details` for specific artifacts.
+- Answer from tool output. Only if the tools have nothing, fall back to training data, limited to language or translation context, and say which parts came from it and why.
+- Never invent facts. If unsure, say what you don't know.
 
+## Answer format (markdown)
+### Summary
+1-2 sentences.
+### Facts
+Facts from the tool data, quantities as numbers.
+### Explanation
+Why the answer is correct and how it was obtained.
+
+Use dashes for lists, paragraphs of 1-3 sentences and plain words (define jargon briefly).
+
+## Unknowns
+- If you cannot answer, say "I don't know.", explain what is missing and why, and suggest a next step or a clarifying question.
+- If a name or question seems misspelled, guess the intent and correct it politely, or ask which artifact was meant.
+
+## Location & Privacy
+- If asked for a location the tools do not give, reply: "The information regarding the location of the artifacts is not available to the public."
 """
 
+# Prompt variant of this deployment: "v1.2" (default) or "v1.2-lite"
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "v1.2")
+if PROMPT_VARIANT not in SYSTEM_PROMPTS:
+    raise ValueError(f"Unknown PROMPT_VARIANT {PROMPT_VARIANT!r}; choose one of {sorted(SYSTEM_PROMPTS)}")
+SYSTEM_PROMPT = SYSTEM_PROMPTS[PROMPT_VARIANT]
+
 
 # https://platform.openai.com/docs/models/gpt-5-nano
 # "gpt-5-nano"
 LLM_MODEL = "gpt-4.1" 
 
-DATA_FILE = Path(__file__).parent / "data" / "string_list.json"
+# "openai" (default) or "stub" for the offline model in stub_model.py
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "openai").lower()
+
+# Upper bounds for a single tool response sent back to the model
+TOOL_MAX_BYTES = int(os.getenv("TOOL_MAX_BYTES", DEFAULT_MAX_BYTES))
+TOOL_MAX_TOKENS = int(os.getenv("TOOL_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+
+# Whole-answer cache; set RESPONSE_CACHE_DISK=1 to keep answers across restarts
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+    disk_path=DATA_DIR / "response_cache.db" if os.getenv("RESPONSE_CACHE_DISK") == "1" else None,
+)
+
+# Repaint the streamed answer at most every STREAM_FLUSH_MS, or after STREAM_FLUSH_CHARS new characters
+STREAM_FLUSH_MS = int(os.getenv("STREAM_FLUSH_MS", "100"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "400"))
+
+# Number of description passages returned for a question (needs numpy)
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", TOP_K))
+
+# How long the provider keeps the cached prompt prefix: "in_memory" (provider default)
+# or "24h" (extended caching, on models that support it)
+PROMPT_CACHE_RETENTION = os.getenv("PROMPT_CACHE_RETENTION") or None
+
+@function_tool
+@traced_tool
+@dedupe_tool_output
+@memoize_tool(version=STORE.data_version)
+@redact_tool_output(PREDEFINED_ARTIFACTS)
+def get_artifact_details(artifact_name: str, question: str = "", include_description: bool = False) -> str:
+    """Look up an artifact in the data repository by name (misspellings and partial names are fine).
+
+    Returns JSON with a fact sheet per matching artifact (measurements, years, materials,
+    associated finds, proposed uses, and whether its location is public), or a ranked
+    list of candidate names when the name is ambiguous or unknown. When a question is
+    given, the description passages most relevant to it are added.
+
+    Args:
+        artifact_name: Name of the artifact (or artifacts) the user is asking about.
+        question: The user's question, used to pick the most relevant description passages.
+        include_description: Return the full records with their long descriptions instead of
+            fact sheets. Only set this when the fact sheets and passages do not answer the question.
+    """
+    try:
+        matches, candidates = STORE.lookup(artifact_name)
+        if not matches and not candidates:
+            # Not a known name: fall back to full-text search over summaries and descriptions
+            candidates = STORE.search(artifact_name)
+        passages = None
+        if question.strip():
+            ids = {artifact_id(a) for a in matches} or None
+            passages = retrieve(question, RETRIEVAL_TOP_K, ids) or None
+        sheets = None if include_description else fact_sheets_for(matches)
+    except Exception:
+        return ""
+    return format_response(artifact_name, matches, candidates, TOOL_MAX_BYTES, TOOL_MAX_TOKENS, passages, sheets)
+
 
 @function_tool
-def get_artifact_details(artifact_name: str) -> str:
-    """Return the raw contents of the persisted `string_list.json` or empty string."""
+@traced_tool
+@dedupe_tool_output
+@memoize_tool(version=STORE.data_version)
+@redact_tool_output(PREDEFINED_ARTIFACTS)
+def query_artifact_graph(question: str) -> str:
+    """Answer relational questions across artifacts from the artifact knowledge graph.
+
+    Use this for questions that connect or compare artifacts: shared materials, sites,
+    excavation years, associated finds or hypothesized functions. Returns compact JSON
+    facts as [subject, relation, object] triples (plus shared entities for comparisons)
+    instead of full descriptions.
+
+    Args:
+        question: The user's question.
+    """
     try:
-        return DATA_FILE.read_text(encoding="utf-8") if DATA_FILE.exists() else ""
+        response = query_graph(question, PREDEFINED_ARTIFACTS)
     except Exception:
         return ""
+    return format_graph_response(response, TOOL_MAX_BYTES, TOOL_MAX_TOKENS)
+
 
+# Keep this order fixed: the tool schemas are part of the cached prompt prefix
+TOOLS = [get_artifact_details, query_artifact_graph]
+
+
+def prompt_cache_key(model=LLM_MODEL, instructions=SYSTEM_PROMPT, tools=TOOLS):
+    """Stable routing key for the static prompt prefix (model, instructions and tool schemas).
+
+    Without it the SDK generates a new key for every run, which spreads identical
+    prefixes over different cache machines; with it every run of this deployment
+    shares one key, and the key changes exactly when the prefix does.
+    """
+    schemas = json.dumps([[t.name, t.description, t.params_json_schema] for t in tools], sort_keys=True)
+    digest = hashlib.sha256(f"{model}\x1f{instructions}\x1f{schemas}".encode("utf-8")).hexdigest()[:16]
+    return f"archeologist-{PROMPT_VARIANT}-{digest}"
+
+
+PROMPT_CACHE_KEY = prompt_cache_key()
 
 agent = Agent(
     name="Archeologist Agent",
     instructions=SYSTEM_PROMPT,
-    tools=[get_artifact_details], 
+    tools=TOOLS,
     model=LLM_MODEL,
+    model_settings=ModelSettings(
+        prompt_cache_retention=PROMPT_CACHE_RETENTION,
+        extra_args={"prompt_cache_key": PROMPT_CACHE_KEY},
+    ),
     )
 
-async def run_agent(question: str = None, output_container=None) -> str:
-    import streamlit as st
 
-    # Use streamlit session_state if available, otherwise print to console
-    def log_message(message: str):
-        if 'agent_output' in st.session_state:
-            st.session_state['agent_output'] += message + "\n"
+def agent_for_model(model):
+    """The agent with another model (and the prompt cache key of that model's prefix)."""
+    if model == LLM_MODEL:
+        return agent
+    settings = dataclasses.replace(agent.model_settings, extra_args={"prompt_cache_key": prompt_cache_key(model)})
+    return agent.clone(model=model, model_settings=settings)
+
+
+# One agent per model tier of the router (just `agent` when routing is off)
+TIER_MODELS = tier_models(LLM_MODEL)
+TIER_AGENTS = {tier: agent_for_model(model) for tier, model in TIER_MODELS.items()}
+
+
+def build_run_config():
+    """Run settings for the configured model provider (None keeps the SDK defaults)."""
+    if MODEL_PROVIDER == "stub":
+        from stub_model import StubModelProvider
+        # No network at all: the stub needs no API key and traces are not exported
+        return RunConfig(model_provider=StubModelProvider(), tracing_disabled=True)
+    return None
+
+
+RUN_CONFIG = build_run_config()
+
+# Cached answers are only valid for the models that produced them
+_MODELS = "/".join(TIER_MODELS[tier] for tier in sorted(TIER_MODELS))
+CACHE_MODEL = _MODELS if MODEL_PROVIDER == "openai" else f"{MODEL_PROVIDER}:{_MODELS}"
+
+
+def cached_answer(question: str):
+    """Return `(cache_key, data_version, answer)`; `answer` is None on a miss."""
+    data_version = STORE.data_version()
+    key = RESPONSE_CACHE.key(question, CACHE_MODEL, SYSTEM_PROMPT, data_version)
+    return key, data_version, RESPONSE_CACHE.get(key, data_version)
+
+
+class StreamRenderer:
+    """Collects streamed answer text and repaints the output at a bounded rate.
+
+    Deltas are appended as they arrive, but `output_container.markdown` is called at
+    most once every `flush_ms` milliseconds (or sooner once `flush_chars` new
+    characters are waiting), so long answers do not re-render on every token.
+    Without a container, deltas are written straight to the console.
+    """
+
+    def __init__(self, output_container=None, flush_ms=STREAM_FLUSH_MS, flush_chars=STREAM_FLUSH_CHARS):
+        self.output_container = output_container
+        self.flush_ms = flush_ms
+        self.flush_chars = flush_chars
+        self.status = ""
+        self.text = ""
+        self._pending = []
+        self._pending_chars = 0
+        self._last_flush = 0.0
+        self.first_token_at = None
+
+    @property
+    def has_text(self) -> bool:
+        return bool(self.text or self._pending)
+
+    def set_status(self, status: str):
+        self.status = status
+        if self.output_container is None:
+            print(status)
+        self.flush()
+
+    def add_text(self, delta: str):
+        if not delta:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self.status = ""
+        if self.output_container is None:
+            print(delta, end="", flush=True)
+        self._pending.append(delta)
+        self._pending_chars += len(delta)
+        now = time.perf_counter()
+        if self._pending_chars >= self.flush_chars or (now - self._last_flush) * 1000 >= self.flush_ms:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.text += "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+        self._last_flush = time.perf_counter()
+        if self.output_container is not None:
+            with span("ui.flush", chars=len(self.text)):
+                self.output_container.markdown(self.text or self.status)
+
+
+async def run_agent(question: str = None, output_container=None, conversation=None) -> str:
+    """Answer `question`, streaming into `output_container`.
+
+    With a `conversation.Conversation`, the question is asked after its earlier turns,
+    tool outputs skip what those turns already contain, and the finished run is
+    added to it as a new turn.
+    """
+    with span("agent.run", question=question, model=CACHE_MODEL, prompt_variant=PROMPT_VARIANT) as run_span:
+        renderer = StreamRenderer(output_container)
+        renderer.set_status("Running...")
+        started = time.perf_counter()
+        # A model turn runs from the start (or the last tool output) to its completed response
+        turn_start, turn_start_ns = started, time.time_ns()
+        turns = prompt_tokens = cached_tokens = completion_tokens = 0
+        event_counts = {}
+
+        run_input = question
+        if conversation is not None:
+            run_input = conversation.to_input(question)
+            run_span.set(history_turns=len(conversation), history_tokens=conversation.tokens)
+
+        with span("router.route") as route_span:
+            decision = route(question, bool(conversation), PREDEFINED_ARTIFACTS, LLM_MODEL)
+            route_span.set(**decision)
+        run_span.set(
+            model=decision['model'],
+            route=decision['route'],
+            route_confidence=decision['confidence'],
+            tier=decision['tier'],
+            escalated=decision['escalated'],
+        )
 
-        # hack for final message to override the intermediate messages
-        if len(message) > 60:
-            st.session_state['agent_output'] = message + "\n"
+        # Non-public locations are redacted from the streamed text as it arrives
+        privacy = privacy_filter(PREDEFINED_ARTIFACTS)
+        redactor = privacy.stream()
 
-        output_container.markdown(st.session_state['agent_output'])
-        print(st.session_state['agent_output'])
+        # The run task started here (and its tool threads) copy the active conversation
+        with active_conversation(conversation):
+            result = Runner.run_streamed(TIER_AGENTS[decision['tier']], input=run_input, run_config=RUN_CONFIG)
+        async for event in result.stream_events():
+            event_counts[event.type] = event_counts.get(event.type, 0) + 1
 
+            # Token deltas of the answer as the model produces them
+            if event.type == "raw_response_event":
+                if isinstance(event.data, ResponseTextDeltaEvent):
+                    renderer.add_text(redactor.feed(event.data.delta))
+                elif isinstance(event.data, ResponseCompletedEvent):
+                    usage = event.data.response.usage
+                    # Prompt tokens served from the provider's prefix cache (billed at a discount)
+                    cached = usage.input_tokens_details.cached_tokens if usage and usage.input_tokens_details else None
+                    turns += 1
+                    prompt_tokens += usage.input_tokens if usage else 0
+                    cached_tokens += cached or 0
+                    completion_tokens += usage.output_tokens if usage else 0
+                    record_span(
+                        "model.turn", turn_start_ns, (time.perf_counter() - turn_start) * 1000,
+                        turn=turns,
+                        prompt_tokens=usage.input_tokens if usage else None,
+                        completion_tokens=usage.output_tokens if usage else None,
+                        cached_tokens=cached,
+                    )
 
-    log_message("Running...\n")
-    result = Runner.run_streamed(agent, input=question)
-    async for event in result.stream_events():
-        
-        # We'll ignore the raw responses event deltas
-        if event.type == "raw_response_event":
-            continue
+            # When the agent updates, log that
+            elif event.type == "agent_updated_stream_event":
+                if not renderer.has_text:
+                    renderer.set_status(f"Agent updated: {event.new_agent.name}")
 
-        # When the agent updates, log that
-        elif event.type == "agent_updated_stream_event":
-            log_message(f"Agent updated: {event.new_agent.name}\n")
-            continue
+            # When items are generated, log them
+            elif event.type == "run_item_stream_event":
+                run_span.add_event(event.item.type)
+                if event.item.type == "tool_call_item":
+                    renderer.set_status("Thinking...")
 
-        # When items are generated, log them
-        elif event.type == "run_item_stream_event":
-            if event.item.type == "tool_call_item":
-                log_message("Thinking...\n")
+                elif event.item.type == "tool_call_output_item":
+                    # not printing the output because it's too much noise
+                    turn_start, turn_start_ns = time.perf_counter(), time.time_ns()
 
-            # not printing this because it's too much noise
-            # elif event.item.type == "tool_call_output_item":
-            #     log_message(f"-- Tool output: {event.item.output}")
+                elif event.item.type == "message_output_item":
+                    # Models that do not stream deltas still deliver the whole message here
+                    if not renderer.has_text:
+                        renderer.add_text(redactor.feed(ItemHelpers.text_message_output(event.item)))
+                elif not renderer.has_text:
+                    renderer.set_status("Reasoning...")
 
-            elif event.item.type == "message_output_item":
-                log_message(f"{ItemHelpers.text_message_output(event.item)}")
-            else:
-                log_message(f"Reasoning...\n")
+        renderer.add_text(redactor.finish())
+        renderer.flush()
+        if output_container is None:
+            print()
+        run_span.set(
+            turns=turns,
+            prompt_tokens=prompt_tokens,
+            cached_tokens=cached_tokens,
+            uncached_tokens=prompt_tokens - cached_tokens,
+            completion_tokens=completion_tokens,
+            ttft_ms=round((renderer.first_token_at - started) * 1000, 1) if renderer.first_token_at else None,
+            stream_events=json.dumps(event_counts),
+        )
+        answer = privacy.redact(result.final_output) if isinstance(result.final_output, str) else renderer.text
+        run_span.set(redactions=answer.count(REDACTION))
+        logger.info(
+            "answered route=%s model=%s in %.0f ms (first token after %s ms, %d turns)",
+            decision['route'], decision['model'], (time.perf_counter() - started) * 1000,
+            run_span.attributes.get('ttft_ms'), turns,
+        )
+        if conversation is not None:
+            # The turn is resent with every later question, so it is redacted like the answer
+            items = privacy.filter_value([item.to_input_item() for item in result.new_items])
+            conversation.add_turn(question, items, answer)
+        return answer
 
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+
+from instrumentation import capture_runs
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Agent runs allowed in flight at once across all sessions
+MAX_CONCURRENT_RUNS = int(os.getenv("AGENT_MAX_CONCURRENT", "8"))
+
+# Runs allowed in flight or waiting for a slot before new questions are turned away
+MAX_PENDING_RUNS = int(os.getenv("AGENT_MAX_PENDING", "32"))
+
+# How often a waiting script checks for updates (seconds)
+POLL_INTERVAL = 0.05
+
+
+class WorkerBusy(Exception):
+	"""Raised when too many agent runs are already queued."""
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+class _QueueContainer:
+	"""Stands in for the Streamlit output container inside the worker thread."""
+
+	def __init__(self, updates):
+		self._updates = updates
+
+	def markdown(self, text, **kwargs):
+		self._updates.put(("markdown", text))
+
+
+class AgentJob:
+	"""One submitted question. The submitting thread reads its updates; the worker loop runs it."""
+
+	def __init__(self, session_id, question, conversation=None):
+		self.session_id = session_id
+		self.question = question
+		self.conversation = conversation
+		self.answer = None
+		self.error = None
+		# Timings and token counts of the finished run (see `instrumentation.last_run`)
+		self.run = None
+		self._updates = queue.Queue()
+		self._future = None
+
+	@property
+	def done(self):
+		return self._future is not None and self._future.done()
+
+	def cancel(self):
+		"""Cancel the run (no-op when it already finished)."""
+		if self._future is not None and not self._future.done():
+			self._future.cancel()
+
+	def updates(self):
+		"""Yield the latest text to display until the run finishes, then set `answer` or `error`.
+
+		Repaints queued while the reader was busy are collapsed into the newest one.
+		"""
+		while True:
+			try:
+				kind, payload = self._updates.get(timeout=POLL_INTERVAL)
+			except queue.Empty:
+				if self._future.done() and self._updates.empty():
+					self._finish_without_message()
+					return
+				continue
+			latest = payload if kind == "markdown" else None
+			while kind == "markdown" and not self._updates.empty():
+				kind, payload = self._updates.get_nowait()
+				latest = payload if kind == "markdown" else latest
+			if latest is not None:
+				yield latest
+			if kind == "done":
+				self.answer = payload
+				return
+			if kind == "error":
+				self.error = payload
+				return
+
+	def _finish_without_message(self):
+		try:
+			self._future.result()
+		except BaseException as exc:
+			self.error = exc
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+class AgentWorker:
+	"""Long-lived event loop in a background thread that runs agent jobs for every session.
+
+	Each session has at most one job: submitting a new question cancels the previous
+	one. At most `max_concurrent` runs execute at once, and once `max_pending` jobs
+	are waiting `submit` raises `WorkerBusy` instead of queueing more. Because the
+	loop never closes, the model client's HTTP connections are reused across runs.
+	"""
+
+	def __init__(self, run, max_concurrent=MAX_CONCURRENT_RUNS, max_pending=MAX_PENDING_RUNS):
+		self._run = run
+		self.max_pending = max_pending
+		self._lock = threading.Lock()
+		self._jobs = {}
+		self._loop = asyncio.new_event_loop()
+		self._semaphore = asyncio.Semaphore(max_concurrent)
+		self._thread = threading.Thread(target=self._loop.run_forever, name="agent-worker", daemon=True)
+		self._thread.start()
+
+	@property
+	def pending(self):
+		with self._lock:
+			return sum(1 for job in self._jobs.values() if not job.done)
+
+	def submit(self, session_id, question, conversation=None):
+		"""Queue a question for a session and return its `AgentJob`.
+
+		`conversation` (the session's `conversation.Conversation`) is passed on to the run.
+		"""
+		with self._lock:
+			previous = self._jobs.pop(session_id, None)
+			if previous is not None:
+				previous.cancel()
+			if sum(1 for job in self._jobs.values() if not job.done) >= self.max_pending:
+				raise WorkerBusy("Too many questions are being answered right now.")
+			job = AgentJob(session_id, question, conversation)
+			job._future = asyncio.run_coroutine_threadsafe(self._execute(job), self._loop)
+			self._jobs[session_id] = job
+			return job
+
+	async def _execute(self, job):
+		try:
+			async with self._semaphore:
+				with capture_runs() as runs:
+					answer = await self._run(job.question, _QueueContainer(job._updates), conversation=job.conversation)
+			job.run = runs[-1] if runs else None
+			job._updates.put(("done", answer))
+		except asyncio.CancelledError:
+			raise
+		except Exception as exc:
+			logger.exception("Agent run failed for session %s", job.session_id)
+			job._updates.put(("error", exc))
+		finally:
+			with self._lock:
+				if self._jobs.get(job.session_id) is job:
+					del self._jobs[job.session_id]
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+	"""Return the process-wide worker, starting it on first use."""
+	global _worker
+	if _worker is None:
+		# Imported outside the lock: it takes seconds, and `warm_up` (called on every
+		# script run) takes the same lock. Python's import lock makes concurrent
+		# callers wait for one import.
+		from agent import run_agent
+		with _worker_lock:
+			if _worker is None:
+				_worker = AgentWorker(run_agent)
+	return _worker
+
+
+_warm_up_thread = None
+
+
+def _warm_up():
+	try:
+		get_worker()
+		# The first sync of the knowledge graph extracts every artifact; do it before the first question
+		from knowledge_graph import GRAPH
+		from tools import PREDEFINED_ARTIFACTS
+		GRAPH.refresh(PREDEFINED_ARTIFACTS)
+	except Exception:
+		logger.exception("Could not load the agent in the background; the first question will retry")
+
+
+def warm_up():
+	"""Load the agent and start the worker on a background thread, once per process.
+
+	Importing `agent` loads the agents SDK, which takes seconds; a page that calls this
+	after rendering is usable meanwhile, and a question asked before it finishes waits
+	for the same import.
+	"""
+	global _warm_up_thread
+	if _worker is not None or _warm_up_thread is not None:
+		return
+	with _worker_lock:
+		if _worker is not None or _warm_up_thread is not None:
+			return
+		_warm_up_thread = threading.Thread(target=_warm_up, name="agent-warm-up", daemon=True)
+		_warm_up_thread.start()
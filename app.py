@@ -1,16 +1,22 @@
 from dotenv import load_dotenv 
-import asyncio
-from datetime import datetime
+import contextlib
 import html
+import io
 import json
+import os
+import re
+import uuid
+from pathlib import Path
 import streamlit as st
 
-from agent import run_agent
-from tools import (
-	PREDEFINED_ARTIFACTS,
-	load_persisted_list,
-	persist_list
-)
+from agent_worker import WorkerBusy, get_worker, warm_up
+from artifact_store import artifact_id
+from caching import TTLCache
+from conversation import Conversation
+from instrumentation import span, summary as trace_summary
+from records import record_fingerprint
+from session_artifacts import SessionArtifacts
+from tools import seed_artifacts
 
 # ============================================================================
 # CONFIGURATION
@@ -18,25 +24,27 @@ from tools import (
 load_dotenv()
 st.set_page_config(page_title="Archeologist Agent", layout="centered")
 
+# Artifact cards shown per page, and rendered cards kept across reruns
+PAGE_SIZES = [10, 25, 50, 100]
+CARD_CACHE_SIZE = 2048
+
+# How often (seconds) the artifact listing checks for artifacts saved by other sessions;
+# 0 turns the check off. Only the listing is redrawn, and only it queries the store.
+UI_REFRESH_SECONDS = float(os.getenv("UI_REFRESH_SECONDS", "2"))
+
+# Stands in for the card number in cached cards, so a card is reused at any position
+_CARD_NUMBER = "\x00"
+
+APP_CSS = Path(__file__).parent / "assets" / "app.css"
+
 
 # ============================================================================
 # HELPER FUNCTIONS & CLASSES
 # ============================================================================
 def make_toggle(artifact):
-	"""Create a toggle callback for adding/removing artifacts."""
+	"""Create a toggle callback for adding/removing artifacts (the write is batched)."""
 	def toggle():
-		lst = st.session_state.get('string_list', [])
-		if not isinstance(lst, list):
-			lst = []
-		exists = any(isinstance(it, dict) and it.get('name') == artifact['name'] for it in lst)
-		if exists:
-			st.session_state['string_list'] = [it for it in lst if not (isinstance(it, dict) and it.get('name') == artifact['name'])]
-		else:
-			# Add artifact with timestamp
-			artifact_with_timestamp = artifact.copy()
-			artifact_with_timestamp['discovered_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-			st.session_state['string_list'].append(artifact_with_timestamp)
-		persist_list(st.session_state['string_list'])
+		st.session_state['string_list'].toggle(artifact)
 	return toggle
 
 
@@ -64,11 +72,146 @@ class BorderedOutputProxy:
 		return self._delta.empty()
 
 
+def render_card_html(idx, artifact):
+	"""Build the HTML card for one artifact (escaping and metadata JSON included).
+
+	The description is not part of the card: it is read only when the card's
+	"Description" toggle is on (see `description_html`).
+	"""
+	name = artifact.get('name', 'Unnamed Artifact')
+	discovered = artifact.get('discovered_date', 'Date unknown')
+	details = artifact.get('details') or {}
+	summary = details.get('summary')
+	location = details.get('location')
+	metadata = artifact.get('metadata', {})
+
+	title_html = html.escape(f"{idx}. {name}")
+	discovered_html = html.escape(discovered)
+	location_html = f"<p><em>Location:</em> {html.escape(location)}</p>" if location else ""
+	summary_html = ""
+	if summary:
+		summary_with_ellipsis = summary.rstrip().rstrip('.') + '...'
+		summary_html = f"<p class=\"artifact-summary\"><em>{html.escape(summary_with_ellipsis)}</em></p>"
+	metadata_html = ""
+	if metadata:
+		pretty_metadata = html.escape(json.dumps(metadata, indent=2))
+		metadata_html = f"""
+		<div class=\"artifact-metadata-block\">
+			<div class=\"artifact-metadata-title\">Metadata</div>
+			<pre>{pretty_metadata}</pre>
+		</div>
+		"""
+
+	return f"""
+	<div class=\"artifact-card\">
+		<p class=\"artifact-title\"><strong>{title_html}</strong></p>
+		<p><em>Discovered:</em> {discovered_html}</p>
+		{location_html}
+		{summary_html}
+		{metadata_html}
+	</div>
+	"""
+
+
+def description_html(artifact):
+	"""The description of an expanded card (for compact records, read from the blob file now)."""
+	details = artifact.get('details') or {}
+	description = details.get('description') or artifact.get('description') or "No description provided."
+	return f'<div class="artifact-description">{html.escape(description).replace(chr(10), "<br>")}</div>'
+
+
+@st.cache_resource
+def card_cache():
+	"""Rendered cards shared by every session, keyed by artifact content hash."""
+	return TTLCache(max_entries=CARD_CACHE_SIZE)
+
+
+@st.cache_resource
+def app_css():
+	"""The page styles, read and minified once per process (they are sent on every rerun)."""
+	css = re.sub(r"/\*.*?\*/", "", APP_CSS.read_text(encoding="utf-8"), flags=re.S)
+	return " ".join(css.split())
+
+
+def cached_card_html(idx, artifact):
+	"""Return the card HTML, rendering it only when this artifact's content has not been seen.
+
+	Cards are cached without their number, so when another session adds or removes
+	an artifact the cards that only moved are not rendered again.
+	"""
+	digest = record_fingerprint(artifact)
+	cache = card_cache()
+	card = cache.get(digest)
+	if card is None:
+		card = render_card_html(_CARD_NUMBER, artifact)
+		cache.set(digest, card)
+	return card.replace(_CARD_NUMBER, str(idx), 1)
+
+
+def artifact_page(artifact_list, search_text, location, page_size, page):
+	"""`(total, artifacts)` of one page of the listing, asked of the store only when the list or the filters change."""
+	key = (id(artifact_list), artifact_list.revision, search_text, location, page_size, page)
+	cached = st.session_state.get('artifact_page_rows')
+	if cached is not None and cached[0] == key:
+		return cached[1]
+	result = artifact_list.page(search_text, None if location == "All locations" else location, page_size, (page - 1) * page_size)
+	st.session_state['artifact_page_rows'] = (key, result)
+	return result
+
+
+def reset_artifact_page():
+	st.session_state['artifact_page'] = 1
+
+
+def new_conversation():
+	st.session_state['conversation'].clear()
+	st.session_state['agent_output'] = ""
+
+
 def run_agent_callback(question, output_container):
 	"""Run the agent and display output in Streamlit."""
 	if question and question.strip():
+		# Imported here so the first page renders before the agent SDK has loaded (see warm_up)
+		import agent
+
+		# The agent reads the shared store: write any toggles still waiting first
+		st.session_state['string_list'].flush()
+		conversation = st.session_state['conversation']
+		# Cached answers are context-free, so they only apply to a conversation's first question
+		first_question = len(conversation) == 0
+		key, data_version, answer = agent.cached_answer(question) if first_question else (None, None, None)
+		if answer is not None:
+			# Same question against the same data, model and prompt: replay the stored answer
+			conversation.add_turn(question, [], answer)
+			st.session_state['agent_output'] = answer + "\n"
+			output_container.markdown(st.session_state['agent_output'])
+			return
 		st.session_state['agent_output'] = ""
-		asyncio.run(run_agent(question, output_container))
+		try:
+			job = get_worker().submit(st.session_state['session_id'], question, conversation)
+		except WorkerBusy:
+			st.session_state['agent_output'] = "The agent is busy right now. Please try again in a moment."
+			output_container.markdown(st.session_state['agent_output'])
+			return
+		try:
+			# The run happens on the shared worker loop; this script only paints its updates
+			with span("ui.stream") as paint_span:
+				repaints = 0
+				for text in job.updates():
+					output_container.markdown(text)
+					repaints += 1
+				paint_span.set(repaints=repaints)
+		finally:
+			# A rerun (e.g. a new question) stops this script: stop the run too
+			job.cancel()
+		if job.error is not None:
+			st.session_state['agent_output'] = "Sorry, something went wrong while answering. Please try again."
+			output_container.markdown(st.session_state['agent_output'])
+			return
+		st.session_state['agent_output'] = job.answer or ""
+		st.session_state['last_run'] = job.run
+		if job.answer and first_question:
+			agent.RESPONSE_CACHE.set(key, data_version, job.answer)
 	else:
 		st.session_state['agent_output'] = "Please enter a question before sending."
 
@@ -76,254 +219,21 @@ def run_agent_callback(question, output_container):
 # ============================================================================
 # STYLING
 # ============================================================================
-st.markdown(
-	"""
-	<style>
-		/* Hide browser scrollbar completely */
-		html {
-			overflow: hidden !important;
-		}
-		body {
-			overflow: hidden !important;
-		}
-		/* Make centered layout wider */
-		.block-container {
-			max-width: 1000px !important;
-			padding: 2rem 1rem !important;
-			background-color: #cfbdae !important;
-			overflow: visible !important;
-		}
-		/* Page background */
-		.stApp, .reportview-container, .main {
-			background-color: #cfbdae !important;
-		}
-		/* Main scrolling container */
-		[data-testid="stAppViewContainer"] {
-			background-color: #cfbdae !important;
-			overflow-y: auto !important;
-			overflow-x: hidden !important;
-			height: 100vh !important;
-			scrollbar-color: #bba694 #cfbdae;
-			scrollbar-width: thin;
-		}
-		[data-testid="stHeader"] {
-			background-color: #cfbdae !important;
-		}
-		section[data-testid="stSidebar"] {
-			background-color: #cfbdae !important;
-		}
-		/* Prevent nested scrolling */
-		.stApp {
-			overflow: hidden !important;
-		}
-		.stMainBlockContainer {
-			overflow: visible !important;
-		}
-		/* Style scrollbar for the main container */
-		[data-testid="stAppViewContainer"]::-webkit-scrollbar {
-			width: 12px;
-			height: 12px;
-		}
-		[data-testid="stAppViewContainer"]::-webkit-scrollbar-track {
-			background: #cfbdae;
-		}
-		[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb {
-			background: #bba694;
-			border-radius: 6px;
-		}
-		[data-testid="stAppViewContainer"]::-webkit-scrollbar-thumb:hover {
-			background: #a89683;
-		}
-		/* Hide all other scrollbars */
-		::-webkit-scrollbar {
-			width: 0px;
-			height: 0px;
-			display: none;
-		}
-		/* Streamlit element spacing */
-		[data-testid="stVerticalBlock"] > [data-testid="stVerticalBlock"] {
-			margin-bottom: 3rem !important;
-		}
-		/* Make all text black */
-		body, p, h1, h2, h3, h4, h5, h6, span, label,.stText {
-			color: #000000 !important;
-		}
-		/* Make form controls clearly visible */
-		input, textarea, button {
-			color: #000000 !important;
-			background-color: #bba694 !important;
-		}
-		/* Target Streamlit textarea with all classes */
-		textarea.st-ae, textarea.st-bd, textarea.st-be, textarea.st-bf, textarea.st-bg,
-		textarea[class*="st-"], .stTextArea textarea {
-			color: #000000 !important;
-		}
-		/* Override Streamlit's default text fill color for disabled textareas */
-		.st-bx {
-			-webkit-text-fill-color: #000000 !important;
-		}
-		/* Agent output styling */
-		.agent-output {
-			border: 2px solid #cccccc !important;
-			padding: 12px !important;
-			border-radius: 6px !important;
-			background-color: #bba694 !important;
-			color: #000000 !important;
-			margin: 1.5rem 0 !important;
-		}
-		/* JSON component styling */
-		[data-testid="stJson"] .react-json-view {
-			background-color: #bba694 !important;
-		}
-		/* Expander styling to avoid flashing black */
-		[data-testid="stExpander"] {
-			background-color: #bba694 !important;
-			border: 0 !important;
-			margin: 1rem 0 !important;
-		}
-		[data-testid="stExpander"] button {
-			background-color: #bba694 !important;
-			color: #000000 !important;
-		}
-		[data-testid="stExpander"] div {
-			background-color: #bba694 !important;
-		}
-		/* Artifact card styling */
-		.artifact-card {
-			background-color: #bba694;
-			border: 2px solid #8c7862;
-			border-radius: 8px;
-			padding: 20px;
-			margin-bottom: 1.5rem;
-			margin-top: 1rem;
-			box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-			color: #000000;
-		}
-		.artifact-card * {
-			color: #000000 !important;
-		}
-		.artifact-card p {
-			margin: 0.25rem 0;
-		}
-		.info-card {
-			background-color: #bba694;
-			border: 2px solid #8c7862;
-			border-radius: 8px;
-			padding: 16px 20px;
-			color: #000000;
-			margin-top: 1rem;
-			margin-bottom: 1.5rem;
-		}
-		.artifact-title {
-			font-size: 1rem;
-		}
-		.artifact-details details {
-			margin-top: 0.75rem;
-			background-color: #bba694;
-			border: 1px solid #8c7862;
-			border-radius: 6px;
-			padding: 0.5rem 0.75rem;
-		}
-		.artifact-details summary {
-			font-weight: 600;
-			cursor: pointer;
-			list-style: none;
-		}
-		.artifact-details summary::-webkit-details-marker {
-			display: none;
-		}
-		.artifact-details summary::after {
-			content: "▸";
-			float: right;
-			transition: transform 0.2s ease;
-		}
-		.artifact-details details[open] summary::after {
-			transform: rotate(90deg);
-		}
-		.artifact-description {
-			margin-top: 0.5rem;
-		}
-		.artifact-metadata-block {
-			margin-top: 0.75rem;
-			border-top: 1px solid #8c7862;
-			padding-top: 0.5rem;
-		}
-		.artifact-metadata-title {
-			font-weight: 600;
-			margin-bottom: 0.25rem;
-		}
-		.artifact-metadata-block pre {
-			background: none;
-			border: none;
-			margin: 0;
-		}
-		.ai-prototype-title {
-			text-align: center;
-			font-size: 2.7rem;
-			font-weight: 700;
-			margin-bottom: 1rem;
-			margin-top: 0;
-		}
-		/* Section spacing */
-		.section-header {
-			margin-top: 3rem !important;
-			margin-bottom: 1.5rem !important;
-		}
-		/* Agent section container */
-		.agent-section {
-			margin-bottom: 3.5rem !important;
-		}
-		/* Button row spacing */
-		.artifact-buttons-row {
-			margin-bottom: 2rem !important;
-		}
-		/* Instructions panel styling */
-		.instructions-panel {
-			background-color: #bba694 !important;
-			padding: 20px !important;
-			border-radius: 8px !important;
-			border: 2px solid #8c7862 !important;
-			margin-bottom: 3rem !important;
-		}
-		/* How to use button - top right corner */
-		.how-to-use-btn {
-			position: fixed;
-			top: 120px;
-			right: 20px;
-			background-color: #bba694 !important;
-			color: #000000 !important;
-			border: 2px solid #8c7862;
-			border-radius: 6px;
-			padding: 8px 16px;
-			font-weight: 600;
-			cursor: pointer;
-			z-index: 1000;
-		}
-		.how-to-use-btn:hover {
-			background-color: #a89683 !important;
-		}
-		/* Hide default form submit hint and replace with custom text */
-		form small {
-			display: none !important;
-		}
-		form::after {
-			content: "Press Enter to ask the agent a question!";
-			display: block;
-			font-size: 0.75rem;
-			color: #666;
-			margin-top: 0.5rem;
-			text-align: right;
-		}
-	</style>
-	""",
-	unsafe_allow_html=True,
-)
+st.markdown(f"<style>{app_css()}</style>", unsafe_allow_html=True)
 
 # ============================================================================
 # SESSION STATE INITIALIZATION
 # ============================================================================
 if 'string_list' not in st.session_state:
-	st.session_state['string_list'] = load_persisted_list()
+	# Pages through the shared store; holds only the toggles not saved yet
+	st.session_state['string_list'] = SessionArtifacts()
+
+if 'session_id' not in st.session_state:
+	st.session_state['session_id'] = uuid.uuid4().hex
+
+if 'conversation' not in st.session_state:
+	# Earlier questions and answers of this session, sent along with follow-up questions
+	st.session_state['conversation'] = Conversation()
 
 if 'show_instructions' not in st.session_state:
 	st.session_state['show_instructions'] = False
@@ -348,37 +258,95 @@ if st.session_state['show_instructions']:
 	
 	1. **Add Artifacts**: Click the artifact buttons (Laufen Lens, Hohenfeld Basalt Slab, Altbrunn Prism) to add them to the data repository below. You can also click the button again to remove an artifact. The data repository is the box under the 3 buttons.
 	
-	2. **View Database**: The artifacts you add will appear in the database section. It will show the name of the discovered artifact, the date discovered, and a short description of the artifact. You can click on the "Details" section to see more about the artifact.
+	2. **View Database**: The artifacts you add will appear in the database section. It will show the name of the discovered artifact, the date discovered, and a short description of the artifact. Turn on an artifact's "Description" toggle to read its full description.
 	
 	3. **Ask Questions**: Type a question in the text box and click "Send" to ask the agent about the artifacts. (The AI agent can only answer questions regarding the 3 artifacts given)
 	
-	4. **Agent Responses**: To ask the agent another question, delete the question you asked originally, then type another question for the agent to answer!
+	4. **Agent Responses**: The question box clears after you send, so you can type your next question right away. The agent remembers the conversation, so follow-ups like "How old is it?" work. Click "New conversation" to start over on a different topic.
 	</div>
 	""", unsafe_allow_html=True)
 
+# ============================================================================
+# UI: PERFORMANCE SIDEBAR
+# ============================================================================
+def performance_panel():
+	"""Timings of this session's last agent run, and the span summary of the process."""
+	run = st.session_state.get('last_run')
+	if run:
+		st.caption(
+			f"Last run: {run['duration_ms'] / 1000:.2f} s, first token after {run.get('ttft_ms') or '-'} ms, "
+			f"{run.get('prompt_tokens', 0)} prompt ({run.get('cached_tokens', 0)} cached) / "
+			f"{run.get('completion_tokens', 0)} completion tokens, prompt {run.get('prompt_variant', '-')}, "
+			f"model {run.get('model', '-')} (route {run.get('route') or '-'}{', escalated' if run.get('escalated') else ''})"
+		)
+		st.dataframe(run.get('turns') or [], hide_index=True, use_container_width=True)
+	st.dataframe(trace_summary(), hide_index=True, use_container_width=True)
+
+
+with st.sidebar:
+	st.subheader("Performance")
+	# Drawn by `agent_section`, so it is redrawn when this session's question is answered
+	performance_container = st.container()
+
 # ============================================================================
 # UI: AGENT SECTION
 # ============================================================================
 st.markdown('<h2 class="ai-prototype-title">AI prototype</h2>', unsafe_allow_html=True)
 st.markdown('<h2 class="section-header">Agent Interaction</h2>', unsafe_allow_html=True)
 
-# Agent input form
-with st.form(key="agent_form", clear_on_submit=False):
-	col1, col2 = st.columns([4, 1], vertical_alignment="bottom")
-	
-	with col1:
-		user_question = st.text_input(
-			"Ask the agent:", 
-			placeholder="Type your question here...", 
-			key="agent_question_input"
-		)
-	
-	with col2:
-		send_clicked = st.form_submit_button("Send", use_container_width=True)
 
-# Agent output container
-_raw_output = st.empty()
-output_container = BorderedOutputProxy(_raw_output)
+@st.fragment
+def agent_section():
+	"""The question form and the answer; asking a question reruns only this section and
+	the performance panel it draws into the sidebar."""
+	with st.form(key="agent_form", clear_on_submit=True):
+		col1, col2 = st.columns([4, 1], vertical_alignment="bottom")
+
+		with col1:
+			user_question = st.text_input(
+				"Ask the agent:",
+				placeholder="Type your question here...",
+				key="agent_question_input"
+			)
+
+		with col2:
+			send_clicked = st.form_submit_button("Send", use_container_width=True)
+
+	# Agent output container
+	_raw_output = st.empty()
+	output_container = BorderedOutputProxy(_raw_output)
+
+	conversation_col, new_col = st.columns([0.8, 0.2], vertical_alignment="center")
+	conversation_caption = conversation_col.empty()
+	new_col.button("New conversation", on_click=new_conversation, use_container_width=True, key="new_conversation_btn")
+
+	# Handle form submission
+	if send_clicked:
+		# The form clears its input on submit; the submitted text is the widget's return value
+		question = (user_question or '').strip()
+		if question:
+			st.session_state['agent_request'] = question
+			st.session_state['should_run_agent'] = True
+
+	# Run agent if triggered
+	if st.session_state.get('should_run_agent'):
+		st.session_state['should_run_agent'] = False
+		user_question = st.session_state.get('agent_request', '')
+		if user_question:
+			run_agent_callback(user_question, output_container)
+	elif st.session_state.get('agent_output'):
+		# A full rerun redraws this section: keep showing the last answer
+		output_container.markdown(st.session_state['agent_output'])
+
+	conversation = st.session_state['conversation']
+	if len(conversation):
+		conversation_caption.caption(f"Follow-up questions include the {len(conversation)} earlier question(s) of this conversation.")
+
+	with performance_container:
+		performance_panel()
+
+
+agent_section()
 
 st.markdown('<div style="margin-bottom: 3.5rem;"></div>', unsafe_allow_html=True)
 
@@ -387,78 +355,98 @@ st.markdown('<div style="margin-bottom: 3.5rem;"></div>', unsafe_allow_html=True
 # ============================================================================
 st.markdown('<h2 class="section-header">Artifacts Data Repository</h2>', unsafe_allow_html=True)
 
-# Quick-add buttons for predefined artifacts (evenly spaced)
-col1, col2, col3 = st.columns(3)
-for col, art in zip([col1, col2, col3], PREDEFINED_ARTIFACTS):
-	col.button(art['name'], on_click=make_toggle(art), use_container_width=True)
-
-# Display artifact database
-st.subheader("Database of Artifacts at Site")
-artifact_list = st.session_state['string_list']
-
-if not artifact_list:
-	st.markdown(
-		'<div class="info-card">No artifacts added yet. Use the quick-add buttons above to populate the repository.</div>',
-		unsafe_allow_html=True,
-	)
-else:
-	with st.container():
-		for idx, artifact in enumerate(artifact_list, start=1):
-			if not isinstance(artifact, dict):
-				st.warning(f"Entry {idx} is not formatted correctly and was skipped.")
-				continue
-
-			name = artifact.get('name', 'Unnamed Artifact')
-			discovered = artifact.get('discovered_date', 'Date unknown')
-			details = artifact.get('details') or {}
-			description = details.get('description') or artifact.get('description') or "No description provided."
-			summary = details.get('summary')
-			location = details.get('location')
-			metadata = artifact.get('metadata', {})
-
-			title_html = html.escape(f"{idx}. {name}")
-			discovered_html = html.escape(discovered)
-			location_html = f"<p><em>Location:</em> {html.escape(location)}</p>" if location else ""
-			summary_html = ""
-			if summary:
-				summary_with_ellipsis = summary.rstrip().rstrip('.') + '...'
-				summary_html = f"<p class=\"artifact-summary\"><em>{html.escape(summary_with_ellipsis)}</em></p>"
-			description_html = html.escape(description).replace("\n", "<br>")
-			metadata_html = ""
-			if metadata:
-				pretty_metadata = html.escape(json.dumps(metadata, indent=2))
-				metadata_html = f"""
-				<div class=\"artifact-metadata-block\">
-					<div class=\"artifact-metadata-title\">Metadata</div>
-					<pre>{pretty_metadata}</pre>
-				</div>
-				"""
-			details_block = f"""<details style="background-color: #bba694; border: 1px solid #8c7862; border-radius: 6px; padding: 0.75rem; margin-top: 0.75rem;"><summary style="font-weight: 600; cursor: pointer; list-style: none;">▶ Details</summary><div style="margin-top: 0.5rem;">{description_html}</div>{metadata_html}</details>"""
-
-			card_html = f"""
-			<div class=\"artifact-card\">
-				<p class=\"artifact-title\"><strong>{title_html}</strong></p>
-				<p><em>Discovered:</em> {discovered_html}</p>
-				{location_html}
-				{summary_html}
-				{details_block}
-			</div>
-			"""
-
-			st.markdown(card_html, unsafe_allow_html=True)
-# ============================================================================
-# LOGIC: AGENT EXECUTION
-# ============================================================================
-# Handle form submission
-if send_clicked:
-	question = st.session_state.get('agent_question_input', '').strip()
-	if question:
-		st.session_state['agent_request'] = question
-		st.session_state['should_run_agent'] = True
-
-# Run agent if triggered
-if st.session_state.get('should_run_agent'):
-	st.session_state['should_run_agent'] = False
-	user_question = st.session_state.get('agent_request', '')
-	if user_question:
-		run_agent_callback(user_question, output_container)
+
+@st.fragment
+def artifacts_section():
+	"""Quick-add buttons, import and the listing; toggles and imports rerun only this section."""
+	# Quick-add buttons for predefined artifacts (evenly spaced)
+	col1, col2, col3 = st.columns(3)
+	for col, art in zip([col1, col2, col3], seed_artifacts()):
+		col.button(art['name'], on_click=make_toggle(art), use_container_width=True)
+
+	# Bulk import of whole catalogues (see importer.py for the accepted formats)
+	with st.expander("Import artifacts from a file"):
+		upload = st.file_uploader("JSONL, CSV or JSON catalogue", type=["jsonl", "ndjson", "csv", "json"], key="import_file")
+		replace_existing = st.checkbox("Overwrite artifacts that already exist", key="import_replace")
+		if upload is not None and st.button("Import", key="import_button"):
+			from importer import detect_format, import_stream
+
+			st.session_state['string_list'].flush()
+			status = st.empty()
+			try:
+				report = import_stream(
+					io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""),
+					detect_format(upload.name),
+					replace=replace_existing,
+					progress=lambda r: status.caption(f"{r.read} read, {r.imported} imported ({r.per_second:,.0f}/s)"),
+				)
+			except ValueError as exc:
+				st.error(f"Could not import {upload.name}: {exc}")
+			else:
+				status.success(report.summary())
+				for number, reason in report.errors:
+					st.caption(f"Record {number}: {reason}")
+
+	# Display artifact database
+	st.subheader("Database of Artifacts at Site")
+	artifact_listing()
+
+
+@st.fragment(run_every=UI_REFRESH_SECONDS or None)
+def artifact_listing():
+	"""The cards of one page; filters and paging rerun only the listing, and every
+	`UI_REFRESH_SECONDS` it picks up what other sessions saved.
+
+	A fragment rerun replaces everything it drew, so an idle check draws the same page
+	again, from the rows and cards cached for this revision.
+	"""
+	artifact_list = st.session_state['string_list']
+	# Apply what other sessions (and, with the artifact service, other workers) saved meanwhile
+	artifact_list.refresh()
+	for message in artifact_list.take_errors():
+		st.warning(message)
+
+	if not artifact_list:
+		st.markdown(
+			'<div class="info-card">No artifacts added yet. Use the quick-add buttons above to populate the repository.</div>',
+			unsafe_allow_html=True,
+		)
+		return
+	filter_col, location_col, size_col = st.columns([3, 2, 1], vertical_alignment="bottom")
+	search_text = filter_col.text_input("Search artifacts", placeholder="Name or summary...", key="artifact_search", on_change=reset_artifact_page)
+	location = location_col.selectbox("Location", ["All locations"] + artifact_list.locations(), key="artifact_location", on_change=reset_artifact_page)
+	page_size = size_col.selectbox("Per page", PAGE_SIZES, key="artifact_page_size", on_change=reset_artifact_page)
+
+	page = st.session_state.get('artifact_page', 1)
+	total, rows = artifact_page(artifact_list, search_text.strip(), location, page_size, page)
+	page_count = max(1, -(-total // page_size))
+	if page > page_count:
+		# The list shrank under the current page: show the last one
+		page = page_count
+		total, rows = artifact_page(artifact_list, search_text.strip(), location, page_size, page)
+	st.session_state['artifact_page'] = page
+	start = (page - 1) * page_size
+
+	if not rows:
+		st.markdown('<div class="info-card">No artifacts match the search.</div>', unsafe_allow_html=True)
+		return
+	# Time the cards only when they changed, not on every idle check
+	drawn = (artifact_list.revision, search_text, location, page_size, page)
+	changed = st.session_state.get('drawn_page') != drawn
+	st.session_state['drawn_page'] = drawn
+	with st.container(), span("ui.cards", count=total, page=page) if changed else contextlib.nullcontext():
+		for idx, artifact in enumerate(rows, start=start + 1):
+			st.markdown(cached_card_html(idx, artifact), unsafe_allow_html=True)
+			# Only expanded cards read (and send) their description
+			if st.toggle("Description", key=f"description:{artifact_id(artifact)}"):
+				st.markdown(description_html(artifact), unsafe_allow_html=True)
+	if page_count > 1:
+		pager_col, caption_col = st.columns([1, 3], vertical_alignment="center")
+		pager_col.number_input("Page", min_value=1, max_value=page_count, key="artifact_page")
+		caption_col.caption(f"Showing {start + 1}-{start + len(rows)} of {total} artifacts")
+
+
+artifacts_section()
+
+# Load the agent while the user reads the page, not when the first question arrives
+warm_up()
@@ -0,0 +1,322 @@
+import difflib
+import heapq
+import json
+import re
+import unicodedata
+from collections.abc import Mapping
+
+from records import EMPTY_KEY, ArtifactRecord, as_dict, description_key
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Rough characters-per-token ratio used to estimate response size for the model
+CHARS_PER_TOKEN = 4
+
+# Default response budget for a single tool call
+DEFAULT_MAX_BYTES = 8000
+DEFAULT_MAX_TOKENS = 2000
+
+# How many "did you mean" candidates to return when nothing matches exactly
+MAX_CANDIDATES = 5
+
+# Minimum similarity (0..1) for a misspelled word or name to count as a match
+FUZZY_CUTOFF = 0.75
+
+# A fuzzy hit above this score (and clearly ahead of the runner-up) is treated as a match
+CONFIDENT_SCORE = 0.85
+
+# Names and words sharing the most trigrams with the query that are scored with difflib
+FUZZY_SHORTLIST = 64
+
+# Descriptions name the artifact in full, e.g. "The Laufen Lens Inscription Tablet artifact is ..."
+_ALIAS_PATTERN = re.compile(r"^\s*The\s+(.+?)\s+artifact\b")
+_STOPWORDS = {"the", "a", "an", "of", "and", "artifact", "about", "me", "tell"}
+
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+def normalize_name(name):
+	"""Lower-case, strip accents and punctuation so lookups ignore spelling noise."""
+	if not name:
+		return ""
+	text = unicodedata.normalize("NFKD", str(name))
+	text = "".join(ch for ch in text if not unicodedata.combining(ch))
+	text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+	return " ".join(text.split())
+
+
+def _tokens(text):
+	return [t for t in normalize_name(text).split() if t not in _STOPWORDS]
+
+
+def _trigrams(text):
+	padded = f" {text} "
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _shortlist(grams, text, size=FUZZY_SHORTLIST):
+	"""The entries of a trigram index that share the most trigrams with `text`."""
+	shared = {}
+	for gram in _trigrams(text):
+		for entry in grams.get(gram, ()):
+			shared[entry] = shared.get(entry, 0) + 1
+	return heapq.nlargest(size, shared, key=shared.__getitem__)
+
+
+def artifact_description(artifact):
+	"""Return the long description of an artifact record (new or legacy format)."""
+	if isinstance(artifact, ArtifactRecord):
+		return artifact.description
+	details = artifact.get('details') or {}
+	return details.get('description') or artifact.get('description') or ""
+
+
+def description_hash(artifact):
+	"""SHA-1 of the description; compact records know it without reading the description."""
+	if isinstance(artifact, ArtifactRecord):
+		return artifact.description_key or EMPTY_KEY
+	return description_key(artifact_description(artifact))
+
+
+def _derived_alias(artifact):
+	if isinstance(artifact, ArtifactRecord):
+		return artifact.derived_alias
+	found = _ALIAS_PATTERN.match(artifact_description(artifact))
+	return found.group(1) if found else None
+
+
+def compact_record(artifact, blobs):
+	"""Turn an artifact dict into an `ArtifactRecord` whose description lives in `blobs`."""
+	if isinstance(artifact, ArtifactRecord):
+		return artifact
+	return ArtifactRecord(artifact, blobs, derived_alias=_derived_alias(artifact))
+
+
+def artifact_aliases(artifact):
+	"""Return the display name plus every alias an artifact can be looked up by."""
+	names = [artifact.get('name')]
+	names.extend(artifact.get('aliases') or [])
+	derived = _derived_alias(artifact)
+	if derived:
+		names.append(derived)
+	aliases = []
+	for name in names:
+		if name and normalize_name(name) and name not in aliases:
+			aliases.append(name)
+	return aliases
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+class ArtifactIndex:
+	"""In-memory lookup from normalized artifact names and aliases to records.
+
+	Misses are scored with difflib, but only against the aliases and words that share
+	the most trigrams with the query, so a lookup does not grow with the collection.
+	"""
+
+	def __init__(self, artifacts):
+		self.records = [a for a in artifacts if isinstance(a, Mapping)]
+		self._by_alias = {}
+		self._by_token = {}
+		self._aliases_by_token = {}
+		self._bare_aliases = []  # aliases made of stopwords only
+		for pos, artifact in enumerate(self.records):
+			for alias in artifact_aliases(artifact):
+				key = normalize_name(alias)
+				tokens = _tokens(alias)
+				for token in tokens:
+					self._by_token.setdefault(token, set()).add(pos)
+				if key in self._by_alias:
+					continue
+				self._by_alias[key] = pos
+				if not tokens:
+					self._bare_aliases.append(key)
+				for token in tokens:
+					self._aliases_by_token.setdefault(token, []).append(key)
+		self._alias_grams = {}
+		for alias in self._by_alias:
+			for gram in _trigrams(alias):
+				self._alias_grams.setdefault(gram, []).append(alias)
+		self._word_grams = {}
+		for word in self._by_token:
+			for gram in _trigrams(word):
+				self._word_grams.setdefault(gram, []).append(word)
+
+	def _close_words(self, token, n, cutoff):
+		return difflib.get_close_matches(token, _shortlist(self._word_grams, token), n=n, cutoff=cutoff)
+
+	def __len__(self):
+		return len(self.records)
+
+	def lookup(self, query, limit=MAX_CANDIDATES):
+		"""Return `(matches, candidates)` for a query.
+
+		`matches` are records the query names outright (exactly, as a substring of an
+		alias, or by a confident fuzzy hit). Otherwise `candidates` holds a ranked
+		short list of `(score, record)` pairs for the model to choose from.
+		"""
+		key = normalize_name(query)
+		if not key or not self.records:
+			return [], []
+
+		if key in self._by_alias:
+			return [self.records[self._by_alias[key]]], []
+
+		# "Laufen Lens" -> "Laufen Lens Inscription Tablet", or several names in one question
+		padded = f" {key} "
+		hits = []
+		query_tokens = _tokens(key)
+		if query_tokens:
+			# Either way round, the alias shares a word with the query
+			aliases = dict.fromkeys(self._bare_aliases)
+			for token in query_tokens:
+				aliases.update(dict.fromkeys(self._aliases_by_token.get(token, ())))
+			for alias in aliases:
+				pos = self._by_alias[alias]
+				if (f" {alias} " in padded or padded in f" {alias} ") and pos not in hits:
+					hits.append(pos)
+
+		# A (possibly misspelled) word that belongs to a single artifact identifies it
+		for token in query_tokens:
+			for word in self._close_words(token, 1, CONFIDENT_SCORE):
+				owners = self._by_token[word]
+				if len(owners) == 1:
+					pos = next(iter(owners))
+					if pos not in hits:
+						hits.append(pos)
+		if hits:
+			return [self.records[pos] for pos in hits], []
+
+		scored = self._fuzzy_scores(key)
+		# Ties keep the collection order
+		ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+		ranked = [(score, self.records[pos]) for pos, score in ranked if score >= FUZZY_CUTOFF]
+		if ranked:
+			top = ranked[0][0]
+			runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+			if top >= CONFIDENT_SCORE and top - runner_up >= 0.1:
+				return [ranked[0][1]], []
+		return [], ranked[:limit]
+
+	def _fuzzy_scores(self, key):
+		"""Score the likely records against a query that did not match any alias verbatim."""
+		scores = {}
+
+		# Whole-string similarity catches a misspelled full name ("Altbrun Prizm")
+		for alias in _shortlist(self._alias_grams, key):
+			pos = self._by_alias[alias]
+			ratio = difflib.SequenceMatcher(None, key, alias).ratio()
+			scores[pos] = max(scores.get(pos, 0.0), ratio)
+
+		# Per-word similarity catches a misspelled name inside a longer question
+		query_tokens = [t for t in key.split() if t not in _STOPWORDS]
+		token_hits = {}
+		for token in query_tokens:
+			for word in self._close_words(token, 3, FUZZY_CUTOFF):
+				similarity = difflib.SequenceMatcher(None, token, word).ratio()
+				for pos in self._by_token[word]:
+					best = token_hits.setdefault(pos, {})
+					best[word] = max(best.get(word, 0.0), similarity)
+		for pos, words in token_hits.items():
+			name_tokens = _tokens(self.records[pos].get('name'))
+			coverage = sum(words.get(t, 0.0) for t in name_tokens) / max(len(name_tokens), 1)
+			scores[pos] = max(scores.get(pos, 0.0), coverage)
+		return scores
+
+
+# ============================================================================
+# RESPONSE FORMATTING
+# ============================================================================
+def _truncate_utf8(text, max_bytes):
+	encoded = text.encode("utf-8")
+	if len(encoded) <= max_bytes:
+		return text
+	return encoded[:max(max_bytes, 0)].decode("utf-8", errors="ignore").rstrip() + " [...]"
+
+
+def _fit_record(artifact, budget):
+	"""Return a copy of `artifact` whose JSON fits in `budget` bytes, shortening the description."""
+	record = json.loads(json.dumps(as_dict(artifact), ensure_ascii=False))
+	size = len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+	if size <= budget:
+		return record, False
+	description = artifact_description(record)
+	overflow = size - budget
+	keep = len(description.encode("utf-8")) - overflow - 16
+	if keep <= 0:
+		return None, True
+	target = record['details'] if isinstance(record.get('details'), dict) and record['details'].get('description') else record
+	# JSON escaping can make the shortened text slightly larger than planned, so re-check
+	while keep > 0:
+		target['description'] = _truncate_utf8(description, keep)
+		size = len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+		if size <= budget:
+			return record, True
+		keep -= size - budget
+	return None, True
+
+
+def without_description(artifact):
+	"""Return a copy of an artifact record without its long description."""
+	if isinstance(artifact, ArtifactRecord):
+		return artifact.to_dict(include_description=False)
+	record = {key: value for key, value in artifact.items() if key != 'description'}
+	if isinstance(record.get('details'), dict):
+		record['details'] = {key: value for key, value in record['details'].items() if key != 'description'}
+	return record
+
+
+def format_response(query, matches, candidates, max_bytes=DEFAULT_MAX_BYTES, max_tokens=DEFAULT_MAX_TOKENS, passages=None, fact_sheets=None):
+	"""Serialize lookup results as JSON, keeping the payload within the byte and token budget.
+
+	When `passages` (`(score, passage)` pairs from the semantic index) are given, matched
+	records are sent without their descriptions and the passages are sent instead.
+	When `fact_sheets` (one per match) are given, they are sent in place of the records.
+	"""
+	budget = min(max_bytes, max_tokens * CHARS_PER_TOKEN)
+	response = {"query": query, "matches": [], "candidates": [], "truncated": False}
+	if fact_sheets is not None:
+		matches = fact_sheets
+		if fact_sheets:
+			response['description_omitted'] = True
+	elif passages is not None:
+		matches = [without_description(a) for a in matches]
+	if passages is not None:
+		response['passages'] = []
+	used = len(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+
+	for score, passage in passages or ():
+		entry = {"artifact": passage.get('name'), "score": round(score, 2), "text": passage.get('text', "")}
+		size = len(json.dumps(entry, ensure_ascii=False).encode("utf-8")) + 2
+		if used + size > budget:
+			response['truncated'] = True
+			break
+		response['passages'].append(entry)
+		used += size
+
+	for artifact in matches:
+		record, truncated = _fit_record(artifact, budget - used - 2)
+		if record is None:
+			response['truncated'] = True
+			break
+		response['matches'].append(record)
+		response['truncated'] = response['truncated'] or truncated
+		used = len(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+
+	for score, artifact in candidates:
+		details = artifact.get('details') or {}
+		entry = {"name": artifact.get('name'), "score": round(score, 2), "summary": details.get('summary', "")}
+		size = len(json.dumps(entry, ensure_ascii=False).encode("utf-8")) + 2
+		if used + size > budget:
+			response['truncated'] = True
+			break
+		response['candidates'].append(entry)
+		used += size
+
+	if not response['matches'] and not response['candidates'] and not response.get('passages'):
+		response['note'] = "No artifact in the repository matches this name."
+	return json.dumps(response, ensure_ascii=False)
@@ -0,0 +1,613 @@
+"""Shared artifact service: one process holds the store, any number of workers use it.
+
+With the default backends every process (each Streamlit worker, the batch runner)
+loads its own copy of the data file and re-reads it after other processes write.
+For a multi-process deployment, run one service that owns the store, its records
+and its name index, and point the workers at it:
+
+	python artifact_service.py serve                             # Unix socket data/artifacts.sock
+	python artifact_service.py serve --address http://127.0.0.1:8765
+	ARTIFACT_BACKEND=service streamlit run app.py --server.port 8501
+	ARTIFACT_BACKEND=service ARTIFACT_SERVICE=http://127.0.0.1:8765 python batch.py questions.txt
+
+The service keeps using the json or sqlite backend (`--backend`, default json). The
+workers' `STORE` becomes a `RemoteArtifactStore` with the same API, so `tools.py`,
+the agent tools and the importer work unchanged:
+
+- Reads and writes are JSON calls over HTTP (on the Unix socket or TCP). Several
+  calls go in one request (`RemoteArtifactStore.call`), `by_ids` fetches many
+  records at once, and `records` pages through the collection in `RECORDS_PAGE`
+  batches. Each connection is kept alive per thread.
+- Change notifications: a watcher thread in every worker holds a long poll
+  (`GET /changes`) that returns as soon as the store's version moves. Until then,
+  `refresh`, `version` and `data_version` cost no round trip, and `records` comes
+  from the worker's cache. Listeners registered with `subscribe` are called on
+  every change.
+- Every state the service sends lists the ids added (or changed) and removed since
+  the version the worker last saw, when the store can tell (`changes`). The worker
+  keeps them in its own change log, so `records` fetches only those artifacts with
+  `by_ids` and `changes(since)` answers without a round trip. The whole collection
+  is fetched again only on the first load, after a restart of the service, or when
+  the worker fell further behind than the store's change log reaches.
+- The cached records are compact `ArtifactRecord`s: their descriptions go to a
+  blob file of the worker's own (in a temporary directory removed at exit), which
+  is compacted once descriptions of removed or edited artifacts fill half of it.
+- Every response carries the store's version, so a worker sees its own writes
+  right away. If the watcher loses the service, each `refresh` asks for the
+  version until it reconnects.
+
+Writes are upserts and removals by id, so a write retried after a dropped
+connection does no harm. Indexes that depend on the whole collection (semantic
+passages, knowledge graph, privacy terms, fact sheets) are still built in the
+agent's process from `records`, and rebuilt only when the version changes.
+`python benchmarks/service.py` runs several worker processes against one service.
+"""
+import argparse
+import atexit
+import http.client
+import json
+import logging
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+from artifact_index import MAX_CANDIDATES, ArtifactIndex, compact_record
+from artifact_store import ARTIFACT_SERVICE, artifact_id
+from persistence import ChangeLog
+from records import ArtifactRecord, DescriptionBlobs, as_dict
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Seconds one request may take (a long poll gets CHANGE_WAIT on top)
+SERVICE_TIMEOUT = 10.0
+
+# Seconds a change long poll stays open before it returns the unchanged version
+CHANGE_WAIT = 30.0
+
+# How often a waiting long poll checks for writes made to the files behind the service's back
+EXTERNAL_CHECK_SECONDS = 1.0
+
+# Records per `records` call when a worker loads the whole collection
+RECORDS_PAGE = 1000
+
+# Pause before the watcher reconnects to a service that went away
+WATCH_RETRY_SECONDS = 1.0
+
+READ_CALLS = ("records", "by_ids", "lookup", "search", "query", "count", "locations", "existing")
+WRITE_CALLS = ("apply", "replace", "compact")
+
+
+class ArtifactServiceError(Exception):
+	"""Raised when the artifact service cannot be reached or rejects a call."""
+
+
+def _is_http(address):
+	return address.startswith(("http://", "https://"))
+
+
+def _pairs(pairs):
+	return [[score, as_dict(record)] for score, record in pairs]
+
+
+# ============================================================================
+# SERVICE
+# ============================================================================
+class ArtifactService:
+	"""Serves calls against one store and wakes the change long polls after every write."""
+
+	def __init__(self, store):
+		self.store = store
+		# A restarted service starts a new epoch, so workers never mistake its versions for old ones
+		self.epoch = uuid.uuid4().hex[:12]
+		self._changed = threading.Condition()
+
+	def state(self, since=""):
+		"""The store's version; with the ids changed after `since` (a state key) when the store can tell."""
+		store = self.store
+		store.refresh()
+		state = {"epoch": self.epoch, "version": store.version}
+		epoch, _, version = since.partition(":")
+		if epoch == self.epoch and version.isdigit():
+			delta = store.changes(int(version))
+			if delta is not None:
+				state.update(delta)
+		state['data_version'] = store.data_version()
+		return state
+
+	@staticmethod
+	def state_key(state):
+		return f"{state['epoch']}:{state['version']}"
+
+	def wait_for_change(self, since, timeout=CHANGE_WAIT):
+		"""Return the state once its key differs from `since`, or after `timeout` seconds."""
+		deadline = time.monotonic() + min(max(timeout, 0.0), CHANGE_WAIT)
+		with self._changed:
+			while True:
+				state = self.state(since)
+				remaining = deadline - time.monotonic()
+				if self.state_key(state) != since or remaining <= 0:
+					return state
+				self._changed.wait(min(remaining, EXTERNAL_CHECK_SECONDS))
+
+	def call_many(self, calls):
+		"""Run `[name, kwargs]` calls in order; returns their JSON-ready results."""
+		results, wrote = [], False
+		try:
+			for name, kwargs in calls:
+				if name not in READ_CALLS and name not in WRITE_CALLS:
+					raise ValueError(f"unknown call: {name}")
+				results.append(getattr(self, f"_{name}")(**(kwargs or {})))
+				wrote = wrote or name in WRITE_CALLS
+		finally:
+			if wrote:
+				with self._changed:
+					self._changed.notify_all()
+		return results
+
+	def _records(self, offset=0, limit=RECORDS_PAGE):
+		return [as_dict(r) for r in self.store.records()[offset:offset + limit]]
+
+	def _by_ids(self, ids):
+		return {key: as_dict(r) for key, r in self.store.by_ids(ids).items()}
+
+	def _lookup(self, query, limit=MAX_CANDIDATES):
+		matches, candidates = self.store.lookup(query, limit)
+		return {"matches": [as_dict(r) for r in matches], "candidates": _pairs(candidates)}
+
+	def _search(self, text, limit=MAX_CANDIDATES):
+		return _pairs(self.store.search(text, limit))
+
+	def _query(self, text=None, location=None, limit=None, offset=0):
+		return [as_dict(r) for r in self.store.query(text, location, limit, offset)]
+
+	def _count(self, text=None, location=None):
+		return self.store.count(text, location)
+
+	def _locations(self):
+		return self.store.locations()
+
+	def _existing(self, ids):
+		return sorted(self.store.existing(ids))
+
+	def _apply(self, adds=(), removes=(), compact_journal=True):
+		self.store.apply(adds=adds, removes=removes, compact_journal=compact_journal)
+
+	def _replace(self, records):
+		self.store.replace(records)
+
+	def _compact(self):
+		self.store.compact()
+
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		url = urlsplit(self.path)
+		params = parse_qs(url.query)
+		service = self.server.service
+		if url.path == "/state":
+			self._send(200, service.state(params.get("since", [""])[0]))
+		elif url.path == "/changes":
+			since = params.get("since", [""])[0]
+			timeout = float(params.get("timeout", [CHANGE_WAIT])[0])
+			self._send(200, service.wait_for_change(since, timeout))
+		else:
+			self._send(404, {"error": f"no such path: {url.path}"})
+
+	def do_POST(self):
+		service = self.server.service
+		try:
+			body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+			results = service.call_many(body.get("calls") or [])
+			since = str(body.get("since") or "")
+		except (ValueError, TypeError, KeyError) as exc:
+			self._send(400, {"error": f"{type(exc).__name__}: {exc}"})
+		except Exception as exc:
+			logger.exception("Artifact service call failed")
+			self._send(500, {"error": f"{type(exc).__name__}: {exc}"})
+		else:
+			self._send(200, {"results": results, "state": service.state(since)})
+
+	def _send(self, status, payload):
+		data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def address_string(self):
+		# Unix socket peers have no address
+		return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+	def log_message(self, format, *args):
+		logger.debug("%s %s", self.address_string(), format % args)
+
+
+class _TCPHandler(_Handler):
+	# Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+	disable_nagle_algorithm = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+
+def make_server(address, store):
+	"""An HTTP server for `store` on a Unix socket path or an http://host:port address."""
+	if _is_http(address):
+		url = urlsplit(address)
+		server = ThreadingHTTPServer((url.hostname or "127.0.0.1", url.port or 80), _TCPHandler)
+	else:
+		path = Path(address)
+		if path.exists():
+			probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			try:
+				probe.connect(str(path))
+			except OSError:
+				path.unlink()  # left behind by a service that did not shut down cleanly
+			else:
+				raise ArtifactServiceError(f"an artifact service is already listening on {path}")
+			finally:
+				probe.close()
+		path.parent.mkdir(parents=True, exist_ok=True)
+		server = _UnixHTTPServer(str(path), _Handler)
+	server.service = ArtifactService(store)
+	return server
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+class _UnixHTTPConnection(http.client.HTTPConnection):
+	def __init__(self, path, timeout):
+		super().__init__("localhost", timeout=timeout)
+		self.unix_path = path
+
+	def connect(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(self.timeout)
+		try:
+			sock.connect(self.unix_path)
+		except OSError:
+			sock.close()
+			raise
+		self.sock = sock
+
+
+class RemoteArtifactStore:
+	"""Artifact repository held by an `ArtifactService`, with the same API as `ArtifactStore`.
+
+	`path` is only used to place the worker's own sidecar files (fact sheets, passage
+	vectors). `version` is a counter of this worker that moves whenever the service's
+	version does; `changes(since)` is answered from the ids the service sent along.
+	"""
+
+	def __init__(self, address, path):
+		self.address = address
+		self.path = Path(path)
+		self.version = 0
+		self._lock = threading.RLock()
+		self._local = threading.local()
+		self._epoch = None
+		self._service_version = None
+		self._data_version = None
+		self._records = ()
+		self._records_version = -1
+		self._log = ChangeLog()
+		self._index = None
+		self._index_version = -1
+		self._listeners = []
+		self._watcher = None
+		self._watching = False
+		self._blobs = None
+		self._building = threading.Lock()
+
+	# ------------------------------------------------------------------ transport
+	def _connection(self, timeout):
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			if _is_http(self.address):
+				url = urlsplit(self.address)
+				conn = http.client.HTTPConnection(url.hostname or "127.0.0.1", url.port or 80, timeout=timeout)
+			else:
+				conn = _UnixHTTPConnection(self.address, timeout)
+			self._local.conn = conn
+		elif conn.timeout != timeout:
+			conn.timeout = timeout
+			if conn.sock is not None:
+				conn.sock.settimeout(timeout)
+		return conn
+
+	def _request(self, method, path, payload=None, timeout=SERVICE_TIMEOUT):
+		body = None if payload is None else json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+		headers = {"Content-Type": "application/json"} if body is not None else {}
+		# A kept-alive connection the service has closed fails once; the retry opens a new one
+		for attempt in (1, 2):
+			conn = self._connection(timeout)
+			try:
+				conn.request(method, path, body=body, headers=headers)
+				response = conn.getresponse()
+				data = json.loads(response.read() or b"{}")
+			except (OSError, http.client.HTTPException, ValueError) as exc:
+				conn.close()
+				self._local.conn = None
+				if attempt == 2:
+					raise ArtifactServiceError(f"artifact service at {self.address} is unreachable: {exc}") from exc
+				continue
+			if response.status != 200:
+				raise ArtifactServiceError(data.get('error') or f"artifact service answered HTTP {response.status}")
+			return data
+
+	def call(self, *calls):
+		"""Run `(name, kwargs)` calls in one round trip and return their results in order."""
+		payload = {"calls": [[name, kwargs] for name, kwargs in calls], "since": self._state_key()}
+		data = self._request("POST", "/", payload)
+		self._apply_state(data['state'])
+		return data['results']
+
+	def _call(self, name, **kwargs):
+		return self.call((name, kwargs))[0]
+
+	# ------------------------------------------------------------------ changes
+	def _apply_state(self, state):
+		"""Move `version` if the service's version moved (or the service restarted)."""
+		with self._lock:
+			if state['epoch'] == self._epoch and state['version'] <= self._service_version:
+				return False
+			same_epoch = state['epoch'] == self._epoch
+			self._epoch = state['epoch']
+			self._service_version = state['version']
+			self._data_version = state['data_version']
+			self.version += 1
+			# The ids are relative to the key this worker sent, which is never newer than
+			# the version it had applied, so recording them for this step is safe
+			if same_epoch and "added" in state:
+				self._log.record(self.version, state['added'], state['removed'])
+			else:
+				self._log.reset(self.version)
+			version, listeners = self.version, list(self._listeners)
+		for listener in listeners:
+			try:
+				listener(version)
+			except Exception:
+				logger.exception("Artifact change listener failed")
+		return True
+
+	def _state_key(self):
+		with self._lock:
+			return f"{self._epoch}:{self._service_version}" if self._epoch else ""
+
+	def _ensure_watcher(self):
+		if self._watcher is None:
+			with self._lock:
+				if self._watcher is None:
+					self._watcher = threading.Thread(target=self._watch, name="artifact-service-watch", daemon=True)
+					self._watcher.start()
+
+	def _watch(self):
+		while True:
+			try:
+				if not self._watching:
+					self._apply_state(self._request("GET", f"/state?since={quote(self._state_key())}"))
+					self._watching = True
+					logger.info("Watching the artifact service at %s", self.address)
+				path = f"/changes?since={quote(self._state_key())}&timeout={CHANGE_WAIT:g}"
+				self._apply_state(self._request("GET", path, timeout=CHANGE_WAIT + SERVICE_TIMEOUT))
+			except ArtifactServiceError as exc:
+				if self._watching:
+					logger.warning("Lost the artifact service (%s); reads check the version until it is back", exc)
+				self._watching = False
+				time.sleep(WATCH_RETRY_SECONDS)
+
+	def subscribe(self, listener):
+		"""Call `listener(version)` after every change (from whichever thread noticed it first)."""
+		with self._lock:
+			self._listeners.append(listener)
+		self._ensure_watcher()
+
+	def refresh(self):
+		"""Pick up changes. Returns True when the records changed.
+
+		While the watcher is connected, changes have already been applied and this
+		costs nothing; otherwise it asks the service for its version.
+		"""
+		self._ensure_watcher()
+		if self._watching and self._epoch is not None:
+			return False
+		return self._apply_state(self._request("GET", f"/state?since={quote(self._state_key())}"))
+
+	def data_version(self):
+		self.refresh()
+		return self._data_version
+
+	def changes(self, since):
+		"""Ids added (or changed) and removed after version `since`, or None when unknown."""
+		self.refresh()
+		return self._log.since(since, self.version)
+
+	# ------------------------------------------------------------------ reads
+	def records(self):
+		"""Return every record: loaded in pages once, then patched with the changed ones after each change."""
+		self.refresh()
+		# One builder at a time: the blob file is compacted against the records it built
+		with self._building:
+			for _ in range(3):
+				version = self.version
+				with self._lock:
+					if self._records_version == version:
+						return self._records
+					cached, cached_version = self._records, self._records_version
+				delta = self._log.since(cached_version, version) if cached_version >= 0 else None
+				if delta is not None:
+					# At least as new as `version`; anything newer is in the log and patched next time
+					records = self._patched(cached, delta)
+				else:
+					records = self._fetch_all(version)
+					if records is None:
+						continue
+				with self._lock:
+					if self._records_version == cached_version:
+						self._records, self._records_version = records, version
+			# Still changing after three tries: return the last read, even if it is not consistent
+			return records if records is not None else self._records
+
+	def _fetch_all(self, version):
+		"""Every record in pages, or None if the version moved while paging."""
+		records, offset = [], 0
+		while True:
+			page = self._call("records", offset=offset, limit=RECORDS_PAGE)
+			records.extend(self._compact(page))
+			offset += len(page)
+			if self.version != version:
+				return None
+			if len(page) < RECORDS_PAGE:
+				return self._collected(records)
+
+	def _patched(self, records, delta):
+		by_id = {artifact_id(a): a for a in records}
+		for key in delta['removed']:
+			by_id.pop(key, None)
+		fetched = self.by_ids(delta['added']) if delta['added'] else {}
+		for key in delta['added']:
+			# An add moves the artifact to the end, as in the store
+			by_id.pop(key, None)
+			if key in fetched:
+				by_id[key] = compact_record(fetched[key], self._blob_file())
+		return self._collected(by_id.values())
+
+	def _blob_file(self):
+		with self._lock:
+			if self._blobs is None:
+				directory = tempfile.mkdtemp(prefix="artifact-worker-")
+				atexit.register(shutil.rmtree, directory, True)
+				self._blobs = DescriptionBlobs(Path(directory) / "descriptions.blobs")
+			return self._blobs
+
+	def _compact(self, page):
+		blobs = self._blob_file()
+		return [compact_record(artifact, blobs) for artifact in page]
+
+	def _collected(self, records):
+		"""`records` as a tuple, dropping stale descriptions from the blob file once they fill half of it."""
+		records = tuple(records)
+		blobs = self._blob_file()
+		keep = [r.description_key for r in records if isinstance(r, ArtifactRecord)]
+		if blobs.stale_bytes(keep) * 2 > blobs.size():
+			blobs.compact(keep)
+		return records
+
+	def index(self):
+		"""Return a name index over the cached records (lookups themselves run in the service)."""
+		records = self.records()
+		with self._lock:
+			if self._index_version != self.version:
+				self._index = ArtifactIndex(records)
+				self._index_version = self.version
+			return self._index
+
+	def by_ids(self, ids):
+		"""Return `{id: record}` for the `ids` that are in the store, in one call."""
+		return self._call("by_ids", ids=list(ids))
+
+	def lookup(self, query, limit=MAX_CANDIDATES):
+		result = self._call("lookup", query=query, limit=limit)
+		return result['matches'], [(score, record) for score, record in result['candidates']]
+
+	def search(self, text, limit=MAX_CANDIDATES):
+		return [(score, record) for score, record in self._call("search", text=text, limit=limit)]
+
+	def query(self, text=None, location=None, limit=None, offset=0):
+		return self._call("query", text=text, location=location, limit=limit, offset=offset)
+
+	def count(self, text=None, location=None):
+		return self._call("count", text=text, location=location)
+
+	def locations(self):
+		return self._call("locations")
+
+	def existing(self, ids):
+		return set(self._call("existing", ids=list(ids)))
+
+	# ------------------------------------------------------------------ writes
+	def apply(self, adds=(), removes=(), compact_journal=True):
+		"""Upsert `adds` and remove `removes` (artifacts or ids) in the service."""
+		adds = [as_dict(a) for a in adds]
+		removes = [artifact_id(item) for item in removes]
+		if adds or removes:
+			self._call("apply", adds=adds, removes=removes, compact_journal=compact_journal)
+
+	def replace(self, records):
+		self._call("replace", records=[as_dict(a) for a in records])
+
+	def compact(self):
+		self._call("compact")
+
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+def open_local_store(backend):
+	from artifact_store import ARTIFACT_DB, DATA_FILE, ArtifactStore
+
+	if backend == "sqlite":
+		from sqlite_store import SqliteArtifactStore
+		return SqliteArtifactStore(ARTIFACT_DB)
+	return ArtifactStore(DATA_FILE)
+
+
+def serve(address, backend):
+	store = open_local_store(backend)
+	started = time.perf_counter()
+	# Load the records and the name index before the first worker asks
+	count = len(store.records())
+	store.index()
+	server = make_server(address, store)
+	logger.info("Serving %d artifacts (%s) on %s, loaded in %.2f s", count, backend, address, time.perf_counter() - started)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		if not _is_http(address):
+			Path(address).unlink(missing_ok=True)
+
+
+def main(argv=None):
+	from artifact_store import ARTIFACT_BACKEND
+
+	parser = argparse.ArgumentParser(description="Shared artifact service")
+	sub = parser.add_subparsers(dest="command", required=True)
+	run = sub.add_parser("serve", help="hold the store and serve the workers")
+	run.add_argument("--address", default=ARTIFACT_SERVICE, help="Unix socket path or http://host:port")
+	run.add_argument("--backend", choices=("json", "sqlite"), default=ARTIFACT_BACKEND if ARTIFACT_BACKEND != "service" else "json")
+	check = sub.add_parser("state", help="print the service's version (a health check)")
+	check.add_argument("--address", default=ARTIFACT_SERVICE)
+	args = parser.parse_args(argv)
+	logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+	if args.command == "serve":
+		serve(args.address, args.backend)
+	else:
+		try:
+			print(json.dumps(RemoteArtifactStore(args.address, ".")._request("GET", "/state")))
+		except ArtifactServiceError as exc:
+			print(exc, file=sys.stderr)
+			raise SystemExit(1)
+
+
+if __name__ == "__main__":
+	main()
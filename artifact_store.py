@@ -0,0 +1,326 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from artifact_index import MAX_CANDIDATES, ArtifactIndex, artifact_description, compact_record, normalize_name
+from persistence import (
+	ChangeLog,
+	add_op,
+	append_journal,
+	atomic_write_text,
+	compact,
+	file_lock,
+	journal_path,
+	read_journal,
+	read_json_array,
+	remove_op,
+	replay,
+	should_compact,
+)
+from records import ArtifactRecord, DescriptionBlobs, as_dict, record_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Created by the first write (see persistence.py), not on import
+DATA_DIR = Path(os.getenv("ARTIFACT_DATA_DIR", Path(__file__).parent / "data"))
+DATA_FILE = DATA_DIR / "string_list.json"
+
+# "json" (snapshot + journal, the default), "sqlite" (see sqlite_store.py) or
+# "service" (a shared artifact service holds the store, see artifact_service.py)
+ARTIFACT_BACKEND = os.getenv("ARTIFACT_BACKEND", "json").lower()
+ARTIFACT_DB = Path(os.getenv("ARTIFACT_DB", DATA_DIR / "artifacts.db"))
+
+# Address of the artifact service for the "service" backend (see artifact_service.py):
+# a Unix socket path or http://host:port
+ARTIFACT_SERVICE = os.getenv("ARTIFACT_SERVICE", str(DATA_DIR / "artifacts.sock"))
+
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+def convert_legacy(data):
+	"""Convert the legacy list-of-strings format into artifact dicts (first line is the name)."""
+	converted = []
+	for s in data:
+		name = s.splitlines()[0] if s else ""
+		converted.append({"name": name, "description": s})
+	return converted
+
+
+def is_legacy(data):
+	return isinstance(data, list) and bool(data) and isinstance(data[0], str)
+
+
+def artifact_id(artifact):
+	"""Stable key for an artifact: its normalized name."""
+	if isinstance(artifact, Mapping):
+		return normalize_name(artifact.get('name'))
+	return normalize_name(artifact)
+
+
+def matches_filter(artifact, text=None, location=None):
+	"""True when `text` is in the name or summary and `location` in the location (case-insensitive)."""
+	details = artifact.get('details') or {}
+	if location and location.lower() not in (details.get('location') or "").lower():
+		return False
+	if text:
+		haystack = f"{artifact.get('name') or ''} {details.get('summary') or ''}".lower()
+		return text.lower() in haystack
+	return True
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+class ArtifactStore:
+	"""Process-wide, in-memory copy of the persisted artifact list.
+
+	On disk the list is a snapshot (`string_list.json`) plus an append-only
+	journal of add/remove operations, folded back into the snapshot now and then.
+	Both are re-read only when their mtime or size changes. `version` is bumped
+	on every change so callers can skip work when it is the same as the last
+	version they saw, and `changes(since)` tells them which ids changed since.
+
+	Records are held as compact `ArtifactRecord`s: descriptions are moved to a blob
+	file next to the snapshot (`string_list.blobs`) and read back only on demand.
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self.blobs = DescriptionBlobs(self.path.with_suffix(".blobs"))
+		self.version = 0
+		self._lock = threading.RLock()
+		self._signature = None
+		self._by_id = {}
+		self._records = ()
+		self._journal_ops = 0
+		self._index = None
+		self._index_version = -1
+		self._log = ChangeLog()
+
+	def _stat(self):
+		signature = []
+		for path in (self.path, journal_path(self.path)):
+			try:
+				stat = path.stat()
+				signature.append((stat.st_mtime_ns, stat.st_size))
+			except FileNotFoundError:
+				signature.append(None)
+		return tuple(signature)
+
+	def _read_snapshot(self):
+		"""Yield the snapshot's artifacts one at a time, so the whole file is never parsed at once."""
+		if not self.path.exists():
+			return
+		try:
+			with open(self.path, encoding="utf-8") as stream:
+				items = read_json_array(stream)
+				first = next(items, None)
+				if isinstance(first, str):
+					yield from self._convert_legacy_snapshot([first, *items])
+					return
+				if first is not None:
+					yield first
+				yield from items
+		except Exception:
+			logger.exception("Could not parse %s; keeping the artifacts read before the error", self.path)
+
+	def _convert_legacy_snapshot(self, data):
+		data = convert_legacy(data)
+		try:
+			atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, indent=2))
+		except Exception:
+			logger.exception("Could not rewrite legacy data file %s", self.path)
+		return data
+
+	def _load(self):
+		"""Rebuild the in-memory copy from the snapshot plus journal (caller holds the file lock)."""
+		by_id = {}
+		for artifact in self._read_snapshot():
+			if isinstance(artifact, dict):
+				by_id[artifact_id(artifact)] = compact_record(artifact, self.blobs)
+		ops = read_journal(self.path)
+		previous = self._by_id
+		self._by_id = replay(by_id, ops, artifact_id)
+		self._compact_added(ops)
+		self._journal_ops = len(ops)
+		self._signature = self._stat()
+		if not self.version:
+			self._changed()
+			return
+		# Another process wrote: work out which records it touched for the change feed
+		added = [
+			key for key, record in self._by_id.items()
+			if key not in previous or record_fingerprint(record) != record_fingerprint(previous[key])
+		]
+		self._changed(added, [key for key in previous if key not in self._by_id])
+
+	def _compact_added(self, ops):
+		"""Swap the plain dicts that `replay` put in for compact records."""
+		for op in ops:
+			if not isinstance(op, dict):
+				continue
+			key = op.get("id")
+			if op.get("op") == "add" and isinstance(self._by_id.get(key), dict):
+				self._by_id[key] = compact_record(self._by_id[key], self.blobs)
+
+	def _changed(self, added=None, removed=()):
+		self._records = tuple(self._by_id.values())
+		self.version += 1
+		if added is None:
+			self._log.reset(self.version)
+		else:
+			self._log.record(self.version, added, removed)
+
+	def refresh(self):
+		"""Reload from disk if the files changed. Returns True when the records changed."""
+		if self.version and self._stat() == self._signature:
+			return False
+		with self._lock:
+			if self.version and self._stat() == self._signature:
+				return False
+			with file_lock(self.path):
+				self._load()
+			return True
+
+	def records(self):
+		"""Return the current records as an immutable tuple of read-only `ArtifactRecord`s."""
+		self.refresh()
+		return self._records
+
+	def data_version(self):
+		"""Identify the current on-disk data; unlike `version` it is the same across processes and restarts."""
+		self.refresh()
+		return hashlib.sha1(repr(self._signature).encode("utf-8")).hexdigest()
+
+	def changes(self, since):
+		"""Ids added (or changed) and removed after version `since`: `{"version", "added", "removed"}`.
+
+		Returns None when that version is too old to tell; reload `records` then.
+		"""
+		self.refresh()
+		return self._log.since(since, self.version)
+
+	def index(self):
+		"""Return a name index over the current records, rebuilt only after a change."""
+		records = self.records()
+		with self._lock:
+			if self._index_version != self.version:
+				self._index = ArtifactIndex(records)
+				self._index_version = self.version
+			return self._index
+
+	def lookup(self, query, limit=MAX_CANDIDATES):
+		"""Find artifacts by (possibly misspelled or partial) name. See `ArtifactIndex.lookup`."""
+		return self.index().lookup(query, limit)
+
+	def search(self, text, limit=MAX_CANDIDATES):
+		"""Full-text search over summaries and descriptions, as `(score, record)` pairs."""
+		words = normalize_name(text).split()
+		if not words:
+			return []
+		scored = []
+		for artifact in self.records():
+			details = artifact.get('details') or {}
+			haystack = normalize_name(" ".join([details.get('summary') or "", artifact_description(artifact)]))
+			hits = sum(1 for word in words if word in haystack)
+			if hits:
+				scored.append((hits / len(words), artifact))
+		scored.sort(key=lambda item: item[0], reverse=True)
+		return scored[:limit]
+
+	def query(self, text=None, location=None, limit=None, offset=0):
+		"""Return records filtered by name/summary text and location, in stored order."""
+		matched = [a for a in self.records() if matches_filter(a, text, location)]
+		end = None if limit is None else offset + limit
+		return matched[offset:end]
+
+	def count(self, text=None, location=None):
+		return sum(1 for a in self.records() if matches_filter(a, text, location))
+
+	def locations(self):
+		"""The distinct locations, sorted."""
+		return sorted({(a.get('details') or {}).get('location') for a in self.records()} - {None})
+
+	def existing(self, ids):
+		"""Return the subset of `ids` that are in the store."""
+		self.refresh()
+		return {key for key in ids if key in self._by_id}
+
+	def by_ids(self, ids):
+		"""Return `{id: record}` for the `ids` that are in the store."""
+		self.refresh()
+		by_id = self._by_id
+		return {key: by_id[key] for key in ids if key in by_id}
+
+	def apply(self, adds=(), removes=(), compact_journal=True):
+		"""Journal additions (upserts) and removals (by artifact or id), then apply them in memory.
+
+		Bulk writers pass `compact_journal=False` and call `compact` once at the end,
+		so the snapshot is not rewritten after every batch.
+		"""
+		ops = [remove_op(artifact_id(item)) for item in removes]
+		ops += [add_op(artifact_id(artifact), as_dict(artifact)) for artifact in adds]
+		if not ops:
+			return
+		with self._lock, file_lock(self.path):
+			# Pick up writes from other processes first so they are not lost
+			if self._stat() != self._signature:
+				self._load()
+			append_journal(self.path, ops)
+			replay(self._by_id, ops, artifact_id)
+			self._compact_added(ops)
+			self._journal_ops += len(ops)
+			if compact_journal and should_compact(self.path, self._journal_ops):
+				self._fold()
+			self._signature = self._stat()
+			self._changed(
+				[op['id'] for op in ops if op['op'] == "add"],
+				[op['id'] for op in ops if op['op'] == "remove"],
+			)
+
+	def compact(self):
+		"""Fold the journal into a fresh snapshot now."""
+		with self._lock, file_lock(self.path):
+			if self._stat() != self._signature:
+				self._load()
+			self._fold()
+			self._signature = self._stat()
+
+	def _fold(self):
+		"""Write the snapshot, and drop the descriptions of removed or edited artifacts from
+		the blob file once they take more than half of it (caller holds both locks)."""
+		compact(self.path, (as_dict(r) for r in self._by_id.values()))
+		self._journal_ops = 0
+		keep = [r.description_key for r in self._by_id.values() if isinstance(r, ArtifactRecord)]
+		if self.blobs.stale_bytes(keep) * 2 > self.blobs.size():
+			self.blobs.compact(keep)
+
+	def replace(self, records):
+		"""Make `records` the persisted list, journaling only the difference from the current one."""
+		current = {artifact_id(a): a for a in self.records()}
+		wanted = {artifact_id(a): a for a in records if isinstance(a, Mapping)}
+		removes = [key for key in current if key not in wanted]
+		adds = [a for key, a in wanted.items() if current.get(key) != a]
+		self.apply(adds=adds, removes=removes)
+
+
+def open_store():
+	"""Create the store for the configured backend."""
+	if ARTIFACT_BACKEND == "sqlite":
+		from sqlite_store import SqliteArtifactStore
+		return SqliteArtifactStore(ARTIFACT_DB)
+	if ARTIFACT_BACKEND == "service":
+		from artifact_service import RemoteArtifactStore
+		return RemoteArtifactStore(ARTIFACT_SERVICE, DATA_FILE)
+	return ArtifactStore(DATA_FILE)
+
+
+STORE = open_store()
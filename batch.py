@@ -0,0 +1,215 @@
+"""Headless batch answering: run a file of questions through the agent concurrently.
+
+Questions come from a text file (one per line), a JSONL file (objects with a
+`question` and optionally an `id`) or standard input. They run through the same
+`agent.run_agent` as the app, at most `--concurrency` at once and at most `--rpm`
+started per minute. Runs that fail with a transient API error (rate limit,
+connection, timeout, server error) are retried with exponential backoff and
+jitter. Results are written as JSON lines in input order, each as soon as every
+earlier question is done:
+
+	{"index": 0, "id": "faq-1", "question": "...", "answer": "...", "error": null,
+	 "attempts": 1, "seconds": 4.2, "ttft_ms": 900.1, "prompt_tokens": 3100,
+	 "cached_tokens": 2048, "completion_tokens": 240}
+
+	python batch.py questions.txt --concurrency 4 --rpm 60 --output answers.jsonl
+	python batch.py faq.jsonl --use-cache          # with RESPONSE_CACHE_DISK=1 the app serves these answers
+
+Tool results are shared across the batch: the memoized tools keep a result per
+distinct lookup for the whole batch, and concurrent identical lookups run once.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import openai
+
+from caching import reserve_tool_caches, tool_cache_stats
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Agent runs started per minute (0 = unlimited)
+BATCH_RPM = float(os.getenv("BATCH_RPM", "0"))
+
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "3"))
+
+# First retry delay in seconds; doubled for every further attempt, capped at BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Seconds one run may take before it is cancelled and retried (0 = no limit)
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "300"))
+
+RETRYABLE = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, asyncio.TimeoutError)
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+class RateLimiter:
+	"""Spaces out acquisitions to at most `per_minute`, allowing a burst of one."""
+
+	def __init__(self, per_minute):
+		self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+		self._next = 0.0
+		self._lock = asyncio.Lock()
+
+	async def acquire(self):
+		if not self.interval:
+			return
+		async with self._lock:
+			now = time.monotonic()
+			wait = self._next - now
+			self._next = max(now, self._next) + self.interval
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+
+class _SilentContainer:
+	"""Output container that drops the streamed repaints (the answer is returned at the end)."""
+
+	def markdown(self, text, **kwargs):
+		pass
+
+
+def backoff_seconds(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+	"""Delay before retry number `attempt` (1-based): exponential with full jitter."""
+	return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def read_questions(stream):
+	"""`(id, question)` pairs from plain lines or JSON lines (`{"id": ..., "question": ...}`)."""
+	for number, line in enumerate(stream, start=1):
+		line = line.strip()
+		if not line or line.startswith("#"):
+			continue
+		if line.startswith("{"):
+			record = json.loads(line)
+			yield record.get('id', number), record['question']
+		else:
+			yield number, line
+
+
+# ============================================================================
+# BATCH
+# ============================================================================
+async def answer_one(index, question_id, question, limiter, semaphore, retries=BATCH_RETRIES, timeout=BATCH_TIMEOUT, use_cache=False):
+	"""Answer one question with retries; returns its result record (never raises)."""
+	import agent
+
+	result = {"index": index, "id": question_id, "question": question, "answer": None, "error": None, "attempts": 0}
+	started = time.perf_counter()
+	async with semaphore:
+		if use_cache:
+			key, data_version, answer = agent.cached_answer(question)
+			if answer is not None:
+				result.update(answer=answer, cached=True, seconds=round(time.perf_counter() - started, 3))
+				return result
+		while True:
+			result['attempts'] += 1
+			await limiter.acquire()
+			try:
+				with span("batch.question", index=index, attempt=result['attempts']) as item:
+					run = agent.run_agent(question, _SilentContainer())
+					result['answer'] = await (asyncio.wait_for(run, timeout) if timeout else run)
+				break
+			except RETRYABLE as exc:
+				if result['attempts'] > retries:
+					result['error'] = f"{type(exc).__name__}: {exc}"
+					break
+				delay = backoff_seconds(result['attempts'])
+				logger.warning("Question %s failed (%s), retrying in %.1f s", question_id, type(exc).__name__, delay)
+				await asyncio.sleep(delay)
+			except Exception as exc:
+				logger.exception("Question %s failed", question_id)
+				result['error'] = f"{type(exc).__name__}: {exc}"
+				break
+	if result['answer'] is not None:
+		run_span = next((s for s in item.trace if s.name == "agent.run"), None)
+		if run_span is not None:
+			result.update({k: run_span.attributes.get(k) for k in ("ttft_ms", "prompt_tokens", "cached_tokens", "completion_tokens")})
+		if use_cache:
+			agent.RESPONSE_CACHE.set(key, data_version, result['answer'])
+	result['seconds'] = round(time.perf_counter() - started, 3)
+	return result
+
+
+async def run_batch(questions, out, concurrency=BATCH_CONCURRENCY, rpm=BATCH_RPM, retries=BATCH_RETRIES, timeout=BATCH_TIMEOUT, use_cache=False):
+	"""Answer `(id, question)` pairs, writing one JSON line per question to `out` in input order.
+
+	Returns `(answered, failed)` counts.
+	"""
+	questions = list(questions)
+	reserve_tool_caches(len(questions))
+	limiter = RateLimiter(rpm)
+	semaphore = asyncio.Semaphore(max(concurrency, 1))
+	tasks = [
+		asyncio.create_task(answer_one(index, question_id, question, limiter, semaphore, retries, timeout, use_cache))
+		for index, (question_id, question) in enumerate(questions)
+	]
+	answered = failed = 0
+	try:
+		# Awaiting in input order keeps the output ordered while later questions keep running
+		for task in tasks:
+			result = await task
+			if result['error'] is None:
+				answered += 1
+			else:
+				failed += 1
+			out.write(json.dumps(result, ensure_ascii=False) + "\n")
+			out.flush()
+	finally:
+		for task in tasks:
+			task.cancel()
+	return answered, failed
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Answer a file of questions with the archeologist agent")
+	parser.add_argument("questions", nargs="?", type=Path, help="text file (one question per line) or .jsonl; default: standard input")
+	parser.add_argument("--output", type=Path, help="JSONL file for the answers (default: standard output)")
+	parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions answered at once")
+	parser.add_argument("--rpm", type=float, default=BATCH_RPM, help="agent runs started per minute (0 = unlimited)")
+	parser.add_argument("--retries", type=int, default=BATCH_RETRIES, help="retries per question on transient API errors")
+	parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="seconds per attempt (0 = no limit)")
+	parser.add_argument("--use-cache", action="store_true", help="read and fill the whole-answer cache the app uses")
+	args = parser.parse_args(argv)
+	logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+	if args.questions is None and sys.stdin.isatty():
+		print("Type one question per line, then Ctrl-D (see --help for files).", file=sys.stderr)
+	source = open(args.questions, encoding="utf-8") if args.questions else sys.stdin
+	with source:
+		questions = list(read_questions(source))
+	out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+	started = time.perf_counter()
+	try:
+		answered, failed = asyncio.run(run_batch(
+			questions, out, args.concurrency, args.rpm, args.retries, args.timeout, args.use_cache,
+		))
+	finally:
+		if args.output:
+			out.close()
+	print(
+		f"{answered} answered, {failed} failed in {time.perf_counter() - started:.1f} s; "
+		f"tool caches: {json.dumps(tool_cache_stats())}",
+		file=sys.stderr,
+	)
+	if failed:
+		raise SystemExit(1)
+
+
+if __name__ == "__main__":
+	main()
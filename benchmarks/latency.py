@@ -0,0 +1,201 @@
+"""End-to-end latency benchmark against the offline stub model (no network needed).
+
+For every store size a fresh data directory is generated and a child process runs
+questions through `agent.run_agent` with `MODEL_PROVIDER=stub`, so the numbers cover
+the real tool code, the SDK run loop and the streaming renderer. Reported per size:
+p50/p95/p99 time to first token, total latency, time spent in tool calls, and the
+bytes the requests to the model would have carried.
+
+	python benchmarks/latency.py                       # sizes 3,100,1000,10000,100000
+	python benchmarks/latency.py --sizes 3,1000 --runs 50 --backend sqlite --output results.jsonl
+
+The stub's timing comes from the STUB_* variables described in stub_model.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = "3,100,1000,10000,100000"
+DEFAULT_RUNS = 20
+PERCENTILES = (50, 95, 99)
+
+
+# ============================================================================
+# DATA
+# ============================================================================
+def synthetic_artifacts(size, description_chars=None):
+	"""The three predefined artifacts plus numbered copies of them, `size` in total."""
+	from tools import PREDEFINED_ARTIFACTS
+
+	for i in range(size):
+		base = PREDEFINED_ARTIFACTS[i % len(PREDEFINED_ARTIFACTS)]
+		artifact = json.loads(json.dumps(base))
+		if i >= len(PREDEFINED_ARTIFACTS):
+			artifact['name'] = f"{base['name']} {i}"
+		if description_chars is not None:
+			details = artifact.get('details') or {}
+			details['description'] = (details.get('description') or "")[:description_chars]
+		yield artifact
+
+
+def write_store(data_dir, size, backend, description_chars=None):
+	"""Write `size` artifacts as a JSON snapshot (streamed, never all in memory) or a SQLite db."""
+	data_file = data_dir / "string_list.json"
+	with open(data_file, "w", encoding="utf-8") as out:
+		out.write("[")
+		for i, artifact in enumerate(synthetic_artifacts(size, description_chars)):
+			out.write(("," if i else "") + json.dumps(artifact, ensure_ascii=False))
+		out.write("]")
+	if backend == "sqlite":
+		from sqlite_store import migrate
+		migrate(data_file, data_dir / "artifacts.db")
+
+
+def questions_for(size, runs, seed=0):
+	"""Questions about random artifacts in the store; distinct names so tool caches rarely hit."""
+	from tools import PREDEFINED_ARTIFACTS
+
+	rng = random.Random(seed)
+	names = []
+	for _ in range(runs):
+		i = rng.randrange(size)
+		base = PREDEFINED_ARTIFACTS[i % len(PREDEFINED_ARTIFACTS)]['name']
+		names.append(base if i < len(PREDEFINED_ARTIFACTS) else f"{base} {i}")
+	return names
+
+
+# ============================================================================
+# MEASUREMENT (child process)
+# ============================================================================
+class TimingContainer:
+	"""Output container that timestamps the first repaint containing answer text."""
+
+	def __init__(self, started):
+		self.started = started
+		self.first_token = None
+		self.repaints = 0
+
+	def markdown(self, text, **kwargs):
+		self.repaints += 1
+		if self.first_token is None and text.startswith("### Summary"):
+			self.first_token = time.perf_counter() - self.started
+
+
+async def measure(questions):
+	import agent
+
+	model = agent.RUN_CONFIG.model_provider.model
+	samples = []
+	for question in questions:
+		model.reset_stats()
+		started = time.perf_counter()
+		container = TimingContainer(started)
+		await agent.run_agent(question, container)
+		samples.append({
+			"ttft": container.first_token,
+			"total": time.perf_counter() - started,
+			"tool": model.stats['tool_seconds'],
+			"bytes_sent": model.stats['bytes_sent'],
+			"requests": model.stats['requests'],
+			"repaints": container.repaints,
+		})
+	return samples
+
+
+def run_child(args):
+	questions = json.loads(sys.stdin.read())
+	for sample in asyncio.run(measure(questions)):
+		print(json.dumps(sample))
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+def percentile(values, pct):
+	values = sorted(v for v in values if v is not None)
+	if not values:
+		return None
+	rank = (len(values) - 1) * pct / 100
+	low = int(rank)
+	high = min(low + 1, len(values) - 1)
+	return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(size, samples, setup_seconds):
+	summary = {"size": size, "runs": len(samples), "setup_s": round(setup_seconds, 2)}
+	for metric in ("ttft", "total", "tool", "bytes_sent"):
+		for pct in PERCENTILES:
+			value = percentile([s[metric] for s in samples], pct)
+			summary[f"{metric}_p{pct}"] = None if value is None else round(value, 4 if metric != "bytes_sent" else None)
+	return summary
+
+
+def print_table(rows):
+	columns = ["size", "runs"] + [f"{m}_p{p}" for m in ("ttft", "total", "tool", "bytes_sent") for p in PERCENTILES]
+	print("  ".join(f"{c:>14}" for c in columns))
+	for row in rows:
+		print("  ".join(f"{'-' if row[c] is None else row[c]:>14}" for c in columns))
+
+
+def run_size(size, args):
+	with tempfile.TemporaryDirectory(prefix="artifact-bench-") as tmp:
+		data_dir = Path(tmp)
+		started = time.perf_counter()
+		write_store(data_dir, size, args.backend, args.description_chars)
+		setup_seconds = time.perf_counter() - started
+		env = dict(
+			os.environ,
+			MODEL_PROVIDER="stub",
+			ARTIFACT_DATA_DIR=str(data_dir),
+			ARTIFACT_BACKEND=args.backend,
+			ARTIFACT_DB=str(data_dir / "artifacts.db"),
+		)
+		child = subprocess.run(
+			[sys.executable, __file__, "--child"],
+			input=json.dumps(questions_for(size, args.runs, args.seed)),
+			capture_output=True, text=True, env=env, cwd=ROOT,
+		)
+		if child.returncode:
+			raise SystemExit(f"Benchmark for size {size} failed:\n{child.stderr}")
+		samples = [json.loads(line) for line in child.stdout.splitlines() if line.startswith("{")]
+	return summarize(size, samples, setup_seconds), samples
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Offline agent latency benchmark")
+	parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated store sizes")
+	parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="questions per store size")
+	parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+	parser.add_argument("--description-chars", type=int, default=None, help="truncate synthetic descriptions")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", type=Path, help="append summaries and raw samples as JSON lines")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.child:
+		run_child(args)
+		return
+
+	rows = []
+	for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+		summary, samples = run_size(size, args)
+		rows.append(summary)
+		print(f"size {size}: {len(samples)} runs", file=sys.stderr)
+		if args.output:
+			with open(args.output, "a", encoding="utf-8") as out:
+				out.write(json.dumps({"summary": summary, "backend": args.backend, "samples": samples}) + "\n")
+	print_table(rows)
+
+
+if __name__ == "__main__":
+	main()
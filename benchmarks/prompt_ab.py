@@ -0,0 +1,189 @@
+"""A/B comparison of system prompt variants on a fixed question set.
+
+Every variant runs the same questions in its own process (`PROMPT_VARIANT=<variant>`)
+against a fresh copy of the predefined artifacts, in `--passes` passes so the
+second pass shows the effect of a warm prompt cache. Reported per variant: p50/p95
+latency and time to first token, prompt tokens (and how many were cached),
+completion tokens and the estimated cost per question.
+
+	python benchmarks/prompt_ab.py                                  # offline stub model
+	python benchmarks/prompt_ab.py --provider openai --passes 2      # real API (costs money)
+	python benchmarks/prompt_ab.py --questions my_questions.txt --output ab.jsonl
+
+Prices are USD per 1M tokens and default to gpt-4.1's list prices; pass the current
+ones for other models. With the stub, answers do not depend on the prompt, so only
+prompt size, caching and cost differ between variants; judge answer quality from a
+run against the real model (`--output` keeps every answer).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from latency import percentile, write_store  # noqa: E402
+
+DEFAULT_VARIANTS = "v1.2,v1.2-lite"
+DEFAULT_PASSES = 2
+
+# USD per 1M tokens (gpt-4.1)
+DEFAULT_PRICE_INPUT = 2.00
+DEFAULT_PRICE_CACHED = 0.50
+DEFAULT_PRICE_OUTPUT = 8.00
+
+# Simple lookups, a comparison, a privacy question, an unknown artifact and a misspelling
+QUESTIONS = [
+	"What is the Laufen Lens made of?",
+	"When was the Hohenfeld Basalt Slab discovered?",
+	"What was the Altbrunn Prism used for?",
+	"What do the Laufen Lens and the Altbrunn Prism have in common?",
+	"Where is the Hohenfeld Basalt Slab kept right now?",
+	"Tell me about the Golden Sundial of Kessel.",
+	"how big is the laufen lense",
+	"Which artifacts were found at the same site?",
+]
+
+
+# ============================================================================
+# MEASUREMENT (child process)
+# ============================================================================
+class SilentContainer:
+	"""Output container that only keeps the final text."""
+
+	def markdown(self, text, **kwargs):
+		self.text = text
+
+
+async def measure(questions, passes):
+	import agent
+	from instrumentation import last_run
+
+	samples = []
+	for number in range(1, passes + 1):
+		for question in questions:
+			started = time.perf_counter()
+			answer = await agent.run_agent(question, SilentContainer())
+			run = last_run()
+			samples.append({
+				"pass": number,
+				"question": question,
+				"total": time.perf_counter() - started,
+				"ttft": (run.get('ttft_ms') or 0) / 1000 or None,
+				"prompt_tokens": run.get('prompt_tokens', 0),
+				"cached_tokens": run.get('cached_tokens', 0),
+				"completion_tokens": run.get('completion_tokens', 0),
+				"turns": run.get('turns', 0),
+				"answer": answer,
+			})
+	return {"prompt_chars": len(agent.SYSTEM_PROMPT), "cache_key": agent.PROMPT_CACHE_KEY, "samples": samples}
+
+
+def run_child(args):
+	request = json.loads(sys.stdin.read())
+	print(json.dumps(asyncio.run(measure(request['questions'], request['passes']))))
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+def cost(sample, args):
+	uncached = sample['prompt_tokens'] - sample['cached_tokens']
+	return (
+		uncached * args.price_input
+		+ sample['cached_tokens'] * args.price_cached
+		+ sample['completion_tokens'] * args.price_output
+	) / 1e6
+
+
+def summarize(variant, result, args, passes=None):
+	samples = [s for s in result['samples'] if passes is None or s['pass'] in passes]
+	count = max(len(samples), 1)
+	prompt = sum(s['prompt_tokens'] for s in samples)
+	cached = sum(s['cached_tokens'] for s in samples)
+	return {
+		"variant": variant,
+		"pass": "all" if passes is None else ",".join(map(str, passes)),
+		"runs": len(samples),
+		"prompt_chars": result['prompt_chars'],
+		"total_p50": round(percentile([s['total'] for s in samples], 50) or 0, 3),
+		"total_p95": round(percentile([s['total'] for s in samples], 95) or 0, 3),
+		"ttft_p50": round(percentile([s['ttft'] for s in samples], 50) or 0, 3),
+		"prompt_tok": round(prompt / count),
+		"cached_pct": round(100 * cached / prompt, 1) if prompt else 0.0,
+		"output_tok": round(sum(s['completion_tokens'] for s in samples) / count),
+		"usd_per_1k_q": round(1000 * sum(cost(s, args) for s in samples) / count, 3),
+	}
+
+
+def print_table(rows):
+	columns = list(rows[0])
+	print("  ".join(f"{c:>12}" for c in columns))
+	for row in rows:
+		print("  ".join(f"{row[c]:>12}" for c in columns))
+
+
+def run_variant(variant, questions, args):
+	with tempfile.TemporaryDirectory(prefix="prompt-ab-") as tmp:
+		data_dir = Path(tmp)
+		write_store(data_dir, 3, "json")
+		env = dict(
+			os.environ,
+			PROMPT_VARIANT=variant,
+			MODEL_PROVIDER=args.provider,
+			ARTIFACT_DATA_DIR=str(data_dir),
+			ARTIFACT_BACKEND="json",
+			TRACE_EXPORT="none",
+		)
+		child = subprocess.run(
+			[sys.executable, __file__, "--child"],
+			input=json.dumps({"questions": questions, "passes": args.passes}),
+			capture_output=True, text=True, env=env, cwd=ROOT,
+		)
+	if child.returncode:
+		raise SystemExit(f"Variant {variant} failed:\n{child.stderr}")
+	return json.loads(child.stdout.splitlines()[-1])
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Compare system prompt variants on latency and token cost")
+	parser.add_argument("--variants", default=DEFAULT_VARIANTS, help="comma-separated PROMPT_VARIANT values")
+	parser.add_argument("--provider", choices=("stub", "openai"), default="stub")
+	parser.add_argument("--questions", type=Path, help="text file with one question per line (default: built-in set)")
+	parser.add_argument("--passes", type=int, default=DEFAULT_PASSES, help="times the question set is asked")
+	parser.add_argument("--price-input", type=float, default=DEFAULT_PRICE_INPUT, help="USD per 1M uncached prompt tokens")
+	parser.add_argument("--price-cached", type=float, default=DEFAULT_PRICE_CACHED, help="USD per 1M cached prompt tokens")
+	parser.add_argument("--price-output", type=float, default=DEFAULT_PRICE_OUTPUT, help="USD per 1M completion tokens")
+	parser.add_argument("--output", type=Path, help="append summaries and raw samples (with answers) as JSON lines")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.child:
+		run_child(args)
+		return
+
+	questions = QUESTIONS
+	if args.questions:
+		questions = [line.strip() for line in args.questions.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+	rows = []
+	for variant in (v.strip() for v in args.variants.split(",") if v.strip()):
+		result = run_variant(variant, questions, args)
+		print(f"{variant}: {len(result['samples'])} runs, cache key {result['cache_key']}", file=sys.stderr)
+		rows.append(summarize(variant, result, args, passes=[1]))
+		if args.passes > 1:
+			rows.append(summarize(variant, result, args, passes=list(range(2, args.passes + 1))))
+		if args.output:
+			with open(args.output, "a", encoding="utf-8") as out:
+				out.write(json.dumps({"variant": variant, "provider": args.provider, "summary": rows[-1], **result}) + "\n")
+	print_table(rows)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,203 @@
+"""Several worker processes against one artifact service (see artifact_service.py).
+
+Starts `artifact_service.py serve` on a Unix socket (or `--http`) over a generated
+store, then `--workers` processes with `ARTIFACT_BACKEND=service`. Once all are
+ready, every worker saves `--writes` new artifacts one at a time while it times
+name lookups and a batched `by_ids` read. Then it waits, without polling, until
+its change notifications bring the store to the expected size. Reported per worker:
+time to load all records, write and lookup latency, notifications received, and
+how long after the last write anywhere it saw the final state. The run fails if a
+worker never converges or the service ends up with the wrong count.
+
+	python benchmarks/service.py                              # 4 workers, 20 writes each
+	python benchmarks/service.py --workers 8 --size 10000 --http --output service.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from latency import percentile, write_store  # noqa: E402
+
+DEFAULT_WORKERS = 4
+DEFAULT_WRITES = 20
+DEFAULT_LOOKUPS = 50
+DEFAULT_SIZE = 1000
+
+# Seconds a worker waits for the final state before the run counts as failed
+CONVERGE_TIMEOUT = 30.0
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+def run_child(args):
+	from artifact_store import STORE, artifact_id
+	from tools import persist_changes, seed_artifacts
+
+	expected = args.size + args.workers * args.writes
+	started = time.perf_counter()
+	records = STORE.records()
+	load_ms = (time.perf_counter() - started) * 1000
+
+	changed = threading.Event()
+	notifications = []
+	STORE.subscribe(lambda version: (notifications.append(version), changed.set()))
+	print("ready", flush=True)
+	sys.stdin.readline()  # the parent starts every worker at once
+
+	rng = random.Random(args.worker)
+	names = [a['name'] for a in seed_artifacts()]
+	write_ms, lookup_ms = [], []
+	for j in range(args.writes):
+		artifact = {"name": f"Worker {args.worker} Find {j}", "details": {"summary": f"Saved by worker {args.worker}."}}
+		started = time.perf_counter()
+		if not persist_changes(adds=[artifact]):
+			raise SystemExit(f"worker {args.worker}: write {j} failed")
+		write_ms.append((time.perf_counter() - started) * 1000)
+		for _ in range(max(args.lookups // max(args.writes, 1), 1)):
+			started = time.perf_counter()
+			STORE.lookup(rng.choice(names))
+			lookup_ms.append((time.perf_counter() - started) * 1000)
+	last_write_at = time.time()
+
+	ids = [artifact_id(a) for a in records[:100]]
+	started = time.perf_counter()
+	fetched = STORE.by_ids(ids)
+	batch_ms = (time.perf_counter() - started) * 1000
+
+	deadline = time.monotonic() + CONVERGE_TIMEOUT
+	converged_at = None
+	while time.monotonic() < deadline:
+		if len(STORE.records()) == expected:
+			converged_at = time.time()
+			break
+		changed.wait(deadline - time.monotonic())
+		changed.clear()
+	print(json.dumps({
+		"worker": args.worker,
+		"load_ms": round(load_ms, 1),
+		"write_ms_p50": round(percentile(write_ms, 50), 2),
+		"write_ms_p95": round(percentile(write_ms, 95), 2),
+		"lookup_ms_p50": round(percentile(lookup_ms, 50), 2),
+		"lookup_ms_p95": round(percentile(lookup_ms, 95), 2),
+		"by_ids_ms": round(batch_ms, 2),
+		"by_ids": len(fetched),
+		"notifications": len(notifications),
+		"last_write_at": last_write_at,
+		"converged_at": converged_at,
+		"records": len(STORE.records()),
+	}), flush=True)
+
+
+# ============================================================================
+# RUN
+# ============================================================================
+def free_port():
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def wait_for_service(env, address, timeout=30.0):
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		check = subprocess.run(
+			[sys.executable, "artifact_service.py", "state", "--address", address],
+			capture_output=True, text=True, env=env, cwd=ROOT,
+		)
+		if check.returncode == 0:
+			return json.loads(check.stdout)
+		time.sleep(0.2)
+	raise SystemExit(f"The artifact service did not come up on {address}")
+
+
+def run(args):
+	with tempfile.TemporaryDirectory(prefix="artifact-service-") as tmp:
+		tmp = Path(tmp)
+		write_store(tmp, args.size, "json")
+		address = f"http://127.0.0.1:{free_port()}" if args.http else str(tmp / "artifacts.sock")
+		env = dict(os.environ, ARTIFACT_DATA_DIR=str(tmp), ARTIFACT_BACKEND="json", TRACE_EXPORT="none")
+		service = subprocess.Popen(
+			[sys.executable, "artifact_service.py", "serve", "--address", address],
+			env=env, cwd=ROOT, stderr=subprocess.PIPE, text=True,
+		)
+		try:
+			wait_for_service(env, address)
+			workers = []
+			for i in range(args.workers):
+				# Each worker gets its own data directory: everything shared goes through the service
+				worker_dir = tmp / f"worker-{i}"
+				worker_dir.mkdir()
+				worker_env = dict(env, ARTIFACT_BACKEND="service", ARTIFACT_SERVICE=address, ARTIFACT_DATA_DIR=str(worker_dir))
+				workers.append(subprocess.Popen(
+					[sys.executable, __file__, "--child", "--worker", str(i), "--workers", str(args.workers),
+					 "--writes", str(args.writes), "--lookups", str(args.lookups), "--size", str(args.size)],
+					env=worker_env, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+				))
+			for worker in workers:
+				if worker.stdout.readline().strip() != "ready":
+					raise SystemExit("A worker failed to start")
+			for worker in workers:
+				worker.stdin.write("go\n")
+				worker.stdin.flush()
+			rows = []
+			for worker in workers:
+				out, _ = worker.communicate(timeout=CONVERGE_TIMEOUT + 60)
+				if worker.returncode:
+					raise SystemExit(f"A worker failed (exit {worker.returncode})")
+				rows.append(json.loads(out.strip().splitlines()[-1]))
+			final = wait_for_service(env, address)
+		finally:
+			service.terminate()
+			service.wait(timeout=10)
+	return rows, final
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Multi-process artifact service check")
+	parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+	parser.add_argument("--writes", type=int, default=DEFAULT_WRITES, help="artifacts saved per worker")
+	parser.add_argument("--lookups", type=int, default=DEFAULT_LOOKUPS, help="name lookups per worker")
+	parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="artifacts in the store at the start")
+	parser.add_argument("--http", action="store_true", help="serve on local TCP instead of a Unix socket")
+	parser.add_argument("--output", type=Path, help="append the per-worker results as JSON lines")
+	parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+	parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.child:
+		run_child(args)
+		return
+
+	rows, final = run(args)
+	last_write = max(row['last_write_at'] for row in rows)
+	columns = ["worker", "load_ms", "write_ms_p50", "write_ms_p95", "lookup_ms_p50", "lookup_ms_p95", "by_ids_ms", "notifications", "converge_ms"]
+	print("  ".join(f"{c:>13}" for c in columns))
+	for row in rows:
+		row['converge_ms'] = None if row['converged_at'] is None else round(max(row['converged_at'] - last_write, 0) * 1000, 1)
+		print("  ".join(f"{'-' if row[c] is None else row[c]:>13}" for c in columns))
+	if args.output:
+		with open(args.output, "a", encoding="utf-8") as out:
+			for row in rows:
+				out.write(json.dumps(dict(row, transport="http" if args.http else "unix")) + "\n")
+
+	expected = args.size + args.workers * args.writes
+	stale = [row['worker'] for row in rows if row['converged_at'] is None or row['records'] != expected]
+	if stale:
+		raise SystemExit(f"Workers {stale} did not see all {expected} artifacts")
+	print(f"\nAll {len(rows)} workers saw all {expected} artifacts (service version {final['version']})")
+
+
+if __name__ == "__main__":
+	main()
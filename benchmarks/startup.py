@@ -0,0 +1,144 @@
+"""Cold start profile: how long a fresh process takes to import each entry point.
+
+Every target is imported in its own fresh interpreter with `python -X importtime`,
+`--repeats` times, against a throwaway data directory. Reported per target: median
+and best wall time of the whole process, the import time the interpreter measured
+for the module itself, and the slowest modules it imports directly. The `app` target
+renders app.py once with Streamlit's test runner and reports the time to the first
+finished page, which is what a new replica's first visitor waits for.
+
+	python benchmarks/startup.py                            # default targets, 5 repeats
+	python benchmarks/startup.py --targets agent,tools --repeats 10 --top 15
+	python benchmarks/startup.py --output startup.json      # keep the full report
+
+`-X importtime` reports microseconds; the report is in milliseconds.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from latency import write_store  # noqa: E402
+
+DEFAULT_TARGETS = "app,agent_worker,tools,session_artifacts,importer,agent"
+DEFAULT_REPEATS = 5
+DEFAULT_TOP = 10
+
+# Renders the page once; the agent keeps loading on its warm-up thread afterwards
+APP_SNIPPET = """
+import time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120).run()
+print("first_page_ms", round((time.perf_counter() - started) * 1000, 1), len(at.exception))
+"""
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+def parse_importtime(stderr):
+	"""`(module, self_ms, cumulative_ms, depth)` for every line `-X importtime` printed."""
+	entries = []
+	for line in stderr.splitlines():
+		match = _IMPORT_LINE.match(line)
+		if match:
+			own, cumulative, indent, name = match.groups()
+			entries.append((name, int(own) / 1000, int(cumulative) / 1000, (len(indent) - 1) // 2))
+	return entries
+
+
+def run_target(target, env):
+	"""Import (or render) `target` once in a fresh interpreter; returns one sample."""
+	code = APP_SNIPPET if target == "app" else f"import {target}"
+	started = time.perf_counter()
+	child = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", code],
+		capture_output=True, text=True, env=env, cwd=ROOT,
+	)
+	wall_ms = (time.perf_counter() - started) * 1000
+	if child.returncode:
+		raise SystemExit(f"Importing {target} failed:\n{child.stderr[-2000:]}")
+	entries = parse_importtime(child.stderr)
+	sample = {"wall_ms": round(wall_ms, 1), "entries": entries}
+	if target == "app":
+		_, first_page_ms, exceptions = child.stdout.split()[-3:]
+		sample['import_ms'] = float(first_page_ms)
+		if int(exceptions):
+			print(f"app.py raised {exceptions} exception(s) while rendering", file=sys.stderr)
+	else:
+		sample['import_ms'] = next((cumulative for name, _, cumulative, depth in entries if name == target and depth == 0), None)
+	return sample
+
+
+def slowest_imports(entries, top, target):
+	"""The modules `target` imports directly (or, for the app, any top-level import), slowest first."""
+	depth = 0 if target == "app" else 1
+	direct = [(name, cumulative) for name, _, cumulative, d in entries if d == depth and name != target]
+	return [{"module": name, "ms": round(ms, 1)} for name, ms in sorted(direct, key=lambda e: -e[1])[:top]]
+
+
+def profile(target, repeats, top, env):
+	samples = [run_target(target, env) for _ in range(repeats)]
+	walls = [s['wall_ms'] for s in samples]
+	imports = [s['import_ms'] for s in samples if s['import_ms'] is not None]
+	# The slowest imports of the median run, so one noisy run does not decide the list
+	median_run = sorted(samples, key=lambda s: s['wall_ms'])[len(samples) // 2]
+	return {
+		"target": target,
+		"repeats": repeats,
+		"wall_ms_median": round(statistics.median(walls), 1),
+		"wall_ms_min": round(min(walls), 1),
+		"import_ms_median": round(statistics.median(imports), 1) if imports else None,
+		"modules": len(median_run['entries']),
+		"slowest": slowest_imports(median_run['entries'], top, target),
+	}
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+def print_report(rows):
+	columns = ["target", "wall_ms_median", "wall_ms_min", "import_ms_median", "modules"]
+	print("  ".join(f"{c:>18}" for c in columns))
+	for row in rows:
+		print("  ".join(f"{'-' if row[c] is None else row[c]:>18}" for c in columns))
+	for row in rows:
+		print(f"\n{row['target']}: slowest imports")
+		for item in row['slowest']:
+			print(f"  {item['ms']:>10.1f} ms  {item['module']}")
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Cold start (import time) profile")
+	parser.add_argument("--targets", default=DEFAULT_TARGETS, help="comma-separated modules; 'app' renders app.py")
+	parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="fresh processes per target")
+	parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="slowest imports listed per target")
+	parser.add_argument("--output", type=Path, help="write the report as JSON")
+	args = parser.parse_args(argv)
+
+	rows = []
+	with tempfile.TemporaryDirectory(prefix="artifact-startup-") as tmp:
+		write_store(Path(tmp), 3, "json")
+		env = dict(os.environ, ARTIFACT_DATA_DIR=tmp, TRACE_EXPORT="none")
+		for target in (t.strip() for t in args.targets.split(",") if t.strip()):
+			rows.append(profile(target, max(args.repeats, 1), args.top, env))
+			print(f"{target}: {rows[-1]['wall_ms_median']} ms", file=sys.stderr)
+	print_report(rows)
+	if args.output:
+		args.output.write_text(json.dumps({"python": sys.version.split()[0], "results": rows}, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+	main()
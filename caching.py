@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import inspect
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from artifact_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# Every memoized tool, by name, so stats can be reported in one place
+TOOL_CACHES = {}
+
+
+# ============================================================================
+# IN-MEMORY LRU + TTL
+# ============================================================================
+class TTLCache:
+	"""Thread-safe LRU cache whose entries also expire `ttl` seconds after they were set."""
+
+	def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()  # key -> (expires_at, value)
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return default
+			if entry[0] < time.monotonic():
+				del self._entries[key]
+				return default
+			self._entries.move_to_end(key)
+			return entry[1]
+
+	def set(self, key, value):
+		with self._lock:
+			self._entries[key] = (time.monotonic() + self.ttl, value)
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+def normalize_question(question):
+	"""Case, punctuation and whitespace do not change the answer."""
+	return normalize_name(question)
+
+
+class ResponseCache:
+	"""Whole-answer cache keyed by question, model, system prompt and artifact data version.
+
+	Entries live in an in-memory LRU with a TTL and, when `disk_path` is set, in a
+	small SQLite table that survives restarts. When the data version changes every
+	older entry is dropped, so a toggle in the repository never serves a stale answer.
+	"""
+
+	def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, disk_path=None):
+		self.ttl = ttl
+		self.memory = TTLCache(max_entries, ttl)
+		self.hits = 0
+		self.misses = 0
+		self._data_version = None
+		self._lock = threading.Lock()
+		self._disk = None
+		if disk_path:
+			try:
+				Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+				self._disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+				self._disk.execute("PRAGMA journal_mode=WAL")
+				self._disk.execute(
+					"CREATE TABLE IF NOT EXISTS responses ("
+					"key TEXT PRIMARY KEY, data_version TEXT NOT NULL, answer TEXT NOT NULL, created REAL NOT NULL)"
+				)
+			except sqlite3.Error:
+				logger.exception("Response cache disk tier disabled")
+				self._disk = None
+
+	@staticmethod
+	def key(question, model, system_prompt, data_version):
+		prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+		raw = "\x1f".join([normalize_question(question), model, prompt_hash, str(data_version)])
+		return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+	def _check_version(self, data_version):
+		"""Drop everything cached for an older version of the artifact data."""
+		data_version = str(data_version)
+		if data_version == self._data_version:
+			return
+		with self._lock:
+			if data_version == self._data_version:
+				return
+			if self._data_version is not None:
+				self.memory.clear()
+			if self._disk is not None:
+				try:
+					self._disk.execute("DELETE FROM responses WHERE data_version != ?", (data_version,))
+				except sqlite3.Error:
+					logger.exception("Could not prune the response cache")
+			self._data_version = data_version
+
+	def get(self, key, data_version):
+		self._check_version(data_version)
+		answer = self.memory.get(key)
+		if answer is None and self._disk is not None:
+			with self._lock:
+				row = self._disk.execute(
+					"SELECT answer FROM responses WHERE key = ? AND created > ?", (key, time.time() - self.ttl)
+				).fetchone()
+			if row:
+				answer = row[0]
+				self.memory.set(key, answer)
+		with self._lock:
+			if answer is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		return answer
+
+	def set(self, key, data_version, answer):
+		self._check_version(data_version)
+		self.memory.set(key, answer)
+		if self._disk is not None:
+			with self._lock:
+				try:
+					self._disk.execute(
+						"INSERT OR REPLACE INTO responses (key, data_version, answer, created) VALUES (?, ?, ?, ?)",
+						(key, str(data_version), answer, time.time()),
+					)
+				except sqlite3.Error:
+					logger.exception("Could not write to the response cache")
+
+
+# ============================================================================
+# TOOL MEMOIZATION
+# ============================================================================
+def _normalize_arg(value):
+	if isinstance(value, str):
+		return normalize_name(value)
+	if isinstance(value, (list, tuple)):
+		return tuple(_normalize_arg(v) for v in value)
+	if isinstance(value, dict):
+		return tuple(sorted((k, _normalize_arg(v)) for k, v in value.items()))
+	return value
+
+
+def memoize_tool(version=None, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+	"""Memoize a tool function by its name, normalized arguments and a data version.
+
+	Put it under `@function_tool` so the SDK still sees the original signature and
+	docstring. `version` is a callable returning the current version of the data the
+	tool reads (e.g. `STORE.data_version`); results for older versions are never
+	served. Empty results (the tools' error value) are not cached. Concurrent calls
+	with the same key (tools run in threads) compute the result once: later callers
+	wait for the first one and count as hits.
+	"""
+	def decorate(func):
+		signature = inspect.signature(func)
+		cache = TTLCache(max_entries, ttl)
+		stats = {"hits": 0, "misses": 0}
+		in_flight = {}  # key -> Event set when the first caller is done
+		in_flight_lock = threading.Lock()
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			bound = signature.bind(*args, **kwargs)
+			bound.apply_defaults()
+			arguments = tuple((name, _normalize_arg(value)) for name, value in bound.arguments.items())
+			key = (func.__name__, arguments, version() if version else None)
+			while True:
+				result = cache.get(key)
+				if result is not None:
+					stats['hits'] += 1
+					return result
+				with in_flight_lock:
+					done = in_flight.get(key)
+					if done is None:
+						in_flight[key] = done = threading.Event()
+						break
+				# Another thread is computing this result; use it once it is there
+				done.wait()
+				if cache.get(key) is None:
+					# It failed or came back empty: compute it here instead of waiting again
+					break
+			stats['misses'] += 1
+			try:
+				result = func(*args, **kwargs)
+				if result:
+					cache.set(key, result)
+			finally:
+				with in_flight_lock:
+					if in_flight.get(key) is done:
+						del in_flight[key]
+				done.set()
+			return result
+
+		wrapper.cache = cache
+		wrapper.cache_stats = lambda: {"hits": stats['hits'], "misses": stats['misses'], "size": len(cache)}
+		TOOL_CACHES[func.__name__] = wrapper
+		return wrapper
+	return decorate
+
+
+def reserve_tool_caches(entries):
+	"""Grow every memoized tool's cache to hold at least `entries` results.
+
+	A batch of N questions calls this with N, so every lookup made during the
+	batch is still cached when a later question repeats it.
+	"""
+	for wrapper in TOOL_CACHES.values():
+		wrapper.cache.max_entries = max(wrapper.cache.max_entries, entries)
+
+
+def tool_cache_stats():
+	"""Hit/miss counts and sizes for every memoized tool."""
+	return {name: wrapper.cache_stats() for name, wrapper in TOOL_CACHES.items()}
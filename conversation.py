@@ -0,0 +1,240 @@
+"""Per-session conversation memory for the agent, bounded by a token budget.
+
+Every finished question is stored as a turn: the user message, the tool calls and
+tool outputs of its run, and the answer, exactly as the model saw them. The next
+question is sent after these turns, so follow-ups ("and how old is it?") are
+answered in context. Once the turns exceed `CONVERSATION_TOKEN_BUDGET`, the oldest
+ones are folded into a short extractive summary (question, first sentence of the
+answer, artifacts looked up) that replaces them at the head of the input. The
+newest `CONVERSATION_RECENT_TURNS` turns always stay verbatim.
+
+Tool outputs are deduplicated against the context: while a run is active (see
+`active_conversation`), `dedupe_tool_output` removes description passages and
+artifact records that an earlier turn already sent and names them in an
+`already_in_conversation` list instead. A follow-up therefore costs the new
+passages only, and a repeated lookup costs a one-line note.
+"""
+import contextlib
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+
+from artifact_index import CHARS_PER_TOKEN
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Prompt tokens the stored turns (and their summary) may take before older turns are summarized
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "6000"))
+
+# Newest turns that are never summarized, whatever their size
+CONVERSATION_RECENT_TURNS = int(os.getenv("CONVERSATION_RECENT_TURNS", "2"))
+
+# Upper bound for the summary of older turns; its oldest lines are dropped beyond it
+SUMMARY_MAX_TOKENS = 500
+
+# Longest answer excerpt kept per summarized turn
+SUMMARY_ANSWER_CHARS = 240
+
+REPEATED_NOTE = "This result was already returned earlier in this conversation; use it from there."
+PARTLY_REPEATED_NOTE = "Entries listed in already_in_conversation were returned earlier in this conversation and are omitted here."
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_active = contextvars.ContextVar("active_conversation", default=None)
+
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+def estimate_tokens(value):
+	text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+	return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _key(kind, value):
+	text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+	return kind + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _entries(data):
+	"""`(key, label, entry)` for the passages and artifact records of a lookup result."""
+	for entry in data.get('passages') or ():
+		if isinstance(entry, dict):
+			yield _key("p:", entry.get('text', "")), entry.get('artifact'), entry
+	for entry in data.get('matches') or ():
+		if isinstance(entry, dict):
+			yield _key("m:", entry), entry.get('name'), entry
+
+
+def content_keys(output):
+	"""Keys of everything a tool output puts into the context: the whole output and its entries."""
+	keys = {_key("o:", output)}
+	try:
+		data = json.loads(output)
+	except (TypeError, ValueError):
+		return keys
+	if isinstance(data, dict):
+		keys.update(key for key, _, _ in _entries(data))
+	return keys
+
+
+def _answer_excerpt(answer):
+	"""First sentence of the answer body, without markdown headings."""
+	lines = [line.strip() for line in (answer or "").splitlines()]
+	text = " ".join(line for line in lines if line and not line.startswith("#"))
+	first = _SENTENCE_END.split(text, maxsplit=1)[0]
+	return first if len(first) <= SUMMARY_ANSWER_CHARS else first[:SUMMARY_ANSWER_CHARS].rstrip() + "…"
+
+
+def summarize_turn(turn):
+	"""One summary line for a turn: the question, the gist of the answer and the lookups made."""
+	lookups = []
+	for item in turn['items']:
+		if isinstance(item, dict) and item.get('type') == "function_call":
+			try:
+				arguments = json.loads(item.get('arguments') or "{}")
+			except ValueError:
+				arguments = {}
+			lookups.append(arguments.get('artifact_name') or arguments.get('question') or item.get('name'))
+	line = f"- Q: {turn['question']} A: {_answer_excerpt(turn['answer'])}"
+	if lookups:
+		line += f" (looked up: {'; '.join(str(l) for l in lookups)})"
+	return line
+
+
+# ============================================================================
+# CONVERSATION
+# ============================================================================
+class Conversation:
+	"""Turns of one session plus a summary of the turns that no longer fit the budget."""
+
+	def __init__(self, token_budget=CONVERSATION_TOKEN_BUDGET, recent_turns=CONVERSATION_RECENT_TURNS):
+		self.token_budget = token_budget
+		self.recent_turns = max(recent_turns, 1)
+		self.turns = []  # {"question", "items", "answer", "tokens"}
+		self.summary_lines = []
+		self.summarized_turns = 0
+		self._lock = threading.RLock()
+		self._context_keys = set()
+
+	def __len__(self):
+		return self.summarized_turns + len(self.turns)
+
+	@property
+	def tokens(self):
+		"""Estimated prompt tokens of the stored history."""
+		with self._lock:
+			return sum(t['tokens'] for t in self.turns) + (estimate_tokens(self._summary_text()) if self.summary_lines else 0)
+
+	def _summary_text(self):
+		return "Summary of the earlier conversation:\n" + "\n".join(self.summary_lines)
+
+	def clear(self):
+		with self._lock:
+			self.turns = []
+			self.summary_lines = []
+			self.summarized_turns = 0
+			self._context_keys = set()
+
+	def to_input(self, question):
+		"""Input items for a run answering `question` after the stored conversation.
+
+		Also resets the deduplication set to what these items contain, so a cancelled
+		run never leaves entries behind that the model did not get to see.
+		"""
+		with self._lock:
+			items = []
+			if self.summary_lines:
+				items.append({"role": "developer", "content": self._summary_text()})
+			for turn in self.turns:
+				items.extend(turn['items'])
+			items.append({"role": "user", "content": question})
+			self._context_keys = self._keys_in_context()
+			return items
+
+	def add_turn(self, question, new_items, answer):
+		"""Store a finished run (`new_items` as input items) and summarize what no longer fits."""
+		items = [{"role": "user", "content": question}, *new_items]
+		if not any(isinstance(i, dict) and i.get('role') == "assistant" for i in new_items):
+			items.append({"role": "assistant", "content": answer or ""})
+		with self._lock:
+			self.turns.append({"question": question, "items": items, "answer": answer or "", "tokens": estimate_tokens(items)})
+			while len(self.turns) > self.recent_turns and self.tokens > self.token_budget:
+				self._fold_oldest()
+			self._context_keys = self._keys_in_context()
+
+	def _fold_oldest(self):
+		turn = self.turns.pop(0)
+		self.summary_lines.append(summarize_turn(turn))
+		self.summarized_turns += 1
+		while len(self.summary_lines) > 1 and estimate_tokens(self._summary_text()) > SUMMARY_MAX_TOKENS:
+			self.summary_lines.pop(0)
+
+	def _keys_in_context(self):
+		keys = set()
+		for turn in self.turns:
+			for item in turn['items']:
+				if isinstance(item, dict) and item.get('type') == "function_call_output" and isinstance(item.get('output'), str):
+					keys |= content_keys(item['output'])
+		return keys
+
+	def dedupe(self, output):
+		"""Return `output` without the entries the context already holds, and remember the rest."""
+		if not isinstance(output, str) or not output:
+			return output
+		with self._lock:
+			whole = _key("o:", output)
+			if whole in self._context_keys:
+				return json.dumps({"already_in_conversation": True, "note": REPEATED_NOTE})
+			self._context_keys.add(whole)
+			try:
+				data = json.loads(output)
+			except ValueError:
+				return output
+			if not isinstance(data, dict):
+				return output
+			repeated = []
+			for field in ("passages", "matches"):
+				if not data.get(field):
+					continue
+				kept = []
+				for key, label, entry in _entries({field: data[field]}):
+					if key in self._context_keys:
+						repeated.append(label)
+					else:
+						self._context_keys.add(key)
+						kept.append(entry)
+				data[field] = kept
+			if not repeated:
+				return output
+			data['already_in_conversation'] = sorted({str(label) for label in repeated})
+			data['note'] = PARTLY_REPEATED_NOTE
+			return json.dumps(data, ensure_ascii=False)
+
+
+@contextlib.contextmanager
+def active_conversation(conversation):
+	"""Make `conversation` the one tool outputs are deduplicated against (None for none)."""
+	token = _active.set(conversation)
+	try:
+		yield conversation
+	finally:
+		_active.reset(token)
+
+
+def dedupe_tool_output(func):
+	"""Deduplicate a tool's output against the active conversation.
+
+	Put it under `@traced_tool` (so the traced size is what the model receives) and
+	over `@memoize_tool` (the memoized result stays complete).
+	"""
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		result = func(*args, **kwargs)
+		conversation = _active.get()
+		return conversation.dedupe(result) if conversation is not None else result
+	return wrapper
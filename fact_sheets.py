@@ -0,0 +1,244 @@
+"""Precomputed fact sheets: the handful of facts most questions need, per artifact.
+
+A fact sheet holds an artifact's measurements (each with the clause that says what
+was measured), excavation years and other years mentioned, materials, associated
+finds and proposed uses, extracted with the knowledge graph's rules. The agent tool
+sends sheets instead of descriptions of thousands of words, and sends the full
+description only when asked for it.
+
+Extraction only reads the summary and description, so a sheet is cached under their
+hashes in a file next to the data file (`string_list.facts.json`) and rebuilt only
+when one of them changes. Name, location and whether the location is public come
+from the record when the sheet is served. The importer updates sheets as it writes,
+and `python fact_sheets.py` precomputes them for the whole store.
+"""
+import hashlib
+import json
+import logging
+import re
+import sys
+import threading
+
+from artifact_index import CHARS_PER_TOKEN, artifact_description, description_hash
+from artifact_store import STORE, artifact_id
+from knowledge_graph import EXCAVATED_IN, FOUND_WITH, MADE_OF, USED_FOR, extract_facts
+from persistence import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Bump when the extraction rules change, so every cached sheet is rebuilt
+SHEET_VERSION = 1
+
+# Measurements kept per sheet, and the longest clause kept with one
+MAX_MEASUREMENTS = 12
+MAX_CLAUSE_CHARS = 100
+
+_YEAR = re.compile(r"\b(1[5-9]\d\d|20[0-4]\d)\b")
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_UNITS = r"cm|mm|m|km|kg|g|Hz|kHz|meters?|centimeters?|millimeters?|grams?|kilograms?|hertz"
+_MEASUREMENT = re.compile(rf"\b{_NUMBER}(?:\s*(?:x|×|-|–|to)\s*{_NUMBER})*\s*(?:{_UNITS})\b")
+_CLAUSE_BREAK = re.compile(r"[,;()]|(?<=[.!?])\s")
+
+# A location counts as public when the record says so, or when it names a public institution
+_PUBLIC_LOCATION = re.compile(r"\b(?:museum|gallery|exhibition|on display|public collection)\b", re.I)
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+def extract_measurements(text, limit=MAX_MEASUREMENTS):
+	"""Clauses of `text` that contain a number with a unit ("measuring 12.6 cm in length")."""
+	found = []
+	for clause in _CLAUSE_BREAK.split(" ".join((text or "").split())):
+		clause = clause.strip(" .")
+		if not clause or not _MEASUREMENT.search(clause):
+			continue
+		if len(clause) > MAX_CLAUSE_CHARS:
+			# Keep the part around the first measurement
+			start = max(_MEASUREMENT.search(clause).start() - MAX_CLAUSE_CHARS // 2, 0)
+			clause = clause[start:start + MAX_CLAUSE_CHARS].strip()
+		if clause not in found:
+			found.append(clause)
+		if len(found) >= limit:
+			break
+	return found
+
+
+def build_sheet(artifact):
+	"""The extracted part of a fact sheet (everything that depends on summary and description)."""
+	details = artifact.get('details') or {}
+	summary = details.get('summary') or ""
+	description = artifact_description(artifact)
+	facts = extract_facts(artifact)
+
+	def values(relation):
+		return [value for rel, _, value in facts if rel == relation]
+
+	excavated = values(EXCAVATED_IN)
+	other_years = sorted((set(_YEAR.findall(summary)) | set(_YEAR.findall(description))) - set(excavated))
+	return {
+		"measurements": extract_measurements(f"{summary} {description}"),
+		"excavation_years": excavated,
+		"other_years": other_years,
+		"materials": values(MADE_OF),
+		"finds": values(FOUND_WITH),
+		"proposed_uses": values(USED_FOR),
+	}
+
+
+def sheet_hash(artifact):
+	"""What a cached sheet depends on: the description hash plus the summary."""
+	summary = (artifact.get('details') or {}).get('summary') or ""
+	digest = hashlib.sha1(f"{SHEET_VERSION}\x1f{summary}".encode("utf-8")).hexdigest()[:12]
+	return f"{description_hash(artifact)}:{digest}"
+
+
+def location_is_public(artifact):
+	"""True when the record marks its location public or the location names a museum or exhibition."""
+	details = artifact.get('details') or {}
+	metadata = artifact.get('metadata') or {}
+	for flag in (details.get('location_public'), metadata.get('location_public')):
+		if flag is not None:
+			return flag is True or str(flag).lower() in ("1", "true", "yes")
+	return bool(_PUBLIC_LOCATION.search(details.get('location') or ""))
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+class FactSheets:
+	"""Fact sheets of every artifact, keyed by id and cached on disk by content hash."""
+
+	def __init__(self, data_path):
+		self.path = data_path.with_suffix(".facts.json")
+		self._lock = threading.RLock()
+		self._sheets = {}  # artifact id -> {"hash", "sheet"}
+		self._store_version = None
+		self._load()
+
+	def _load(self):
+		try:
+			self._sheets = json.loads(self.path.read_text(encoding="utf-8"))
+		except FileNotFoundError:
+			return
+		except Exception:
+			logger.exception("Ignoring unreadable fact sheets; they will be rebuilt")
+
+	def save(self):
+		with self._lock:
+			try:
+				atomic_write_text(self.path, json.dumps(self._sheets, ensure_ascii=False))
+			except Exception:
+				logger.exception("Could not save the fact sheets")
+
+	def __len__(self):
+		return len(self._sheets)
+
+	def _ensure(self, artifact):
+		"""Return the cached sheet for `artifact`, building it if its content changed (caller holds the lock)."""
+		key = artifact_id(artifact)
+		digest = sheet_hash(artifact)
+		entry = self._sheets.get(key)
+		if entry is None or entry['hash'] != digest:
+			entry = self._sheets[key] = {"hash": digest, "sheet": build_sheet(artifact)}
+			return entry['sheet'], True
+		return entry['sheet'], False
+
+	def update(self, artifacts, save=True):
+		"""Build the sheets of new or changed `artifacts`. Returns how many were rebuilt."""
+		with self._lock:
+			rebuilt = sum(self._ensure(a)[1] for a in artifacts)
+		if rebuilt and save:
+			self.save()
+		return rebuilt
+
+	def sync(self, records):
+		"""Bring the sheets in line with `records`: rebuild changed ones, drop removed ones."""
+		with self._lock:
+			records = list(records)
+			wanted = {artifact_id(a) for a in records}
+			dropped = [key for key in self._sheets if key not in wanted]
+			for key in dropped:
+				del self._sheets[key]
+			rebuilt = self.update(records, save=False)
+		if rebuilt or dropped:
+			self.save()
+		return rebuilt
+
+	def refresh(self, store=STORE):
+		"""Sync with the store if its version moved: just the changed artifacts when its
+		change feed covers the gap, otherwise all of them."""
+		store.refresh()
+		version = store.version
+		if self._store_version == version:
+			return
+		delta = store.changes(self._store_version) if self._store_version is not None else None
+		if delta is None:
+			self.sync(store.records())
+		else:
+			with self._lock:
+				dropped = [key for key in delta['removed'] if self._sheets.pop(key, None) is not None]
+				rebuilt = self.update(store.by_ids(delta['added']).values(), save=False)
+			if rebuilt or dropped:
+				self.save()
+			version = delta['version']
+		self._store_version = version
+
+	def sheet(self, artifact):
+		"""The served fact sheet: name, summary and location (only if public) plus the extracted facts."""
+		with self._lock:
+			facts, _ = self._ensure(artifact)
+		details = artifact.get('details') or {}
+		public = location_is_public(artifact)
+		sheet = {"name": artifact.get('name')}
+		if artifact.get('discovered_date'):
+			sheet['discovered_date'] = artifact['discovered_date']
+		if details.get('summary'):
+			sheet['summary'] = details['summary']
+		sheet['location_public'] = public
+		if public and details.get('location'):
+			sheet['location'] = details['location']
+		sheet.update(facts)
+		return sheet
+
+
+_sheets = None
+_sheets_lock = threading.Lock()
+
+
+def get_fact_sheets():
+	"""Return the process-wide fact sheets."""
+	global _sheets
+	with _sheets_lock:
+		if _sheets is None:
+			_sheets = FactSheets(STORE.path)
+	return _sheets
+
+
+def fact_sheets_for(artifacts):
+	"""Served fact sheets for `artifacts`, after syncing with the store if it changed."""
+	sheets = get_fact_sheets()
+	sheets.refresh()
+	return [sheets.sheet(a) for a in artifacts]
+
+
+def main():
+	"""Precompute the fact sheets of every artifact in the store."""
+	sheets = get_fact_sheets()
+	STORE.refresh()
+	records = list(STORE.records())
+	rebuilt = sheets.sync(records)
+	sheet_chars = sum(len(json.dumps(sheets.sheet(a), ensure_ascii=False)) for a in records)
+	description_chars = sum(len(artifact_description(a)) for a in records)
+	print(
+		f"{len(records)} artifacts, {rebuilt} sheets rebuilt; about {sheet_chars // CHARS_PER_TOKEN} tokens "
+		f"of fact sheets instead of {description_chars // CHARS_PER_TOKEN} tokens of descriptions ({sheets.path})",
+		file=sys.stderr,
+	)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,295 @@
+"""Streaming bulk import of artifact catalogues into the repository.
+
+Accepted formats (picked from the file extension, or with --format):
+
+	jsonl   one artifact object per line (`.jsonl`, `.ndjson`)
+	csv     a header row with `name` and optionally `location`, `summary`, `description`,
+	        `discovered_date` and `aliases` (separated by `;`); other columns become metadata
+	json    a JSON array of artifact objects, or the legacy list of strings whose first
+	        line is the name
+
+Records are read one at a time, validated, deduplicated by name (the first one wins;
+artifacts already in the repository are skipped unless --replace is given) and
+written in batches, so memory use does not grow with the size of the input (apart
+from one id per imported artifact for deduplication).
+
+	python importer.py finds.jsonl [--batch-size 500] [--replace] [--no-index]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+from artifact_store import STORE, artifact_id
+from fact_sheets import get_fact_sheets
+from persistence import read_json_array
+from semantic_index import get_index
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+BATCH_SIZE = 500
+
+# Longest artifact name accepted
+MAX_NAME_CHARS = 200
+
+DETAIL_FIELDS = ("location", "summary", "description")
+KNOWN_FIELDS = {"name", "discovered_date", "aliases", "details", "metadata", *DETAIL_FIELDS}
+
+FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".json": "json"}
+
+
+class InvalidRecord(ValueError):
+	"""A record that cannot be imported; the message says why."""
+
+
+# ============================================================================
+# READERS
+# ============================================================================
+def read_jsonl(stream):
+	for line in stream:
+		line = line.strip()
+		if line:
+			try:
+				yield json.loads(line)
+			except json.JSONDecodeError as exc:
+				yield InvalidRecord(f"not valid JSON ({exc.msg})")
+
+
+def read_csv(stream):
+	for row in csv.DictReader(stream):
+		record = {"metadata": {}}
+		for column, value in row.items():
+			if column is None or value in (None, ""):
+				continue
+			column = column.strip().lower()
+			if column == "aliases":
+				record['aliases'] = [a.strip() for a in value.split(";") if a.strip()]
+			elif column in KNOWN_FIELDS:
+				record[column] = value
+			else:
+				record['metadata'][column] = value
+		yield record
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "json": read_json_array}
+
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+def normalize_record(raw):
+	"""Turn an input record (flat, nested or a legacy string) into a stored artifact dict."""
+	if isinstance(raw, InvalidRecord):
+		raise raw
+	if isinstance(raw, str):
+		# Legacy format: the first line is the name, the whole string the description
+		raw = {"name": raw.splitlines()[0] if raw else "", "description": raw}
+	if not isinstance(raw, dict):
+		raise InvalidRecord(f"expected an object, got {type(raw).__name__}")
+
+	name = raw.get('name')
+	if not isinstance(name, str) or not name.strip():
+		raise InvalidRecord("missing name")
+	name = " ".join(name.split())
+	if len(name) > MAX_NAME_CHARS:
+		raise InvalidRecord(f"name longer than {MAX_NAME_CHARS} characters")
+	if not artifact_id(name):
+		raise InvalidRecord("name has no letters or digits")
+
+	details = raw.get('details') or {}
+	if not isinstance(details, Mapping):
+		raise InvalidRecord("details must be an object")
+	details = dict(details)
+	for field in DETAIL_FIELDS:
+		if raw.get(field) is not None:
+			details.setdefault(field, raw[field])
+	for field in DETAIL_FIELDS:
+		if details.get(field) is not None and not isinstance(details[field], str):
+			raise InvalidRecord(f"{field} must be text")
+
+	artifact = {"name": name}
+	if raw.get('discovered_date'):
+		artifact['discovered_date'] = str(raw['discovered_date'])
+	aliases = raw.get('aliases')
+	if aliases:
+		if not isinstance(aliases, list) or not all(isinstance(a, str) for a in aliases):
+			raise InvalidRecord("aliases must be a list of names")
+		artifact['aliases'] = aliases
+	if details:
+		artifact['details'] = {k: v for k, v in details.items() if v is not None}
+	metadata = raw.get('metadata') or {}
+	if not isinstance(metadata, Mapping):
+		raise InvalidRecord("metadata must be an object")
+	metadata = dict(metadata)
+	metadata.update({k: v for k, v in raw.items() if k not in KNOWN_FIELDS})
+	if metadata:
+		artifact['metadata'] = metadata
+	return artifact
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+class ImportReport:
+	"""Counts and timing of one import."""
+
+	def __init__(self):
+		self.read = 0
+		self.imported = 0
+		self.duplicates = 0
+		self.invalid = 0
+		self.errors = []  # first few (record number, reason) pairs
+		self.bytes = 0
+		self.started = time.perf_counter()
+		self.seconds = 0.0
+
+	@property
+	def per_second(self):
+		return self.read / self.seconds if self.seconds else 0.0
+
+	def summary(self):
+		return (
+			f"Read {self.read} records in {self.seconds:.1f} s ({self.per_second:,.0f} records/s, "
+			f"{self.bytes / max(self.seconds, 1e-9) / 1e6:.1f} MB/s): {self.imported} imported, "
+			f"{self.duplicates} duplicates skipped, {self.invalid} invalid"
+		)
+
+
+class _CountingReader(io.TextIOBase):
+	"""Text stream wrapper that counts the bytes read, for throughput."""
+
+	def __init__(self, stream, report):
+		self._stream = stream
+		self._report = report
+
+	def readable(self):
+		return True
+
+	def read(self, size=-1):
+		data = self._stream.read(size)
+		self._report.bytes += len(data.encode("utf-8"))
+		return data
+
+	def readline(self, size=-1):
+		data = self._stream.readline(size)
+		self._report.bytes += len(data.encode("utf-8"))
+		return data
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		line = self.readline()
+		if not line:
+			raise StopIteration
+		return line
+
+
+def detect_format(name):
+	fmt = FORMATS.get(Path(name).suffix.lower())
+	if fmt is None:
+		raise ValueError(f"Cannot tell the format of {name}; pass one of {sorted(READERS)}")
+	return fmt
+
+
+def import_stream(stream, fmt, store=STORE, batch_size=BATCH_SIZE, replace=False, update_index=True, progress=None):
+	"""Import artifacts from a text stream. Returns an `ImportReport`.
+
+	`progress`, if given, is called with the report after every batch.
+	"""
+	report = ImportReport()
+	index = get_index() if update_index else None
+	sheets = get_fact_sheets() if update_index else None
+	seen = set()
+	batch = []
+
+	def write_batch():
+		if replace:
+			fresh = batch
+		else:
+			present = store.existing(artifact_id(a) for a in batch)
+			fresh = [a for a in batch if artifact_id(a) not in present]
+			report.duplicates += len(batch) - len(fresh)
+		if fresh:
+			store.apply(adds=fresh, compact_journal=False)
+			if index is not None:
+				# One shard per batch: the passage texts go to disk and shards are merged
+				# logarithmically, so nothing is rewritten once per batch
+				index.update(fresh, save=False)
+				index.save()
+			if sheets is not None:
+				sheets.update(fresh, save=False)
+		report.imported += len(fresh)
+		report.seconds = time.perf_counter() - report.started
+		batch.clear()
+		if progress is not None:
+			progress(report)
+
+	try:
+		for number, raw in enumerate(READERS[fmt](_CountingReader(stream, report)), start=1):
+			report.read += 1
+			try:
+				artifact = normalize_record(raw)
+			except InvalidRecord as exc:
+				report.invalid += 1
+				if len(report.errors) < 20:
+					report.errors.append((number, str(exc)))
+				continue
+			key = artifact_id(artifact)
+			if key in seen:
+				report.duplicates += 1
+				continue
+			seen.add(key)
+			batch.append(artifact)
+			if len(batch) >= batch_size:
+				write_batch()
+		if batch:
+			write_batch()
+	finally:
+		# Also after an unreadable input: fold what was written into the snapshot
+		if report.imported:
+			store.compact()
+			if sheets is not None:
+				sheets.save()
+	report.seconds = time.perf_counter() - report.started
+	return report
+
+
+def import_file(path, fmt=None, **kwargs):
+	path = Path(path)
+	with open(path, encoding="utf-8-sig", newline="") as stream:
+		return import_stream(stream, fmt or detect_format(path.name), **kwargs)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Bulk import artifacts into the repository")
+	parser.add_argument("path", type=Path)
+	parser.add_argument("--format", choices=sorted(READERS), help="default: from the file extension")
+	parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+	parser.add_argument("--replace", action="store_true", help="overwrite artifacts that already exist")
+	parser.add_argument("--no-index", action="store_true", help="do not update the semantic search index and fact sheets")
+	args = parser.parse_args(argv)
+
+	def progress(report):
+		print(f"\r{report.read} read, {report.imported} imported ({report.per_second:,.0f}/s)", end="", file=sys.stderr, flush=True)
+
+	report = import_file(
+		args.path, args.format, batch_size=args.batch_size, replace=args.replace,
+		update_index=not args.no_index, progress=progress,
+	)
+	print(file=sys.stderr)
+	for number, reason in report.errors:
+		print(f"record {number}: {reason}", file=sys.stderr)
+	print(report.summary())
+
+
+if __name__ == "__main__":
+	main()
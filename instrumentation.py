@@ -0,0 +1,329 @@
+"""Per-run spans for the agent pipeline, exported to a local file and summarized in memory.
+
+A span is opened with `span(name, **attributes)`. Spans opened while another span is
+active (also across `await` and the SDK's tool threads, which copy the context)
+become its children and share its trace; a span with no active parent starts a new
+trace. When the root span of a trace ends, the whole trace is written to
+`TRACE_FILE`:
+
+	TRACE_EXPORT=jsonl  one JSON object per span (the default)
+	TRACE_EXPORT=otlp   one OTLP/JSON `resourceSpans` document per trace, as written by
+	                    the OpenTelemetry collector's file exporter
+	TRACE_EXPORT=none   keep only the in-memory summary
+
+The file is rotated once it would grow past `TRACE_MAX_BYTES` (`traces.jsonl.1` is
+the previous one, up to `TRACE_BACKUPS` are kept), and `TRACE_SAMPLE_RATE` exports
+only that share of the traces (traces with an error are always exported). The
+in-memory summary sees every span either way.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import zlib
+import time
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "jsonl").lower()
+TRACE_FILE = Path(os.getenv(
+	"TRACE_FILE",
+	Path(os.getenv("ARTIFACT_DATA_DIR", Path(__file__).parent / "data")) / ("traces.otlp.jsonl" if TRACE_EXPORT == "otlp" else "traces.jsonl"),
+))
+
+# Rotate the trace file before it grows past this many bytes, keeping this many old files
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+
+# Share of traces written to the file (0..1), chosen by trace id
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+
+# Durations kept per span name for the percentiles in `summary()`
+SUMMARY_WINDOW = 500
+
+# Longest string attribute kept on a span (tool arguments can be long)
+MAX_ATTRIBUTE_CHARS = 200
+
+SERVICE_NAME = "archeologist-agent"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_run_sink = contextvars.ContextVar("run_sink", default=None)
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+class Span:
+	"""One timed operation. `trace` is the list of finished spans shared by the whole trace."""
+
+	__slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "events", "start_ns", "end_ns", "_start", "duration_ms", "trace")
+
+	def __init__(self, name, parent=None, attributes=None):
+		self.name = name
+		self.parent_id = parent.span_id if parent else None
+		self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+		self.trace = parent.trace if parent else []
+		self.span_id = secrets.token_hex(8)
+		self.attributes = {}
+		self.events = []
+		self.start_ns = time.time_ns()
+		self._start = time.perf_counter()
+		self.end_ns = None
+		self.duration_ms = None
+		self.set(**(attributes or {}))
+
+	def set(self, **attributes):
+		for key, value in attributes.items():
+			if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+				value = value[:MAX_ATTRIBUTE_CHARS] + "…"
+			self.attributes[key] = value
+
+	def add_event(self, name, **attributes):
+		self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+	def end(self):
+		self.duration_ms = (time.perf_counter() - self._start) * 1000
+		self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+
+	def to_dict(self):
+		return {
+			"trace_id": self.trace_id,
+			"span_id": self.span_id,
+			"parent_id": self.parent_id,
+			"name": self.name,
+			"start_ns": self.start_ns,
+			"end_ns": self.end_ns,
+			"duration_ms": round(self.duration_ms, 3),
+			"attributes": self.attributes,
+			"events": self.events,
+		}
+
+
+def current_span():
+	return _current.get()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+	"""Time the block as a span named `name`; yields the `Span` so attributes can be added."""
+	parent = _current.get()
+	item = Span(name, parent, attributes)
+	token = _current.set(item)
+	try:
+		yield item
+	except BaseException as exc:
+		item.set(error=type(exc).__name__)
+		raise
+	finally:
+		_current.reset(token)
+		item.end()
+		_finish(item, is_root=parent is None)
+
+
+def record_span(name, start_ns, duration_ms, **attributes):
+	"""Add an already-measured span (e.g. one model turn seen through stream events) under the current one."""
+	parent = _current.get()
+	item = Span(name, parent, attributes)
+	item.start_ns = start_ns
+	item.duration_ms = duration_ms
+	item.end_ns = start_ns + int(duration_ms * 1e6)
+	_finish(item, is_root=parent is None)
+	return item
+
+
+def traced(name):
+	"""Decorator form of `span` for plain functions."""
+	def decorate(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with span(name):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+def traced_tool(func):
+	"""Wrap a tool function in a `tool.<name>` span with its arguments and result size.
+
+	Put it under `@function_tool` (and over `@memoize_tool`, so cache hits are timed too).
+	"""
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		with span(f"tool.{func.__name__}", arguments=json.dumps([args, kwargs], ensure_ascii=False, default=str)) as item:
+			result = func(*args, **kwargs)
+			item.set(result_bytes=len((result or "").encode("utf-8")))
+			return result
+	return wrapper
+
+
+# ============================================================================
+# SUMMARY
+# ============================================================================
+_stats_lock = threading.Lock()
+_durations = {}  # span name -> deque of recent durations (ms)
+_counts = {}
+_last_run = {}
+
+
+def _finish(item, is_root):
+	with _stats_lock:
+		_durations.setdefault(item.name, deque(maxlen=SUMMARY_WINDOW)).append(item.duration_ms)
+		_counts[item.name] = _counts.get(item.name, 0) + 1
+	item.trace.append(item)
+	if not is_root:
+		return
+	if item.name == "agent.run":
+		run = dict(item.attributes, duration_ms=item.duration_ms, turns=[
+			dict(s.attributes, duration_ms=round(s.duration_ms, 1)) for s in item.trace if s.name == "model.turn"
+		])
+		with _stats_lock:
+			_last_run.clear()
+			_last_run.update(run)
+		runs = _run_sink.get()
+		if runs is not None:
+			runs.append(run)
+	try:
+		export(item.trace)
+	except Exception:
+		logger.exception("Could not export trace %s", item.trace_id)
+
+
+def _percentile(values, pct):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(round((len(values) - 1) * pct / 100)))]
+
+
+def summary():
+	"""Count and p50/p95/max duration (ms) per span name, slowest total first."""
+	with _stats_lock:
+		rows = [
+			{
+				"span": name,
+				"count": _counts[name],
+				"p50_ms": round(_percentile(values, 50), 1),
+				"p95_ms": round(_percentile(values, 95), 1),
+				"max_ms": round(max(values), 1),
+			}
+			for name, values in _durations.items() if values
+		]
+	rows.sort(key=lambda row: row['p50_ms'] * row['count'], reverse=True)
+	return rows
+
+
+def last_run():
+	"""Attributes of the latest finished `agent.run` in this process, plus token counts per model turn."""
+	with _stats_lock:
+		return dict(_last_run)
+
+
+@contextlib.contextmanager
+def capture_runs():
+	"""Collect what `last_run` would show for each `agent.run` finished in this context.
+
+	Yields a list the runs are appended to. Unlike `last_run`, it never sees the runs
+	of other sessions.
+	"""
+	runs = []
+	token = _run_sink.set(runs)
+	try:
+		yield runs
+	finally:
+		_run_sink.reset(token)
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+_export_lock = threading.Lock()
+
+
+def _otlp_value(value):
+	if isinstance(value, bool):
+		return {"boolValue": value}
+	if isinstance(value, int):
+		return {"intValue": str(value)}
+	if isinstance(value, float):
+		return {"doubleValue": value}
+	return {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}
+
+
+def _otlp_attributes(attributes):
+	return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(spans):
+	"""Spans of one trace as an OTLP/JSON `resourceSpans` document."""
+	return {"resourceSpans": [{
+		"resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+		"scopeSpans": [{
+			"scope": {"name": __name__},
+			"spans": [
+				{
+					"traceId": s.trace_id,
+					"spanId": s.span_id,
+					**({"parentSpanId": s.parent_id} if s.parent_id else {}),
+					"name": s.name,
+					"kind": 1,
+					"startTimeUnixNano": str(s.start_ns),
+					"endTimeUnixNano": str(s.end_ns),
+					"attributes": _otlp_attributes(s.attributes),
+					"events": [
+						{"timeUnixNano": str(e['time_ns']), "name": e['name'], "attributes": _otlp_attributes(e['attributes'])}
+						for e in s.events
+					],
+					"status": {"code": 2} if "error" in s.attributes else {},
+				}
+				for s in spans
+			],
+		}],
+	}]}
+
+
+def sampled(trace_id, rate=TRACE_SAMPLE_RATE):
+	"""Whether a trace is exported; the same trace id always gets the same answer."""
+	if rate >= 1:
+		return True
+	return zlib.crc32(trace_id.encode("ascii")) < rate * 2 ** 32
+
+
+def rotate(path, backups=TRACE_BACKUPS):
+	"""Shift `path` to `path.1` (and `.1` to `.2`, ...), dropping the oldest beyond `backups`."""
+	if backups <= 0:
+		path.unlink(missing_ok=True)
+		return
+	for number in range(backups - 1, 0, -1):
+		older = path.with_name(f"{path.name}.{number}")
+		if older.exists():
+			os.replace(older, path.with_name(f"{path.name}.{number + 1}"))
+	os.replace(path, path.with_name(f"{path.name}.1"))
+
+
+def export(spans, mode=TRACE_EXPORT, path=TRACE_FILE, max_bytes=TRACE_MAX_BYTES, rate=TRACE_SAMPLE_RATE):
+	"""Append the spans of one finished trace to the trace file, rotating it when it is full."""
+	if mode == "none" or not spans:
+		return
+	if not sampled(spans[0].trace_id, rate) and not any("error" in s.attributes for s in spans):
+		return
+	if mode == "otlp":
+		lines = [json.dumps(to_otlp(spans), ensure_ascii=False)]
+	else:
+		lines = [json.dumps(s.to_dict(), ensure_ascii=False, default=str) for s in spans]
+	data = ("\n".join(lines) + "\n").encode("utf-8")
+	with _export_lock:
+		path.parent.mkdir(parents=True, exist_ok=True)
+		try:
+			if max_bytes and path.stat().st_size + len(data) > max_bytes:
+				rotate(path)
+		except FileNotFoundError:
+			pass
+		with open(path, "ab") as out:
+			out.write(data)
@@ -0,0 +1,380 @@
+import json
+import re
+import threading
+from collections.abc import Mapping
+
+from artifact_index import CHARS_PER_TOKEN, MAX_CANDIDATES, ArtifactIndex, artifact_description, normalize_name
+from artifact_store import STORE, artifact_id
+from records import record_fingerprint
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Relations between an artifact and the entities extracted from its record
+MADE_OF = "made_of"
+FOUND_AT = "found_at"
+EXCAVATED_IN = "excavated_in"
+FOUND_WITH = "found_with"
+USED_FOR = "used_for"
+
+MATERIALS = [
+	"obsidian", "basalt", "magnetite", "quartzite", "quartz", "granite", "limestone", "sandstone",
+	"flint", "jade", "amber", "bronze", "copper", "gold", "silver", "iron", "clay", "ceramic",
+	"bone", "ivory", "wood", "glass", "shell",
+]
+
+# Head nouns of associated finds ("bronze fittings", "ceramic vessels", "ritual incense")
+FIND_NOUNS = {
+	"fittings", "vessels", "tablets", "fragments", "textiles", "incense", "resin", "juniper", "ochre",
+	"oxides", "pigments", "inscriptions", "remains", "matter", "beads", "tools", "bones", "figurines",
+	"coins", "pottery", "sherds", "weapons", "ornaments", "jewelry", "seals", "slabs", "blades", "mounts",
+}
+
+# Phrase in a record -> canonical hypothesized function
+FUNCTIONS = {
+	"divination": "divination",
+	"light projection": "light projection",
+	"light projector": "light projection",
+	"astronomical": "astronomical observation",
+	"astronomy": "astronomical observation",
+	"celestial": "astronomical observation",
+	"solstice": "astronomical observation",
+	"temple illumination": "temple illumination",
+	"musical": "musical instrument",
+	"music": "musical instrument",
+	"ritual": "ritual use",
+	"ceremonial": "ceremonial use",
+	"ceremony": "ceremonial use",
+	"teaching": "teaching tool",
+	"instruction": "teaching tool",
+	"mnemonic": "mnemonic device",
+	"symbolic": "symbolic object",
+}
+
+# Words in a question that point at one relation
+RELATION_CUES = {
+	MADE_OF: ("made of", "material", "materials", "made from", "stone", "mineral"),
+	FOUND_AT: ("where", "site", "sites", "location", "located"),
+	EXCAVATED_IN: ("when", "year", "years", "excavat", "uncovered", "discovered", "dated"),
+	FOUND_WITH: ("found with", "associated", "alongside", "together with", "finds", "context"),
+	USED_FOR: ("used for", "use", "purpose", "function", "hypothes", "served", "for what"),
+}
+COMPARISON_CUES = ("common", "share", "shared", "both", "compare", "similar", "same", "all of", "each")
+
+# Artifacts changed since the name index was built that are looked up in a small
+# index of their own; past this many the whole name index is rebuilt
+NAME_OVERLAY_SIZE = 256
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+_YEAR = re.compile(r"\b(1[5-9]\d\d|20[0-4]\d)\b")
+_EXCAVATION_CUES = ("uncovered", "excavat", "found", "recovered", "discovered")
+_FINDS_CUE = re.compile(r"(?:in association with|associated with the \w+ include|excavation data includes)\s+(.*)", re.I)
+_FINDS_STOP = re.compile(r",\s*(?:indicating|reinforcing|collectively|suggesting|and traces of [\w\s,]+ on)\b.*$", re.I)
+_FIND_HEAD = re.compile(r"\s+(?:containing|of|detailing|bearing|possibly|indicative|referencing|used|on)\b.*$", re.I)
+_FUNCTION_CUES = ("used", "use", "served", "serving", "function", "interpret", "propose", "suggest", "employed")
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+def _sentences(text):
+	return _SENTENCE_END.split(" ".join((text or "").split()))
+
+
+def _phrases(text, vocabulary):
+	"""Return every vocabulary phrase (dict keys map to canonical values) found in `text`, in order."""
+	padded = f" {normalize_name(text)} "
+	found = []
+	items = vocabulary.items() if isinstance(vocabulary, dict) else ((w, w) for w in vocabulary)
+	for phrase, canonical in items:
+		position = padded.find(f" {phrase}")
+		if position >= 0 and canonical not in found:
+			found.append((position, canonical))
+	seen, ordered = set(), []
+	for _, canonical in sorted(found):
+		if canonical not in seen:
+			seen.add(canonical)
+			ordered.append(canonical)
+	return ordered
+
+
+def extract_facts(artifact):
+	"""Extract `(relation, entity_type, value)` facts from an artifact record with simple rules."""
+	details = artifact.get('details') or {}
+	summary = details.get('summary') or ""
+	description = artifact_description(artifact)
+	sentences = _sentences(description)
+	facts = []
+
+	# Material: the head of the summary ("A translucent quartzite prism (...)") or the first sentence
+	head = summary.split("(")[0] if summary else (sentences[0].split("measuring")[0] if sentences else "")
+	for material in _phrases(head, MATERIALS):
+		facts.append((MADE_OF, "material", material))
+
+	if details.get('location'):
+		facts.append((FOUND_AT, "site", details['location']))
+
+	years = []
+	for sentence in [summary] + sentences:
+		if any(cue in sentence.lower() for cue in _EXCAVATION_CUES):
+			years += [y for y in _YEAR.findall(sentence) if y not in years]
+	for year in sorted(years):
+		facts.append((EXCAVATED_IN, "year", year))
+
+	finds = []
+	for sentence in sentences:
+		found = _FINDS_CUE.search(sentence)
+		if not found:
+			continue
+		listing = _FINDS_STOP.sub("", found.group(1))
+		for chunk in re.split(r",\s*(?:and\s+)?|\s+and\s+", listing):
+			name = re.sub(r"^(?:traces of|fragments of|fragmentary|miniature)\s+", "", chunk.strip(), flags=re.I)
+			name = normalize_name(_FIND_HEAD.sub("", name))
+			# Keep only noun phrases that name an object, not the tail of a nested list
+			if name and len(name.split()) <= 4 and name.split()[-1] in FIND_NOUNS and name not in finds:
+				finds.append(name)
+	for find in finds:
+		facts.append((FOUND_WITH, "find", find))
+
+	uses = []
+	for sentence in [summary] + sentences:
+		if any(cue in sentence.lower() for cue in _FUNCTION_CUES):
+			uses += [u for u in _phrases(sentence, FUNCTIONS) if u not in uses]
+	for use in uses:
+		facts.append((USED_FOR, "function", use))
+	return facts
+
+
+def _content_hash(artifact):
+	return record_fingerprint(artifact)
+
+
+# ============================================================================
+# GRAPH
+# ============================================================================
+class KnowledgeGraph:
+	"""In-memory graph of artifacts and the materials, sites, years, finds and uses linked to them.
+
+	Artifacts are ingested one at a time; `sync` only re-extracts artifacts whose
+	record changed, and `refresh` hands it just the artifacts the store's change feed
+	names, so keeping the graph in line with the store is cheap. Names changed since
+	the name index was built are looked up in a small overlay index until there are
+	`NAME_OVERLAY_SIZE` of them.
+	"""
+
+	def __init__(self):
+		self._lock = threading.RLock()
+		self.nodes = {}  # node id -> {"type", "label"}
+		self._out = {}  # node id -> set of (relation, node id)
+		self._in = {}  # node id -> set of (relation, node id)
+		self._artifacts = {}  # artifact id -> (content hash, record, [edges])
+		self._names = ArtifactIndex([])
+		self._recent = {}  # artifact id -> record changed since `_names` was built
+		self._recent_names = ArtifactIndex([])
+		self._seeds = None
+		self._store_version = None
+
+	def _node(self, kind, label):
+		node = f"{kind}:{normalize_name(label)}"
+		self.nodes.setdefault(node, {"type": kind, "label": label})
+		return node
+
+	def add_artifact(self, artifact):
+		with self._lock:
+			key = artifact_id(artifact)
+			self.remove_artifact(key)
+			source = self._node("artifact", artifact.get('name') or key)
+			edges = []
+			for relation, kind, value in extract_facts(artifact):
+				target = self._node(kind, value)
+				self._out.setdefault(source, set()).add((relation, target))
+				self._in.setdefault(target, set()).add((relation, source))
+				edges.append((source, relation, target))
+			self._artifacts[key] = (_content_hash(artifact), artifact, edges)
+
+	def remove_artifact(self, key):
+		with self._lock:
+			entry = self._artifacts.pop(key, None)
+			if not entry:
+				return
+			for source, relation, target in entry[2]:
+				self._out.get(source, set()).discard((relation, target))
+				self._in.get(target, set()).discard((relation, source))
+				if not self._in.get(target):
+					self._in.pop(target, None)
+					self.nodes.pop(target, None)
+			self._out.pop(f"artifact:{key}", None)
+			self.nodes.pop(f"artifact:{key}", None)
+
+	def sync(self, records):
+		"""Ingest new or changed artifacts and drop removed ones."""
+		with self._lock:
+			wanted = {artifact_id(a): a for a in records if isinstance(a, Mapping)}
+			for key in [k for k in self._artifacts if k not in wanted]:
+				self.remove_artifact(key)
+			for key, artifact in wanted.items():
+				entry = self._artifacts.get(key)
+				if not entry or entry[0] != _content_hash(artifact):
+					self.add_artifact(artifact)
+			self._rebuild_names()
+
+	def apply_changes(self, added, removed, seed_artifacts=()):
+		"""Ingest just the artifacts added (or changed) and drop the removed ids; a removed
+		id that is a seed artifact falls back to the seed."""
+		seeds = {artifact_id(a): a for a in seed_artifacts}
+		with self._lock:
+			for key in removed:
+				if key in seeds:
+					self.add_artifact(seeds[key])
+					self._recent[key] = seeds[key]
+				else:
+					self.remove_artifact(key)
+					self._recent.pop(key, None)
+			for artifact in added:
+				self.add_artifact(artifact)
+				self._recent[artifact_id(artifact)] = artifact
+			if len(self._recent) > NAME_OVERLAY_SIZE:
+				self._rebuild_names()
+			else:
+				self._recent_names = ArtifactIndex(self._recent.values())
+
+	def _rebuild_names(self):
+		self._names = ArtifactIndex([entry[1] for entry in self._artifacts.values()])
+		self._recent = {}
+		self._recent_names = ArtifactIndex([])
+
+	def _lookup(self, question, limit=MAX_CANDIDATES):
+		"""`ArtifactIndex.lookup` over every artifact: the name index minus what changed since
+		it was built, plus the overlay of those changes."""
+		matches, candidates = self._names.lookup(question, limit)
+		if not self._recent and len(self._names) == len(self._artifacts):
+			return matches, candidates
+
+		def current(artifact):
+			key = artifact_id(artifact)
+			return key in self._artifacts and key not in self._recent
+
+		matches = [a for a in matches if current(a)]
+		candidates = [(score, a) for score, a in candidates if current(a)]
+		recent_matches, recent_candidates = self._recent_names.lookup(question, limit)
+		matches += recent_matches
+		if matches:
+			return matches, []
+		return [], sorted(candidates + recent_candidates, key=lambda pair: -pair[0])[:limit]
+
+	def facts(self, node, relations=None):
+		"""Return `(subject, relation, object)` label triples touching `node`, optionally only for `relations`."""
+		triples = []
+		for rel, target in sorted(self._out.get(node, ())):
+			if not relations or rel in relations:
+				triples.append((self.nodes[node]['label'], rel, self.nodes[target]['label']))
+		for rel, source in sorted(self._in.get(node, ())):
+			if not relations or rel in relations:
+				triples.append((self.nodes[source]['label'], rel, self.nodes[node]['label']))
+		return triples
+
+	def shared(self, artifact_nodes, relations=None):
+		"""Entities linked to two or more of the given artifacts."""
+		linked = {}
+		for node in artifact_nodes:
+			for rel, target in self._out.get(node, ()):
+				if not relations or rel in relations:
+					linked.setdefault((rel, target), []).append(self.nodes[node]['label'])
+		return [
+			{"relation": rel, "entity": self.nodes[target]['label'], "artifacts": sorted(names)}
+			for (rel, target), names in sorted(linked.items())
+			if len(names) > 1
+		]
+
+	def query(self, question):
+		"""Answer a relational question by traversal. Returns a dict of facts, never raw descriptions."""
+		with self._lock:
+			text = f" {normalize_name(question)} "
+			relations = {rel for rel, cues in RELATION_CUES.items() if any(f" {cue}" in text for cue in cues)}
+
+			matches, _ = self._lookup(question)
+			artifact_nodes = [f"artifact:{artifact_id(a)}" for a in matches]
+
+			# Non-artifact entities named in the question ("obsidian", "1911", "bronze fittings", "astronomy")
+			entity_nodes = []
+			for node, info in self.nodes.items():
+				if info['type'] != "artifact" and f" {normalize_name(info['label'])} " in text:
+					entity_nodes.append(node)
+			for canonical in _phrases(question, FUNCTIONS):
+				node = f"function:{normalize_name(canonical)}"
+				if node in self.nodes and node not in entity_nodes:
+					entity_nodes.append(node)
+
+			facts = []
+			for node in artifact_nodes + entity_nodes:
+				facts += [t for t in self.facts(node, relations) if t not in facts]
+
+			comparing = len(artifact_nodes) > 1 or any(f" {cue}" in text for cue in COMPARISON_CUES)
+			if not facts and not comparing:
+				# Nothing named: answer the relation for every artifact
+				for node in sorted(n for n, info in self.nodes.items() if info['type'] == "artifact"):
+					facts += self.facts(node, relations)
+
+			response = {"question": question, "facts": [list(t) for t in facts]}
+			if comparing:
+				scope = artifact_nodes or [n for n, info in self.nodes.items() if info['type'] == "artifact"]
+				response['shared'] = self.shared(scope, relations)
+			return response
+
+	def mentioned(self, question):
+		"""`(matches, candidates)` of the artifact names in `question`, as `ArtifactIndex.lookup` returns them."""
+		with self._lock:
+			return self._lookup(question)
+
+	def refresh(self, seed_artifacts=(), store=STORE):
+		"""Catch up with the seed artifacts plus the store: only the artifacts the store changed
+		since the last refresh when its change feed reaches back that far, otherwise all of them."""
+		store.refresh()
+		seeds = len(seed_artifacts)
+		with self._lock:
+			if (seeds, store.version) == (self._seeds, self._store_version):
+				return
+			delta = None
+			if seeds == self._seeds and self._store_version is not None:
+				delta = store.changes(self._store_version)
+			if delta is None:
+				version = store.version
+				records = {artifact_id(a): a for a in seed_artifacts}
+				for artifact in store.records():
+					records[artifact_id(artifact)] = artifact
+				self.sync(records.values())
+			else:
+				version = delta['version']
+				found = store.by_ids(delta['added']) if delta['added'] else {}
+				self.apply_changes([found[key] for key in delta['added'] if key in found], delta['removed'], seed_artifacts)
+			self._seeds, self._store_version = seeds, version
+
+
+GRAPH = KnowledgeGraph()
+
+
+def query_graph(question, seed_artifacts=()):
+	"""Query the graph built from the seed artifacts plus the persisted store."""
+	GRAPH.refresh(seed_artifacts)
+	return GRAPH.query(question)
+
+
+def mentioned_artifacts(question, seed_artifacts=()):
+	"""Artifacts named in `question`, from the seed artifacts plus the persisted store."""
+	GRAPH.refresh(seed_artifacts)
+	return GRAPH.mentioned(question)
+
+
+def format_graph_response(response, max_bytes, max_tokens):
+	"""Serialize a graph answer as JSON, dropping trailing facts to stay within the budget."""
+	budget = min(max_bytes, max_tokens * CHARS_PER_TOKEN)
+	text = json.dumps(response, ensure_ascii=False)
+	while len(text.encode("utf-8")) > budget and (response['facts'] or response.get('shared')):
+		# Shared entities are the point of a comparison, so trim plain facts first
+		if response['facts']:
+			response['facts'].pop()
+		else:
+			response['shared'].pop()
+		response['truncated'] = True
+		text = json.dumps(response, ensure_ascii=False)
+	return text
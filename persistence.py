@@ -0,0 +1,275 @@
+import collections
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
+	import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Fold the journal into the snapshot after this many operations...
+COMPACT_EVERY = 200
+# ...or once the journal grows larger than the snapshot itself
+COMPACT_RATIO = 1.0
+
+# Versions a store remembers the changed ids of; readers further behind reload everything
+CHANGE_LOG_SIZE = 1000
+
+
+# ============================================================================
+# FILE HELPERS
+# ============================================================================
+def journal_path(path):
+	"""Return the journal file that sits next to a snapshot (`string_list.json` -> `string_list.journal`)."""
+	path = Path(path)
+	return path.with_suffix(".journal")
+
+
+def lock_path(path):
+	path = Path(path)
+	return path.with_suffix(".lock")
+
+
+@contextmanager
+def file_lock(path):
+	"""Hold an exclusive, cross-process lock for the snapshot/journal pair at `path`."""
+	lock_file = lock_path(path)
+	lock_file.parent.mkdir(parents=True, exist_ok=True)
+	with open(lock_file, "a+b") as fh:
+		if fcntl:
+			fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+		else:
+			fh.seek(0)
+			msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+		try:
+			yield
+		finally:
+			if fcntl:
+				fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+			else:
+				fh.seek(0)
+				msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_bytes(path, data):
+	"""Write `data` to a temp file in the same directory, fsync it, then rename it over `path`."""
+	atomic_write_chunks(path, [data])
+
+
+def atomic_write_chunks(path, chunks):
+	"""Like `atomic_write_bytes`, for content produced piece by piece (an iterable of bytes)."""
+	path = Path(path)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+	try:
+		# mkstemp creates the file as 0600; keep the permissions of the file being replaced
+		try:
+			os.chmod(tmp, path.stat().st_mode & 0o777)
+		except FileNotFoundError:
+			os.chmod(tmp, 0o644)
+		with os.fdopen(fd, "wb") as fh:
+			for chunk in chunks:
+				fh.write(chunk)
+			fh.flush()
+			os.fsync(fh.fileno())
+		os.replace(tmp, path)
+	except BaseException:
+		try:
+			os.unlink(tmp)
+		except OSError:
+			pass
+		raise
+
+
+def atomic_write_text(path, text):
+	atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def read_json_array(stream, chunk_size=1 << 16):
+	"""Yield the items of a top-level JSON array from a text stream without loading the whole document."""
+	decoder = json.JSONDecoder()
+	buffer, pos, started, eof = "", 0, False, False
+	while True:
+		while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+			pos += 1
+		if pos < len(buffer):
+			if not started:
+				if buffer[pos] != "[":
+					raise ValueError("expected a JSON array")
+				started, pos = True, pos + 1
+				continue
+			if buffer[pos] == "]":
+				return
+			try:
+				item, pos = decoder.raw_decode(buffer, pos)
+				yield item
+				continue
+			except json.JSONDecodeError:
+				if eof:
+					raise ValueError("malformed or truncated JSON array")
+		elif eof:
+			if started:
+				raise ValueError("truncated JSON array")
+			return
+		# Need more input: keep only the unparsed tail
+		chunk = stream.read(chunk_size)
+		eof = not chunk
+		buffer, pos = buffer[pos:] + chunk, 0
+
+
+def _json_array_chunks(records):
+	"""Encode records the way `json.dumps(list(records), indent=2)` would, one record at a time."""
+	first = True
+	for record in records:
+		item = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+		yield (("[\n  " if first else ",\n  ") + item).encode("utf-8")
+		first = False
+	yield b"[]" if first else b"\n]"
+
+
+# ============================================================================
+# JOURNAL
+# ============================================================================
+def add_op(key, artifact):
+	return {"op": "add", "id": key, "artifact": artifact}
+
+
+def remove_op(key):
+	return {"op": "remove", "id": key}
+
+
+def read_journal(path):
+	"""Return the operations recorded after the last snapshot.
+
+	A torn final line (a crash mid-append) is ignored; everything before it is kept.
+	"""
+	journal = journal_path(path)
+	if not journal.exists():
+		return []
+	ops = []
+	with open(journal, "r", encoding="utf-8") as fh:
+		for line_no, line in enumerate(fh, start=1):
+			if not line.strip():
+				continue
+			try:
+				ops.append(json.loads(line))
+			except ValueError:
+				logger.warning("Ignoring unreadable journal entry %s:%d", journal, line_no)
+	return ops
+
+
+def append_journal(path, ops):
+	"""Append operations to the journal and fsync before returning."""
+	if not ops:
+		return
+	lines = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops)
+	with open(journal_path(path), "a", encoding="utf-8") as fh:
+		fh.write(lines)
+		fh.flush()
+		os.fsync(fh.fileno())
+
+
+def replay(records, ops, key):
+	"""Apply journal operations to `records` (a dict of id -> artifact, in insertion order)."""
+	for op in ops:
+		if not isinstance(op, dict):
+			continue
+		if op.get("op") == "add" and isinstance(op.get("artifact"), dict):
+			# An add always moves the artifact to the end, matching a fresh append
+			ident = op.get("id") or key(op["artifact"])
+			records.pop(ident, None)
+			records[ident] = op["artifact"]
+		elif op.get("op") == "remove":
+			records.pop(op.get("id"), None)
+	return records
+
+
+def should_compact(path, op_count):
+	"""Return True when the journal is long enough to be folded into the snapshot."""
+	if op_count >= COMPACT_EVERY:
+		return True
+	try:
+		journal_size = journal_path(path).stat().st_size
+		snapshot_size = Path(path).stat().st_size
+	except FileNotFoundError:
+		return False
+	return journal_size > max(snapshot_size, 4096) * COMPACT_RATIO
+
+
+def compact(path, records):
+	"""Write a fresh snapshot atomically, then empty the journal.
+
+	Replaying the old journal over the new snapshot is harmless (adds and removes
+	are idempotent), so a crash between the two steps loses nothing.
+	"""
+	atomic_write_chunks(path, _json_array_chunks(records))
+	atomic_write_text(journal_path(path), "")
+
+
+# ============================================================================
+# CHANGE FEED
+# ============================================================================
+def fold_changes(steps):
+	"""Net effect of `(added_ids, removed_ids)` steps, oldest first, as `(added, removed)` lists.
+
+	"Added" covers new and changed artifacts; an id removed and added again counts
+	as added, one added and then removed as removed.
+	"""
+	added, removed = {}, {}
+	for step_added, step_removed in steps:
+		for key in step_removed:
+			added.pop(key, None)
+			removed[key] = None
+		for key in step_added:
+			# Re-adding moves the artifact to the end, so keep the order of the last add
+			removed.pop(key, None)
+			added.pop(key, None)
+			added[key] = None
+	return list(added), list(removed)
+
+
+class ChangeLog:
+	"""The ids each of a store's last `limit` versions added (or changed) and removed.
+
+	Every version is recorded, with its ids or as unknown (`reset`, e.g. the first
+	load). `since` folds the versions after a given one into a single diff, so a
+	reader that last saw version 41 applies one delta instead of reloading.
+	"""
+
+	def __init__(self, limit=CHANGE_LOG_SIZE):
+		self._steps = collections.deque(maxlen=limit)
+		self._lock = threading.Lock()
+
+	def record(self, version, added=(), removed=()):
+		with self._lock:
+			self._steps.append((version, tuple(added), tuple(removed)))
+
+	def reset(self, version):
+		"""Record a version whose changed ids are unknown; readers from before it reload."""
+		with self._lock:
+			self._steps.append((version, None, None))
+
+	def since(self, since, version):
+		"""`{"version", "added", "removed"}` from version `since` up to `version`.
+
+		Returns None when the log does not cover that range (the reader reloads everything).
+		"""
+		if since == version:
+			return {"version": version, "added": [], "removed": []}
+		with self._lock:
+			steps = [step for step in self._steps if since < step[0] <= version]
+		if since > version or len(steps) != version - since or any(step[1] is None for step in steps):
+			return None
+		added, removed = fold_changes(step[1:] for step in steps)
+		return {"version": version, "added": added, "removed": removed}
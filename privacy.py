@@ -0,0 +1,189 @@
+"""Location privacy enforced in code, before and after the model.
+
+An artifact's location is public only when `fact_sheets.location_is_public` says so
+(flagged public, or naming a museum or exhibition). For every other artifact, the
+location fields (`location`, `coordinates`, `address`, ...) are sensitive terms:
+
+- Tool outputs are filtered before the model sees them: fields holding a sensitive
+  value are dropped and sensitive values inside text (descriptions, passages, graph
+  facts) are replaced with `REDACTION` (`redact_tool_output`).
+- The streamed answer is checked chunk by chunk (`StreamRedactor`). Only the last
+  few characters, as many as the longest term could span, are held back, so the
+  answer still streams.
+
+Terms are matched case-insensitively on word boundaries, with any run of spaces or
+commas between their words ("Laufen, Germany" also matches "laufen germany"). The
+term set is rebuilt only when the store changes.
+"""
+import functools
+import json
+import logging
+import re
+import threading
+from collections.abc import Mapping
+
+from artifact_store import STORE, artifact_id
+from fact_sheets import location_is_public
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+REDACTION = "[location not public]"
+
+# Fields (in `details` or `metadata`) that say where an artifact is
+LOCATION_FIELDS = ("location", "coordinates", "gps", "address", "site_address", "storage_location")
+
+# Shorter values are too likely to be ordinary words
+MIN_TERM_CHARS = 4
+
+_TERM_SEPARATOR = r"[\s,;]+"
+
+
+# ============================================================================
+# TERMS
+# ============================================================================
+def _location_values(artifact):
+	for section in (artifact.get('details'), artifact.get('metadata')):
+		if isinstance(section, Mapping):
+			for field in LOCATION_FIELDS:
+				value = section.get(field)
+				if isinstance(value, str) and len(value.strip()) >= MIN_TERM_CHARS:
+					yield value.strip()
+
+
+def _term_pattern(term):
+	return _TERM_SEPARATOR.join(re.escape(word) for word in re.split(_TERM_SEPARATOR, term) if word)
+
+
+class PrivacyFilter:
+	"""The sensitive terms of the current artifacts, compiled into one pattern."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._version = None
+		self.terms = frozenset()
+		self.pattern = None
+		# Longest stretch of text one match can span, for the stream hold-back
+		self.max_span = 0
+
+	def refresh(self, seed_artifacts=(), store=STORE):
+		"""Rebuild the terms from the seed artifacts plus the store, unless neither changed."""
+		store.refresh()
+		version = (len(seed_artifacts), store.version)
+		if version == self._version:
+			return self
+		records = {artifact_id(a): a for a in seed_artifacts}
+		for artifact in store.records():
+			records[artifact_id(artifact)] = artifact
+		terms = set()
+		for artifact in records.values():
+			if isinstance(artifact, Mapping) and not location_is_public(artifact):
+				terms.update(_location_values(artifact))
+		with self._lock:
+			self.terms = frozenset(terms)
+			# Longest first, so a longer term wins over a term it starts with
+			alternatives = sorted({_term_pattern(t) for t in terms}, key=len, reverse=True)
+			self.pattern = re.compile(rf"(?<!\w)(?:{'|'.join(alternatives)})(?!\w)", re.I) if alternatives else None
+			# A separator may be written wider than in the term, so leave some slack
+			self.max_span = max((len(t) for t in terms), default=0) + 16
+			self._version = version
+		return self
+
+	def redact(self, text):
+		"""`text` with every sensitive term replaced."""
+		if not text or self.pattern is None:
+			return text
+		return self.pattern.sub(REDACTION, text)
+
+	def is_sensitive(self, text):
+		return bool(text) and self.pattern is not None and self.pattern.search(text) is not None
+
+	def filter_value(self, value):
+		"""Drop location fields holding a sensitive value and redact the terms in all other text."""
+		if isinstance(value, str):
+			return self.redact(value)
+		if isinstance(value, list):
+			return [self.filter_value(v) for v in value]
+		if isinstance(value, dict):
+			return {
+				key: self.filter_value(v) for key, v in value.items()
+				if not (key in LOCATION_FIELDS and isinstance(v, str) and self.is_sensitive(v))
+			}
+		return value
+
+	def filter_output(self, output):
+		"""Filter a tool's JSON output (plain text outputs are redacted as text)."""
+		if not output or self.pattern is None:
+			return output
+		try:
+			data = json.loads(output)
+		except ValueError:
+			return self.redact(output)
+		return json.dumps(self.filter_value(data), ensure_ascii=False)
+
+	def stream(self):
+		return StreamRedactor(self)
+
+
+class StreamRedactor:
+	"""Redacts sensitive terms in streamed text without waiting for the whole answer.
+
+	`feed` returns the text that is safe to show now; the last `max_span - 1`
+	characters are held back in case a term continues in the next chunk. `finish`
+	returns the rest.
+	"""
+
+	def __init__(self, privacy):
+		self.pattern = privacy.pattern
+		self.hold = max(privacy.max_span - 1, 0)
+		self._pending = ""
+
+	def feed(self, chunk):
+		if self.pattern is None:
+			return chunk
+		text = self._pending + chunk
+		safe_end = len(text) - self.hold
+		out, pos = [], 0
+		for found in self.pattern.finditer(text):
+			if found.start() >= safe_end:
+				break
+			out.append(text[pos:found.start()])
+			out.append(REDACTION)
+			pos = found.end()
+		cut = max(pos, safe_end)
+		out.append(text[pos:cut])
+		self._pending = text[cut:]
+		return "".join(out)
+
+	def finish(self):
+		text, self._pending = self._pending, ""
+		return self.pattern.sub(REDACTION, text) if self.pattern is not None else text
+
+
+PRIVACY = PrivacyFilter()
+
+
+def privacy_filter(seed_artifacts=()):
+	"""The process-wide filter, refreshed if the artifacts changed."""
+	return PRIVACY.refresh(seed_artifacts)
+
+
+def redact_tool_output(seed_artifacts=()):
+	"""Decorator: filter a tool's output before it reaches the model.
+
+	Put it under `@memoize_tool`, so cached results are already filtered.
+	"""
+	def decorate(func):
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			result = func(*args, **kwargs)
+			try:
+				return privacy_filter(seed_artifacts).filter_output(result)
+			except Exception:
+				# Never hand the model an unfiltered result
+				logger.exception("Privacy filter failed for %s", func.__name__)
+				return ""
+		return wrapper
+	return decorate
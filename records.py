@@ -0,0 +1,320 @@
+"""Compact artifact records whose long descriptions stay on disk until they are read.
+
+`ArtifactRecord` keeps the light fields (name, discovered date, location, summary)
+in slots and only the SHA-1 of the description. The description itself lives in a
+content-addressed blob file next to the data file (`string_list.blobs`), read
+through `mmap` when something asks for it: an expanded card, the agent tool, search
+or index building. Records are read-only `Mapping`s with the same keys as the
+artifact dicts they replace, so `artifact.get('details')` and
+`artifact_description(artifact)` keep working; use `as_dict` before serializing one.
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from persistence import atomic_write_chunks
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Key of the empty description, which is never written to the blob file
+EMPTY_KEY = hashlib.sha1(b"").hexdigest()
+
+_LIGHT_DETAILS = ("location", "summary")
+
+
+def description_key(text):
+	return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+# ============================================================================
+# BLOB FILE
+# ============================================================================
+class DescriptionBlobs:
+	"""Append-only file of descriptions keyed by their SHA-1, read through mmap.
+
+	Each entry is a `<sha1> <length>\\n` header, the UTF-8 text and a newline. The
+	offset index is rebuilt on open by hopping from header to header (the text is
+	never read), and extended the same way when another process appended. A torn
+	last entry is ignored. Identical descriptions are stored once. `compact` rewrites
+	the file with only the entries still in use; readers notice the new file and
+	index it again.
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self._lock = threading.RLock()
+		self._offsets = {}  # key -> (offset, length)
+		self._scanned_to = 0
+		self._inode = None
+		self._map = None
+		self._mapped_size = 0
+
+	def __len__(self):
+		return len(self._offsets)
+
+	def _scan(self):
+		"""Index entries appended since the last scan (by this or another process)."""
+		try:
+			fh = open(self.path, "rb")
+		except FileNotFoundError:
+			return
+		with fh:
+			stat = os.fstat(fh.fileno())
+			if stat.st_ino != self._inode:
+				# First scan, or the file was compacted: the old offsets are meaningless
+				self._reset()
+				self._inode = stat.st_ino
+			end = stat.st_size
+			pos = self._scanned_to
+			while pos < end:
+				fh.seek(pos)
+				header = fh.readline(64)
+				try:
+					key, length = header.decode("ascii").split()
+					length = int(length)
+				except ValueError:
+					break
+				start = pos + len(header)
+				if start + length + 1 > end:
+					break  # torn or still being written
+				self._offsets.setdefault(key, (start, length))
+				pos = start + length + 1
+			self._scanned_to = pos
+
+	def put(self, text):
+		"""Store `text` (if new) and return its key."""
+		key = description_key(text)
+		if key == EMPTY_KEY:
+			return key
+		with self._lock:
+			if key in self._offsets:
+				return key
+			self._scan()
+			if key in self._offsets:
+				return key
+			data = text.encode("utf-8")
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			# One write in append mode, so entries from several processes never interleave
+			with open(self.path, "ab") as fh:
+				fh.write(b"%s %d\n%s\n" % (key.encode("ascii"), len(data), data))
+			self._scan()
+		return key
+
+	def get(self, key):
+		"""Return the text stored under `key` ("" for the empty description)."""
+		if key == EMPTY_KEY or key is None:
+			return ""
+		with self._lock:
+			return self._read(key).decode("utf-8")
+
+	def _read(self, key):
+		entry = self._offsets.get(key)
+		if entry is None or entry[0] + entry[1] > self._mapped_size:
+			self._scan()
+			entry = self._offsets[key]
+			if entry[0] + entry[1] > self._mapped_size:
+				self._remap()
+		offset, length = entry
+		return self._map[offset:offset + length]
+
+	def size(self):
+		"""Bytes of the file indexed so far (live and stale entries)."""
+		with self._lock:
+			self._scan()
+			return self._scanned_to
+
+	def stale_bytes(self, keep):
+		"""Bytes of the file taken by entries whose keys are not in `keep`."""
+		with self._lock:
+			self._scan()
+			live = 0
+			for key in set(keep):
+				if key in self._offsets:
+					length = self._offsets[key][1]
+					live += len(b"%s %d\n" % (key.encode("ascii"), length)) + length + 1
+			return self._scanned_to - live
+
+	def compact(self, keep):
+		"""Rewrite the file with only the entries whose keys are in `keep`. Returns the bytes freed.
+
+		The caller holds whatever lock keeps writers out: an entry appended to the old
+		file while it is copied would be lost.
+		"""
+		with self._lock:
+			self._scan()
+			before = self._scanned_to
+			keys = [key for key in dict.fromkeys(keep) if key in self._offsets]
+			if before == 0:
+				return 0
+
+			def entries():
+				for key in keys:
+					data = self._read(key)
+					yield b"%s %d\n%s\n" % (key.encode("ascii"), len(data), data)
+
+			atomic_write_chunks(self.path, entries())
+			self._scan()
+			return before - self._scanned_to
+
+	def _reset(self):
+		self._offsets = {}
+		self._scanned_to = 0
+		if self._map is not None:
+			self._map.close()
+		self._map = None
+		self._mapped_size = 0
+
+	def _remap(self):
+		if self._map is not None:
+			self._map.close()
+		with open(self.path, "rb") as fh:
+			self._mapped_size = os.fstat(fh.fileno()).st_size
+			self._map = mmap.mmap(fh.fileno(), self._mapped_size, access=mmap.ACCESS_READ)
+
+
+# ============================================================================
+# RECORDS
+# ============================================================================
+class ArtifactRecord(Mapping):
+	"""Read-only artifact with light fields resident and the description loaded on demand."""
+
+	__slots__ = ("name", "discovered_date", "location", "summary", "description_key", "derived_alias", "_extra", "_details_extra", "_flat", "_blobs")
+
+	def __init__(self, artifact, blobs, derived_alias=None):
+		"""Build from an artifact dict, writing its description to `blobs`."""
+		details = artifact.get('details')
+		self._flat = not isinstance(details, dict)
+		details = details if isinstance(details, dict) else {}
+		description = details.get('description') if not self._flat else artifact.get('description')
+		self.name = artifact.get('name')
+		self.discovered_date = artifact.get('discovered_date')
+		self.location = details.get('location')
+		self.summary = details.get('summary')
+		self.description_key = blobs.put(description) if description is not None else None
+		self.derived_alias = derived_alias
+		self._extra = {k: v for k, v in artifact.items() if k not in ("name", "discovered_date", "details", "description")} or None
+		self._details_extra = {k: v for k, v in details.items() if k not in ("location", "summary", "description")} or None
+		self._blobs = blobs
+
+	@property
+	def description(self):
+		return self._blobs.get(self.description_key)
+
+	def _keys(self):
+		if self.name is not None:
+			yield "name"
+		if self.discovered_date is not None:
+			yield "discovered_date"
+		if not self._flat:
+			yield "details"
+		elif self.description_key is not None:
+			yield "description"
+		if self._extra:
+			yield from self._extra
+
+	def __getitem__(self, key):
+		if key == "name" and self.name is not None:
+			return self.name
+		if key == "discovered_date" and self.discovered_date is not None:
+			return self.discovered_date
+		if key == "details" and not self._flat:
+			return RecordDetails(self)
+		if key == "description" and self._flat and self.description_key is not None:
+			return self.description
+		if self._extra and key in self._extra:
+			return self._extra[key]
+		raise KeyError(key)
+
+	def __iter__(self):
+		return self._keys()
+
+	def __len__(self):
+		return sum(1 for _ in self._keys())
+
+	def __repr__(self):
+		return f"ArtifactRecord({self.name!r})"
+
+	def to_dict(self, include_description=True):
+		"""Plain, JSON-serializable dict (the description is read unless excluded)."""
+		record = {}
+		for key in self._keys():
+			if key == "details":
+				record['details'] = RecordDetails(self).to_dict(include_description)
+			elif key == "description":
+				if include_description:
+					record['description'] = self.description
+			else:
+				record[key] = self[key]
+		return record
+
+	def dated(self, discovered_date):
+		"""A copy with another discovered date, sharing the description (which is not read)."""
+		record = object.__new__(ArtifactRecord)
+		for slot in self.__slots__:
+			setattr(record, slot, getattr(self, slot))
+		record.discovered_date = discovered_date
+		return record
+
+	def fingerprint(self):
+		"""Content hash of the whole record, without reading the description."""
+		light = json.dumps(self.to_dict(include_description=False), sort_keys=True, ensure_ascii=False, default=str)
+		return hashlib.sha1(f"{light}\x1f{self.description_key}".encode("utf-8")).hexdigest()
+
+
+class RecordDetails(Mapping):
+	"""The `details` dict of an `ArtifactRecord`; `description` is read from the blob file."""
+
+	__slots__ = ("_record",)
+
+	def __init__(self, record):
+		self._record = record
+
+	def _keys(self):
+		record = self._record
+		for key in _LIGHT_DETAILS:
+			if getattr(record, key) is not None:
+				yield key
+		if record.description_key is not None:
+			yield "description"
+		if record._details_extra:
+			yield from record._details_extra
+
+	def __getitem__(self, key):
+		record = self._record
+		if key in _LIGHT_DETAILS and getattr(record, key) is not None:
+			return getattr(record, key)
+		if key == "description" and record.description_key is not None:
+			return record.description
+		if record._details_extra and key in record._details_extra:
+			return record._details_extra[key]
+		raise KeyError(key)
+
+	def __iter__(self):
+		return self._keys()
+
+	def __len__(self):
+		return sum(1 for _ in self._keys())
+
+	def to_dict(self, include_description=True):
+		return {k: self[k] for k in self._keys() if include_description or k != "description"}
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+def as_dict(artifact):
+	"""Plain dict for an artifact record or dict (use before `json.dumps`)."""
+	return artifact.to_dict() if isinstance(artifact, ArtifactRecord) else artifact
+
+
+def record_fingerprint(artifact):
+	"""Content hash of an artifact; for compact records the description is not read."""
+	if isinstance(artifact, ArtifactRecord):
+		return artifact.fingerprint()
+	return hashlib.sha1(json.dumps(artifact, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
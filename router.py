@@ -0,0 +1,137 @@
+"""Route each question to the model tier it needs.
+
+Questions fall into three classes, told apart by rules over the question text and
+the artifact names in it (no model call):
+
+	lookup     facts about one named artifact ("How big is the Laufen Lens?")
+	guarded    location/privacy questions and questions about artifacts the
+	           repository does not know, which end in a fixed refusal or "I don't know"
+	synthesis  questions that compare or connect several artifacts
+
+Every decision carries a confidence. Lookups and guarded questions go to the small
+tier, synthesis to the large one, and any decision below `ROUTER_MIN_CONFIDENCE` is
+escalated to the large tier, so the cheap model only answers the questions it is
+clearly suited for.
+
+	MODEL_ROUTER=0          send every question to LLM_MODEL
+	ROUTER_SMALL_MODEL      default gpt-4.1-mini
+	ROUTER_LARGE_MODEL      default LLM_MODEL
+	ROUTER_MIN_CONFIDENCE   default 0.7
+"""
+import logging
+import os
+import re
+import time
+
+from artifact_index import normalize_name
+from knowledge_graph import COMPARISON_CUES, mentioned_artifacts
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+ROUTE_LOOKUP = "lookup"
+ROUTE_GUARDED = "guarded"
+ROUTE_SYNTHESIS = "synthesis"
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+ROUTE_TIERS = {ROUTE_LOOKUP: TIER_SMALL, ROUTE_GUARDED: TIER_SMALL, ROUTE_SYNTHESIS: TIER_LARGE}
+
+MODEL_ROUTER = os.getenv("MODEL_ROUTER", "1") == "1"
+ROUTER_SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", "gpt-4.1-mini")
+ROUTER_LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL")  # None: the agent's LLM_MODEL
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.7"))
+
+# Questions longer than this many words are more likely to need reasoning
+LONG_QUESTION_WORDS = 30
+
+PRIVACY_CUES = ("where is", "where are", "where can", "location", "located", "kept", "stored", "museum", "address", "coordinates", "gps")
+SYNTHESIS_CUES = COMPARISON_CUES + (
+	"compared", "comparing", "comparison", "similarity", "similarities", "which artifacts", "what artifacts",
+	"difference", "differences", "differ", "differs", "relate", "related", "connection", "connections",
+	"connected", "versus", "vs",
+)
+FOLLOW_UP_CUES = ("it", "its", "they", "them", "their", "this", "that", "these", "those")
+
+_WORD = re.compile(r"\w+")
+
+
+# ============================================================================
+# ROUTING
+# ============================================================================
+def classify(question, has_history=False, seed_artifacts=()):
+	"""Return `(route, confidence, reason)` for a question."""
+	text = f" {normalize_name(question)} "
+	words = _WORD.findall(text)
+	matches, candidates = mentioned_artifacts(question, seed_artifacts)
+	# Cues match whole words only ("vs" is not "vsevolod")
+	comparing = any(f" {cue} " in text for cue in SYNTHESIS_CUES)
+	private = any(f" {cue} " in text for cue in PRIVACY_CUES)
+
+	# A location question is refused however many artifacts it names
+	if private:
+		route, confidence, reason = ROUTE_GUARDED, 0.9, "asks for a location"
+	elif len(matches) > 1:
+		route, confidence, reason = ROUTE_SYNTHESIS, 0.95, f"{len(matches)} artifacts named"
+	elif comparing:
+		route, confidence, reason = ROUTE_SYNTHESIS, 0.8, "comparison wording"
+	elif matches:
+		route, confidence, reason = ROUTE_LOOKUP, 0.9, "one artifact named"
+	elif candidates:
+		# Probably a misspelled name; the tool returns the candidates to pick from
+		route, confidence, reason = ROUTE_LOOKUP, 0.7, "close to a known name"
+	elif has_history and set(words) & set(FOLLOW_UP_CUES):
+		route, confidence, reason = ROUTE_LOOKUP, 0.7, "follow-up about the conversation"
+	elif has_history:
+		route, confidence, reason = ROUTE_LOOKUP, 0.5, "no artifact named, conversation context"
+	else:
+		route, confidence, reason = ROUTE_GUARDED, 0.75, "no known artifact named"
+
+	if len(words) > LONG_QUESTION_WORDS:
+		confidence -= 0.2
+		reason += ", long question"
+	return route, round(confidence, 2), reason
+
+
+def route(question, has_history=False, seed_artifacts=(), default_model=None):
+	"""Pick the model for a question. Returns a dict with the route, tier, model and timing.
+
+	With the router off every question gets `default_model` on the large tier.
+	"""
+	large_model = ROUTER_LARGE_MODEL or default_model
+	if not MODEL_ROUTER:
+		return {"route": None, "confidence": None, "reason": "router off", "tier": TIER_LARGE, "model": large_model, "escalated": False, "ms": 0.0}
+	started = time.perf_counter()
+	try:
+		name, confidence, reason = classify(question, has_history, seed_artifacts)
+	except Exception:
+		logger.exception("Routing failed; using the large model")
+		name, confidence, reason = None, 0.0, "classifier error"
+	tier = ROUTE_TIERS.get(name, TIER_LARGE)
+	escalated = tier != TIER_LARGE and confidence < ROUTER_MIN_CONFIDENCE
+	if escalated:
+		tier = TIER_LARGE
+	decision = {
+		"route": name,
+		"confidence": confidence,
+		"reason": reason,
+		"tier": tier,
+		"model": ROUTER_SMALL_MODEL if tier == TIER_SMALL else large_model,
+		"escalated": escalated,
+		"ms": round((time.perf_counter() - started) * 1000, 2),
+	}
+	logger.info(
+		"route=%s confidence=%s tier=%s model=%s escalated=%s (%s) in %.1f ms",
+		name, confidence, tier, decision['model'], escalated, reason, decision['ms'],
+	)
+	return decision
+
+
+def tier_models(default_model):
+	"""Model name per tier, for cache keys and building one agent per tier."""
+	if not MODEL_ROUTER:
+		return {TIER_LARGE: default_model}
+	return {TIER_SMALL: ROUTER_SMALL_MODEL, TIER_LARGE: ROUTER_LARGE_MODEL or default_model}
@@ -0,0 +1,544 @@
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+
+try:
+	import numpy as np
+except ImportError:  # retrieval is optional; the tool falls back to whole records
+	np = None
+
+from artifact_index import artifact_description, description_hash, normalize_name
+from artifact_store import STORE, artifact_id
+from persistence import atomic_write_text, file_lock
+from records import DescriptionBlobs, description_key
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Width of the hashed feature space (unigrams + bigrams); columns are stored as uint16
+DIMENSIONS = 2 ** 12
+
+# Character n-grams count for less than whole words
+CHAR_GRAM_WEIGHT = 0.3
+
+# Passages are runs of whole sentences of up to roughly this many words
+PASSAGE_WORDS = 80
+
+# How many passages a question gets by default
+TOP_K = 4
+
+# Seconds without a change before new passages are written to disk (0 writes right away)
+INDEX_SAVE_SECONDS = float(os.getenv("INDEX_SAVE_SECONDS", "2"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = {
+	"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+	"its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with", "what",
+	"how", "why", "who", "when", "did", "does", "do", "tell", "me", "about",
+}
+
+
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+def split_passages(text, max_words=PASSAGE_WORDS):
+	"""Split a description into passages of whole sentences, each up to `max_words` words."""
+	passages, current, count = [], [], 0
+	for sentence in _SENTENCE_END.split(" ".join(text.split())):
+		words = len(sentence.split())
+		if current and count + words > max_words:
+			passages.append(" ".join(current))
+			current, count = [], 0
+		current.append(sentence)
+		count += words
+	if current:
+		passages.append(" ".join(current))
+	return passages
+
+
+def _features(text):
+	"""Words, word bigrams and in-word character 4-grams (so "astronomy" meets "astronomical")."""
+	words = [w for w in normalize_name(text).split() if w not in _STOPWORDS]
+	features = {}
+	for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+		features[feature] = features.get(feature, 0.0) + 1.0
+	for word in words:
+		padded = f"<{word}>"
+		for i in range(len(padded) - 3):
+			gram = "#" + padded[i:i + 4]
+			features[gram] = features.get(gram, 0.0) + CHAR_GRAM_WEIGHT
+	return features
+
+
+def _sparse_row(text):
+	"""The non-zero columns of one text's embedding and their values (see `embed`)."""
+	row = {}
+	for feature, count in _features(text).items():
+		h = zlib.crc32(feature.encode("utf-8"))
+		sign = 1.0 if h & 0x80000000 else -1.0
+		row[h % DIMENSIONS] = row.get(h % DIMENSIONS, 0.0) + sign * (1.0 + math.log1p(count))
+	columns = sorted(column for column, value in row.items() if value)
+	values = np.array([row[column] for column in columns], dtype=np.float32)
+	norm = np.linalg.norm(values)
+	return np.array(columns, dtype=np.uint16), (values / norm if norm else values)
+
+
+def embed(texts):
+	"""Embed texts with a signed hashing vectorizer (log term frequency, L2-normalized)."""
+	matrix = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+	for row, text in enumerate(texts):
+		columns, values = _sparse_row(text)
+		matrix[row, columns] = values
+	return matrix
+
+
+def embed_sparse(texts):
+	"""Like `embed`, as CSR arrays `(indptr, columns, values)`: a passage has a few hundred
+	non-zero columns out of `DIMENSIONS`, so this is about 20 times smaller."""
+	rows = [_sparse_row(text) for text in texts]
+	indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+	np.cumsum([len(columns) for columns, _ in rows], out=indptr[1:])
+	if not rows:
+		return indptr, np.zeros(0, dtype=np.uint16), np.zeros(0, dtype=np.float16)
+	columns = np.concatenate([columns for columns, _ in rows])
+	values = np.concatenate([values for _, values in rows]).astype(np.float16)
+	return indptr, columns, values
+
+
+def _content_hash(artifact):
+	return description_hash(artifact)
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+class _Segment:
+	"""A block of passage rows: sparse vectors (CSR), the artifacts they belong to and
+	the keys of their texts in the passage blob file.
+
+	`artifacts` holds `(id, name, hash, start, stop)` with the rows of each artifact
+	contiguous. A saved segment is one shard file (`name`); an unsaved one still holds
+	its passage texts.
+	"""
+
+	__slots__ = ("name", "indptr", "indices", "values", "keys", "artifacts", "starts", "live", "texts")
+
+	def __init__(self, indptr, indices, values, keys, artifacts, name=None, texts=None):
+		self.name = name
+		self.indptr, self.indices, self.values, self.keys = indptr, indices, values, keys
+		self.artifacts = artifacts
+		self.starts = np.array([a[3] for a in artifacts], dtype=np.int64)
+		self.live = np.ones(len(indptr) - 1, dtype=bool)
+		self.texts = texts
+
+	@classmethod
+	def build(cls, changed):
+		"""Split and embed the descriptions of `changed` ({id: artifact}) into a new segment."""
+		artifacts, texts = [], []
+		for key, artifact in changed.items():
+			passages = split_passages(artifact_description(artifact))
+			artifacts.append((key, artifact.get('name'), _content_hash(artifact), len(texts), len(texts) + len(passages)))
+			texts.extend(passages)
+		indptr, indices, values = embed_sparse(texts)
+		keys = np.array([description_key(text) for text in texts], dtype="S40")
+		return cls(indptr, indices, values, keys, artifacts, texts=texts)
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path, allow_pickle=False) as data:
+			artifacts = [tuple(a) for a in json.loads(str(data['artifacts']))]
+			return cls(data['indptr'], data['indices'], data['values'], data['keys'], artifacts, name=path.stem)
+
+	def write(self, path):
+		with open(path, "wb") as fh:
+			np.savez(
+				fh, indptr=self.indptr, indices=self.indices, values=self.values, keys=self.keys,
+				artifacts=np.array(json.dumps(self.artifacts, ensure_ascii=False)),
+			)
+
+	def __len__(self):
+		return len(self.live)
+
+	def live_rows(self):
+		return int(np.count_nonzero(self.live))
+
+	def owner(self, row):
+		"""The `(id, name, hash, start, stop)` entry that `row` belongs to."""
+		return self.artifacts[int(np.searchsorted(self.starts, row, side="right")) - 1]
+
+	def scores(self, query):
+		"""Cosine similarity of every row with the dense `query` vector."""
+		products = self.values * query[self.indices]
+		scores = np.zeros(len(self), dtype=np.float32)
+		# reduceat sums from each start to the next one, so leave out rows without columns
+		filled = np.flatnonzero(np.diff(self.indptr))
+		if len(filled):
+			scores[filled] = np.add.reduceat(products, self.indptr[:-1][filled])
+		return scores
+
+
+def _concat(segments, entries):
+	"""One unsaved segment with the live artifacts of `segments`, in order."""
+	indptr, indices, values, keys, artifacts, texts = [np.zeros(1, dtype=np.int64)], [], [], [], [], []
+	rows = nnz = 0
+	for segment in segments:
+		for index, (key, name, digest, start, stop) in enumerate(segment.artifacts):
+			entry = entries.get(key)
+			if entry is None or entry[0] is not segment or entry[1] != index:
+				continue
+			lo, hi = segment.indptr[start], segment.indptr[stop]
+			indptr.append(segment.indptr[start + 1:stop + 1] - lo + nnz)
+			indices.append(segment.indices[lo:hi])
+			values.append(segment.values[lo:hi])
+			keys.append(segment.keys[start:stop])
+			if segment.texts is not None:
+				texts.extend(segment.texts[start:stop])
+			artifacts.append((key, name, digest, rows, rows + stop - start))
+			rows += stop - start
+			nnz += hi - lo
+	unsaved = all(segment.texts is not None for segment in segments)
+	return _Segment(
+		np.concatenate(indptr),
+		np.concatenate(indices) if indices else np.zeros(0, dtype=np.uint16),
+		np.concatenate(values) if values else np.zeros(0, dtype=np.float16),
+		np.concatenate(keys) if keys else np.zeros(0, dtype="S40"),
+		artifacts,
+		texts=texts if unsaved else None,
+	)
+
+
+class SemanticIndex:
+	"""Passage vectors for every artifact description, persisted next to the data file.
+
+	`sync` compares artifact ids and description hashes with the store and only
+	embeds artifacts that were added or changed, and drops rows for removed ones,
+	so the index never needs a full rebuild.
+
+	Vectors are kept sparse (uint16 columns, float16 values) in segments, and passage
+	texts live in an append-only blob file (`passages.blobs`) read only for the
+	passages a question gets. On disk (`string_list.index/`) every save appends one
+	shard file with the passages embedded since the last save, plus a line in
+	`log.jsonl`; removed artifacts are a `drop` line. Nothing already written is
+	rewritten on a save, and saves run `INDEX_SAVE_SECONDS` after the last change, off
+	the caller's thread. Small shards are merged as they pile up (each row is
+	rewritten O(log n) times) and everything is compacted once more than half of the
+	rows are stale.
+	"""
+
+	def __init__(self, data_path):
+		self.directory = data_path.with_suffix(".index")
+		self.log_path = self.directory / "log.jsonl"
+		self.blobs = DescriptionBlobs(self.directory / "passages.blobs")
+		# Written by earlier versions as one dense matrix; removed after the first save
+		self._legacy = [data_path.with_suffix(".vectors.npy"), data_path.with_suffix(".passages.json")]
+		self._lock = threading.RLock()
+		self._segments = []
+		# artifact id -> (segment, index in segment.artifacts)
+		self._entries = {}
+		self._drops = []
+		self._timer = None
+		self._store_version = None
+		self._load()
+
+	def __len__(self):
+		"""Number of live passages."""
+		with self._lock:
+			return sum(segment.live_rows() for segment in self._segments)
+
+	# ------------------------------------------------------------------ disk
+	def _load(self):
+		try:
+			lines = self.log_path.read_text(encoding="utf-8").splitlines()
+		except FileNotFoundError:
+			return
+		try:
+			for line in lines:
+				if not line.strip():
+					continue
+				entry = json.loads(line)
+				if "shard" in entry:
+					segment = _Segment.load(self.directory / f"{entry['shard']}.npz")
+					dead = set(entry.get('dead') or ())
+					self._add_segment(segment, skip=dead)
+				elif "drop" in entry:
+					for key in entry['drop']:
+						self._kill(key)
+		except Exception:
+			logger.exception("Ignoring unreadable semantic index; it will be rebuilt")
+			self._segments, self._entries = [], {}
+
+	def _add_segment(self, segment, skip=()):
+		"""Make `segment`'s artifacts the current ones (caller holds the lock)."""
+		for index, (key, _, _, start, stop) in enumerate(segment.artifacts):
+			if index in skip:
+				segment.live[start:stop] = False
+				continue
+			self._kill(key)
+			self._entries[key] = (segment, index)
+		self._segments.append(segment)
+
+	def _kill(self, key):
+		entry = self._entries.pop(key, None)
+		if entry is not None:
+			segment, index = entry
+			_, _, _, start, stop = segment.artifacts[index]
+			segment.live[start:stop] = False
+
+	def _dead(self, segment):
+		return [
+			index for index, artifact in enumerate(segment.artifacts)
+			if self._entries.get(artifact[0], (None, None)) != (segment, index)
+		]
+
+	def _write_shard(self, segment):
+		"""Put the segment's texts in the blob file and write its shard (caller holds the file lock)."""
+		for text in segment.texts or ():
+			self.blobs.put(text)
+		segment.name = f"{time.time_ns():x}-{os.getpid()}"
+		segment.write(self.directory / f"{segment.name}.npz")
+		segment.texts = None
+
+	def _append_log(self, entries):
+		with open(self.log_path, "a", encoding="utf-8") as fh:
+			fh.write("".join(json.dumps(entry) + "\n" for entry in entries))
+			fh.flush()
+			os.fsync(fh.fileno())
+
+	def _schedule_save(self):
+		"""Save after `INDEX_SAVE_SECONDS` without a further change (caller holds the lock)."""
+		if INDEX_SAVE_SECONDS <= 0:
+			self.save()
+			return
+		if self._timer is not None:
+			self._timer.cancel()
+		self._timer = threading.Timer(INDEX_SAVE_SECONDS, self.save)
+		self._timer.daemon = True
+		self._timer.start()
+
+	def save(self):
+		"""Write the passages embedded since the last save as one shard, and the drops to the log."""
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			pending = [segment for segment in self._segments if segment.name is None]
+			drops, self._drops = self._drops, []
+			if not pending and not drops:
+				return
+			try:
+				self.directory.mkdir(parents=True, exist_ok=True)
+				with file_lock(self.log_path):
+					lines = [{"drop": drops}] if drops else []
+					if pending:
+						segment = pending[0]
+						if len(pending) > 1:
+							segment = _concat(pending, self._entries)
+							self._replace_segments(pending, segment)
+						self._write_shard(segment)
+						lines.append({"shard": segment.name, "dead": self._dead(segment)})
+					self._append_log(lines)
+					self._merge()
+				for legacy in self._legacy:
+					legacy.unlink(missing_ok=True)
+			except Exception:
+				logger.exception("Could not save the semantic index")
+
+	def _replace_segments(self, old, new):
+		"""Put `new`, built from the live rows of `old`, where `old` were (caller holds the lock)."""
+		position = self._segments.index(old[0])
+		self._segments = [segment for segment in self._segments if not any(segment is o for o in old)]
+		self._segments.insert(position, new)
+		for index, artifact in enumerate(new.artifacts):
+			self._entries[artifact[0]] = (new, index)
+
+	def _merge(self):
+		"""Keep the number of shards logarithmic and drop stale rows (caller holds both locks).
+
+		The newest shards are merged while the one before them is at most twice as large
+		as they are together; once more than half of all rows are stale, everything is
+		merged into one shard and unused files and passage texts are removed.
+		"""
+		saved = [segment for segment in self._segments if segment.name is not None]
+		live = sum(segment.live_rows() for segment in saved)
+		full = sum(len(segment) for segment in saved) > 2 * live
+		if full:
+			merge = saved
+		else:
+			merge = saved[-1:]
+			while len(merge) < len(saved) and saved[-len(merge) - 1].live_rows() <= 2 * sum(s.live_rows() for s in merge):
+				merge = saved[-len(merge) - 1:]
+			if len(merge) < 2:
+				return
+		segment = _concat(merge, self._entries)
+		self._replace_segments(merge, segment)
+		self._write_shard(segment)
+		# Rewrite the log to describe the shards as they are now
+		atomic_write_text(self.log_path, "".join(
+			json.dumps({"shard": s.name, "dead": self._dead(s)}) + "\n"
+			for s in self._segments if s.name is not None
+		))
+		for old in merge:
+			(self.directory / f"{old.name}.npz").unlink(missing_ok=True)
+		if full:
+			self._collect_garbage()
+
+	def _collect_garbage(self):
+		"""Remove shard files and passage texts nothing refers to (caller holds both locks)."""
+		names = {segment.name for segment in self._segments}
+		for path in self.directory.glob("*.npz"):
+			if path.stem not in names:
+				path.unlink(missing_ok=True)
+		keep = set()
+		for segment in self._segments:
+			if segment.name is not None:
+				keep.update(key.decode("ascii") for key in segment.keys[segment.live])
+		self.blobs.compact(keep)
+
+	# ------------------------------------------------------------------ updates
+	def _hash(self, key):
+		entry = self._entries.get(key)
+		return None if entry is None else entry[0].artifacts[entry[1]][2]
+
+	def _replace(self, changed, dropped):
+		"""Drop the rows of `dropped` ids, then embed the artifacts in `changed` (caller holds the lock)."""
+		for key in dropped:
+			if key in self._entries:
+				self._kill(key)
+				if key not in changed:
+					self._drops.append(key)
+		if changed:
+			self._add_segment(_Segment.build(changed))
+
+	def sync(self, records):
+		"""Bring the index in line with `records`. Returns the number of artifacts (re)embedded."""
+		with self._lock:
+			wanted = {artifact_id(a): a for a in records}
+			changed = {key: a for key, a in wanted.items() if self._hash(key) != _content_hash(a)}
+			dropped = [key for key in self._entries if key not in wanted]
+			if not changed and not dropped:
+				return 0
+			self._replace(changed, dropped)
+			self._schedule_save()
+			return len(changed)
+
+	def update(self, adds=(), save=True):
+		"""Embed just `adds`, replacing any older passages of the same artifacts.
+
+		Bulk imports call this once per batch with `save=False` and `save()` after it,
+		instead of diffing the whole store after every batch.
+		"""
+		with self._lock:
+			changed = {artifact_id(a): a for a in adds}
+			if not changed:
+				return 0
+			self._replace(changed, ())
+			if save:
+				self._schedule_save()
+			return len(changed)
+
+	def apply_changes(self, changed, removed=()):
+		"""Re-embed the `changed` artifacts whose description moved and drop `removed` ids."""
+		with self._lock:
+			changed = {artifact_id(a): a for a in changed}
+			changed = {key: a for key, a in changed.items() if self._hash(key) != _content_hash(a)}
+			dropped = [key for key in removed if key in self._entries]
+			if not changed and not dropped:
+				return 0
+			self._replace(changed, dropped)
+			self._schedule_save()
+			return len(changed)
+
+	def refresh(self, store=STORE):
+		"""Catch up with the store: only the changed artifacts when its change feed covers
+		the gap since the last sync, otherwise a full `sync`."""
+		store.refresh()
+		version = store.version
+		if self._store_version == version:
+			return
+		delta = store.changes(self._store_version) if self._store_version is not None else None
+		if delta is None:
+			self.sync(store.records())
+		else:
+			self.apply_changes(store.by_ids(delta['added']).values(), delta['removed'])
+			version = delta['version']
+		self._store_version = version
+
+	# ------------------------------------------------------------------ queries
+	def _passage(self, segment, row):
+		key, name, digest, _, _ = segment.owner(row)
+		if segment.texts is not None:
+			text = segment.texts[row]
+		else:
+			try:
+				text = self.blobs.get(segment.keys[row].decode("ascii"))
+			except KeyError:
+				# Compacted away by another process; the passage is still worth its score
+				text = ""
+		return {"id": key, "name": name, "hash": digest, "text": text}
+
+	def top_k(self, question, k=TOP_K, ids=None):
+		"""Return the `k` passages most similar to `question` as `(score, passage)` pairs.
+
+		`ids` optionally restricts the search to the given artifact ids.
+		"""
+		with self._lock:
+			segments = [segment for segment in self._segments if segment.live.any()]
+			if not segments or k <= 0:
+				return []
+			query = embed([question])[0]
+			allowed = None
+			if ids is not None:
+				allowed = {}
+				for key in ids:
+					entry = self._entries.get(key)
+					if entry is not None:
+						segment, index = entry
+						_, _, _, start, stop = segment.artifacts[index]
+						allowed.setdefault(segment, np.zeros(len(segment), dtype=bool))[start:stop] = True
+			best = []
+			for segment in segments:
+				mask = segment.live if allowed is None else segment.live & allowed.get(segment, False)
+				if not mask.any():
+					continue
+				scores = segment.scores(query)
+				scores[~mask] = -np.inf
+				take = min(k, len(scores))
+				for row in np.argpartition(-scores, take - 1)[:take]:
+					if np.isfinite(scores[row]) and scores[row] > 0:
+						best.append((float(scores[row]), segment, int(row)))
+			best.sort(key=lambda item: -item[0])
+			return [(score, self._passage(segment, row)) for score, segment, row in best[:k]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+	"""Return the process-wide semantic index, or None when NumPy is not installed."""
+	global _index
+	if np is None:
+		return None
+	with _index_lock:
+		if _index is None:
+			_index = SemanticIndex(STORE.path)
+			# Passages embedded in the last few seconds are written on the way out
+			atexit.register(_index.save)
+	return _index
+
+
+def retrieve(question, k=TOP_K, ids=None):
+	"""Top-k passages for `question` from the current store, or None if retrieval is unavailable."""
+	index = get_index()
+	if index is None:
+		return None
+	index.refresh()
+	return index.top_k(question, k, ids)
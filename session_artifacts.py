@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+from artifact_store import artifact_id, matches_filter
+from records import ArtifactRecord
+from tools import persist_changes, query_artifacts, store_version, stored_artifacts, stored_locations
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+# Toggles are written together once no new toggle arrived for this long (seconds)
+TOGGLE_DEBOUNCE_SECONDS = float(os.getenv("TOGGLE_DEBOUNCE_SECONDS", "0.5"))
+
+# ...or as soon as this many artifacts changed
+TOGGLE_MAX_BATCH = int(os.getenv("TOGGLE_MAX_BATCH", "50"))
+
+
+# ============================================================================
+# SESSION COLLECTION
+# ============================================================================
+class SessionArtifacts:
+	"""One session's view of the shared artifact list, plus its toggles not yet saved.
+
+	The session keeps no copy of the list: `page` asks the store for the artifacts
+	matching the filters one page at a time, together with their count, and lays the
+	queued toggles over that page. A listing therefore costs one page of records
+	however large the collection is.
+	`toggle` only queues the write; queued changes are saved as one batch after
+	`debounce` seconds without a new toggle, once `max_batch` are waiting, or when
+	`flush` is called. Only the last toggle of an artifact within a batch is written.
+	`refresh` notices what other sessions and processes saved. `revision` moves on
+	every change seen, so views derived from it (the page, the locations) are
+	fetched again only then.
+	"""
+
+	def __init__(self, debounce=TOGGLE_DEBOUNCE_SECONDS, max_batch=TOGGLE_MAX_BATCH):
+		self.debounce = debounce
+		self.max_batch = max_batch
+		self.errors = []
+		self.version = store_version()
+		self._pending = {}  # id -> artifact to add, or None to remove
+		self._lock = threading.RLock()
+		self._timer = None
+		self.revision = 0
+		self._locations = None
+
+	def __len__(self):
+		return self.page(limit=0)[0]
+
+	def __contains__(self, artifact):
+		key = artifact_id(artifact)
+		with self._lock:
+			if key in self._pending:
+				return self._pending[key] is not None
+		return key in stored_artifacts([key])
+
+	@property
+	def pending(self):
+		return len(self._pending)
+
+	def page(self, text=None, location=None, limit=None, offset=0):
+		"""`(total, artifacts)`: how many artifacts match the filters, and `limit` of them from `offset` on.
+
+		Toggles not saved yet are shown as they will be once saved: a removed artifact
+		is left out of its page, which comes up short until the removal is saved, and
+		an added one comes after the stored ones. No artifact is shown on two pages.
+		"""
+		with self._lock:
+			pending = dict(self._pending)
+		hidden = sum(1 for a in stored_artifacts(pending).values() if matches_filter(a, text, location)) if pending else 0
+		added = [a for a in pending.values() if a is not None and matches_filter(a, text, location)]
+		stored, rows = query_artifacts(text, location, limit, offset)
+		rows = [a for a in rows if artifact_id(a) not in pending]
+		if limit is None or offset + limit > stored:
+			rows += added[max(0, offset - stored):None if limit is None else offset + limit - stored]
+		return stored - hidden + len(added), rows
+
+	def locations(self):
+		"""The distinct locations of the listed artifacts, sorted; fetched again only after a change."""
+		with self._lock:
+			if self._locations is None or self._locations[0] != self.revision:
+				found = set(stored_locations())
+				found.update((a.get('details') or {}).get('location') for a in self._pending.values() if a is not None)
+				self._locations = (self.revision, sorted(found - {None}))
+			return self._locations[1]
+
+	def toggle(self, artifact):
+		"""Add `artifact` (stamped with the current time) or remove it. Returns True when it was added."""
+		key = artifact_id(artifact)
+		with self._lock:
+			self.revision += 1
+			if artifact in self:
+				self._queue(key, None)
+				return False
+			# The copy shares the description with `artifact`, without reading it
+			now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+			record = artifact.dated(now) if isinstance(artifact, ArtifactRecord) else dict(artifact, discovered_date=now)
+			self._queue(key, record)
+			return True
+
+	def _queue(self, key, record):
+		self._pending[key] = record
+		if len(self._pending) >= self.max_batch:
+			self.flush()
+			return
+		if self._timer is not None:
+			self._timer.cancel()
+		self._timer = threading.Timer(self.debounce, self.flush)
+		self._timer.daemon = True
+		self._timer.start()
+
+	def flush(self):
+		"""Write every queued change in one batch. Returns False if the write failed."""
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			pending, self._pending = self._pending, {}
+		if not pending:
+			return True
+		adds = [record for record in pending.values() if record is not None]
+		removes = [key for key, record in pending.items() if record is None]
+		if persist_changes(adds, removes):
+			return True
+		names = ", ".join(record['name'] if record else key for key, record in pending.items())
+		with self._lock:
+			self.errors.append(f"Could not save the changes to {names}. They will be lost on reload.")
+		return False
+
+	def refresh(self):
+		"""Notice what the store saved since the last refresh. Returns True when it changed."""
+		version = store_version()
+		if version == self.version:
+			return False
+		with self._lock:
+			self.version = version
+			self.revision += 1
+		return True
+
+	def take_errors(self):
+		"""Return and clear the messages of failed writes (they may come from the timer thread)."""
+		with self._lock:
+			errors, self.errors = self.errors, []
+		return errors
@@ -0,0 +1,382 @@
+"""SQLite-backed artifact repository with an FTS5 index over summaries and descriptions.
+
+Select it with `ARTIFACT_BACKEND=sqlite` (database path in `ARTIFACT_DB`, default
+`data/artifacts.db`). Existing JSON data can be copied over once with:
+
+	python sqlite_store.py migrate [--json data/string_list.json] [--db data/artifacts.db]
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from artifact_index import MAX_CANDIDATES, ArtifactIndex, artifact_aliases, artifact_description
+from artifact_store import ArtifactStore, artifact_id
+from persistence import CHANGE_LOG_SIZE, fold_changes
+from records import as_dict
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# SCHEMA
+# ============================================================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+	seq INTEGER PRIMARY KEY AUTOINCREMENT,
+	id TEXT NOT NULL UNIQUE,
+	name TEXT NOT NULL,
+	aliases TEXT NOT NULL DEFAULT '[]',
+	location TEXT,
+	discovered_date TEXT,
+	summary TEXT,
+	description TEXT,
+	data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_name ON artifacts(name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_artifacts_location ON artifacts(location COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_artifacts_discovered ON artifacts(discovered_date);
+CREATE TABLE IF NOT EXISTS meta (
+	key TEXT PRIMARY KEY,
+	value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TABLE IF NOT EXISTS changes (
+	version INTEGER NOT NULL,
+	id TEXT NOT NULL,
+	removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_changes_version ON changes(version);
+INSERT OR IGNORE INTO meta (key, value) SELECT 'changes_from', value FROM meta WHERE key = 'version';
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS artifacts_fts USING fts5(
+	name, summary, description, content='artifacts', content_rowid='seq'
+);
+CREATE TRIGGER IF NOT EXISTS artifacts_ai AFTER INSERT ON artifacts BEGIN
+	INSERT INTO artifacts_fts (rowid, name, summary, description)
+	VALUES (new.seq, new.name, new.summary, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS artifacts_ad AFTER DELETE ON artifacts BEGIN
+	INSERT INTO artifacts_fts (artifacts_fts, rowid, name, summary, description)
+	VALUES ('delete', old.seq, old.name, old.summary, old.description);
+END;
+"""
+
+
+def _row_values(artifact):
+	details = artifact.get('details') or {}
+	return (
+		artifact_id(artifact),
+		artifact.get('name') or "",
+		json.dumps(artifact_aliases(artifact), ensure_ascii=False),
+		details.get('location'),
+		artifact.get('discovered_date'),
+		details.get('summary'),
+		artifact_description(artifact),
+		_stored_data(artifact),
+	)
+
+
+def _stored_data(artifact):
+	"""The row's `data`: the artifact without its description, which has a column of its own."""
+	details = artifact.get('details')
+	if isinstance(details, Mapping) and details.get('description'):
+		artifact = dict(artifact, details={k: v for k, v in details.items() if k != 'description'})
+	return json.dumps(artifact, ensure_ascii=False)
+
+
+def _from_row(data, description):
+	"""Rebuild an artifact from its row, putting the description back into its details."""
+	artifact = json.loads(data)
+	# A legacy top-level description was kept in `data` as it was
+	if description and artifact.get('description') != description:
+		details = artifact.get('details')
+		if not isinstance(details, dict):
+			details = artifact['details'] = {}
+		details['description'] = description
+	return artifact
+
+
+def _fts_query(text):
+	"""Turn free text into an FTS5 query: every word as a quoted prefix term, OR-ed together."""
+	words = [w for w in "".join(ch if ch.isalnum() else " " for ch in text).split() if len(w) > 1]
+	return " OR ".join(f'"{w}"*' for w in words)
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+class SqliteArtifactStore:
+	"""Artifact repository stored as rows in SQLite, with the same API as `ArtifactStore`.
+
+	Filtering, paging and full-text search run as SQL queries, so callers that use
+	`query`/`count`/`search`/`lookup` never load the whole collection. A description
+	is stored once, in its own column; `data` holds the rest of the artifact. `version` is
+	kept in the database, so every process sees the same number after a write, and
+	the `changes` table keeps the ids each of the last `CHANGE_LOG_SIZE` versions touched.
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self._lock = threading.RLock()
+		self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute("PRAGMA busy_timeout=5000")
+		self._conn.executescript(SCHEMA)
+		try:
+			self._conn.executescript(FTS_SCHEMA)
+			self.has_fts = True
+		except sqlite3.OperationalError:
+			logger.warning("SQLite was built without FTS5; full-text search falls back to LIKE")
+			self.has_fts = False
+		self.version = 0
+		self._records = ()
+		self._records_version = -1
+		self._names = None
+		self._names_version = -1
+		self.refresh()
+
+	def _db_version(self):
+		return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+	def _select(self, where="", params=(), limit=None, offset=0):
+		sql = f"SELECT data, description FROM artifacts {where} ORDER BY seq"
+		if limit is not None:
+			sql += " LIMIT ? OFFSET ?"
+			params = tuple(params) + (limit, offset)
+		with self._lock:
+			rows = self._conn.execute(sql, params).fetchall()
+		return [_from_row(data, description) for data, description in rows]
+
+	def refresh(self):
+		"""Pick up writes from other processes. Returns True when the data changed."""
+		with self._lock:
+			version = self._db_version()
+			changed = version != self.version
+			self.version = version
+			return changed
+
+	def data_version(self):
+		"""Identify the current data; the counter lives in the database, so it survives restarts."""
+		self.refresh()
+		return f"sqlite:{self.path.resolve()}:{self.version}"
+
+	def changes(self, since):
+		"""Ids added (or changed) and removed after version `since`: `{"version", "added", "removed"}`.
+
+		Returns None when that version is older than the kept change rows; reload `records` then.
+		"""
+		self.refresh()
+		with self._lock:
+			version = self.version
+			if since == version:
+				return {"version": version, "added": [], "removed": []}
+			oldest = self._conn.execute("SELECT value FROM meta WHERE key = 'changes_from'").fetchone()[0]
+			if since > version or since < oldest:
+				return None
+			rows = self._conn.execute(
+				"SELECT version, id, removed FROM changes WHERE version > ? AND version <= ? ORDER BY version, rowid",
+				(since, version),
+			).fetchall()
+		steps = {}
+		for row_version, key, removed in rows:
+			steps.setdefault(row_version, ([], []))[1 if removed else 0].append(key)
+		added, removed = fold_changes(steps[v] for v in sorted(steps))
+		return {"version": version, "added": added, "removed": removed}
+
+	def records(self):
+		"""Return every record. Prefer `query` for listings; this loads the whole table once,
+		then only the rows changed since."""
+		self.refresh()
+		with self._lock:
+			if self._records_version == self.version:
+				return self._records
+			delta = self.changes(self._records_version) if self._records_version >= 0 else None
+			if delta is None:
+				self._records = tuple(self._select())
+			else:
+				by_id = {artifact_id(a): a for a in self._records}
+				for key in delta['removed']:
+					by_id.pop(key, None)
+				for key, artifact in self.by_ids(delta['added']).items():
+					# An add moves the artifact to the end, as in the table
+					by_id.pop(key, None)
+					by_id[key] = artifact
+				self._records = tuple(by_id.values())
+			self._records_version = delta['version'] if delta else self.version
+			return self._records
+
+	def index(self):
+		"""Return a name-only index (no descriptions) over the current records."""
+		self.refresh()
+		with self._lock:
+			if self._names_version != self.version:
+				rows = self._conn.execute("SELECT id, name, aliases FROM artifacts ORDER BY seq").fetchall()
+				self._names = ArtifactIndex(
+					{"id": row[0], "name": row[1], "aliases": json.loads(row[2])} for row in rows
+				)
+				self._names_version = self.version
+			return self._names
+
+	def by_ids(self, ids):
+		"""Return `{id: record}` for the `ids` that are in the store."""
+		ids = list(ids)
+		found = {}
+		with self._lock:
+			# Stay under SQLite's limit on bound parameters
+			for start in range(0, len(ids), 500):
+				chunk = ids[start:start + 500]
+				marks = ",".join("?" * len(chunk))
+				rows = self._conn.execute(f"SELECT id, data, description FROM artifacts WHERE id IN ({marks})", chunk).fetchall()
+				found.update((key, _from_row(data, description)) for key, data, description in rows)
+		return found
+
+	def lookup(self, query, limit=MAX_CANDIDATES):
+		"""Find artifacts by (possibly misspelled or partial) name; only matched rows are loaded."""
+		matches, candidates = self.index().lookup(query, limit)
+		full = self.by_ids([stub['id'] for stub in matches] + [stub['id'] for _, stub in candidates])
+		matches = [full[stub['id']] for stub in matches if stub['id'] in full]
+		candidates = [(score, full[stub['id']]) for score, stub in candidates if stub['id'] in full]
+		return matches, candidates
+
+	def search(self, text, limit=MAX_CANDIDATES):
+		"""Full-text search over name, summary and description, as `(score, record)` pairs."""
+		expr = _fts_query(text or "")
+		if not expr:
+			return []
+		with self._lock:
+			if self.has_fts:
+				rows = self._conn.execute(
+					"SELECT a.data, a.description, bm25(artifacts_fts) AS rank FROM artifacts_fts "
+					"JOIN artifacts a ON a.seq = artifacts_fts.rowid "
+					"WHERE artifacts_fts MATCH ? ORDER BY rank LIMIT ?",
+					(expr, limit),
+				).fetchall()
+				# bm25 is negative and lower is better; map it onto 0..1
+				return [(round(-rank / (1 - rank), 2), _from_row(data, description)) for data, description, rank in rows]
+			like = f"%{text}%"
+			rows = self._conn.execute(
+				"SELECT data, description FROM artifacts WHERE summary LIKE ? OR description LIKE ? ORDER BY seq LIMIT ?",
+				(like, like, limit),
+			).fetchall()
+		return [(0.5, _from_row(data, description)) for data, description in rows]
+
+	def _filters(self, text=None, location=None):
+		clauses, params = [], []
+		if text:
+			clauses.append("(name LIKE ? OR summary LIKE ?)")
+			params += [f"%{text}%", f"%{text}%"]
+		if location:
+			clauses.append("location LIKE ?")
+			params.append(f"%{location}%")
+		return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+	def query(self, text=None, location=None, limit=None, offset=0):
+		"""Return records filtered by name/summary text and location, in stored order."""
+		where, params = self._filters(text, location)
+		return self._select(where, params, limit, offset)
+
+	def count(self, text=None, location=None):
+		where, params = self._filters(text, location)
+		with self._lock:
+			return self._conn.execute(f"SELECT COUNT(*) FROM artifacts {where}", params).fetchone()[0]
+
+	def locations(self):
+		"""The distinct locations, sorted."""
+		with self._lock:
+			rows = self._conn.execute("SELECT DISTINCT location FROM artifacts WHERE location IS NOT NULL").fetchall()
+		return sorted(row[0] for row in rows)
+
+	def existing(self, ids):
+		"""Return the subset of `ids` that are in the store."""
+		ids = list(ids)
+		found = set()
+		with self._lock:
+			# Stay under SQLite's limit on bound parameters
+			for start in range(0, len(ids), 500):
+				chunk = ids[start:start + 500]
+				marks = ",".join("?" * len(chunk))
+				found.update(row[0] for row in self._conn.execute(f"SELECT id FROM artifacts WHERE id IN ({marks})", chunk))
+		return found
+
+	def apply(self, adds=(), removes=(), compact_journal=True):
+		"""Insert (upsert) and delete artifacts in one transaction (`compact_journal` is accepted for API parity)."""
+		removes = [artifact_id(item) for item in removes]
+		adds = [as_dict(a) for a in adds if isinstance(a, Mapping)]
+		if not adds and not removes:
+			return
+		with self._lock:
+			conn = self._conn
+			conn.execute("BEGIN IMMEDIATE")
+			try:
+				conn.executemany("DELETE FROM artifacts WHERE id = ?", [(key,) for key in removes])
+				# An add always moves the artifact to the end, matching a fresh append
+				conn.executemany("DELETE FROM artifacts WHERE id = ?", [(artifact_id(a),) for a in adds])
+				conn.executemany(
+					"INSERT INTO artifacts (id, name, aliases, location, discovered_date, summary, description, data) "
+					"VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+					[_row_values(a) for a in adds],
+				)
+				conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+				version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+				conn.executemany(
+					"INSERT INTO changes (version, id, removed) VALUES (?, ?, ?)",
+					[(version, key, 1) for key in removes] + [(version, artifact_id(a), 0) for a in adds],
+				)
+				conn.execute("DELETE FROM changes WHERE version <= ?", (version - CHANGE_LOG_SIZE,))
+				conn.execute(
+					"UPDATE meta SET value = MAX(value, ?) WHERE key = 'changes_from'",
+					(version - CHANGE_LOG_SIZE,),
+				)
+				conn.execute("COMMIT")
+			except BaseException:
+				conn.execute("ROLLBACK")
+				raise
+			self.refresh()
+
+	def compact(self):
+		"""Nothing to fold: every write already lands in the table."""
+
+	def replace(self, records):
+		"""Make `records` the persisted list, writing only the difference from the current one."""
+		wanted = {artifact_id(a): as_dict(a) for a in records if isinstance(a, Mapping)}
+		with self._lock:
+			current = {key: (data, description) for key, data, description in self._conn.execute("SELECT id, data, description FROM artifacts")}
+		removes = [key for key in current if key not in wanted]
+		adds = [a for key, a in wanted.items() if key not in current or _from_row(*current[key]) != a]
+		self.apply(adds=adds, removes=removes)
+
+
+# ============================================================================
+# MIGRATION
+# ============================================================================
+def migrate(json_path, db_path):
+	"""Copy every artifact from the JSON snapshot + journal into the SQLite database."""
+	source = ArtifactStore(json_path).records()
+	target = SqliteArtifactStore(db_path)
+	target.replace(source)
+	return len(source)
+
+
+def main(argv=None):
+	from artifact_store import ARTIFACT_DB, DATA_FILE
+
+	parser = argparse.ArgumentParser(description="SQLite artifact repository tools")
+	sub = parser.add_subparsers(dest="command", required=True)
+	mig = sub.add_parser("migrate", help="copy data/string_list.json into the SQLite database")
+	mig.add_argument("--json", type=Path, default=DATA_FILE)
+	mig.add_argument("--db", type=Path, default=ARTIFACT_DB)
+	args = parser.parse_args(argv)
+
+	if args.command == "migrate":
+		count = migrate(args.json, args.db)
+		print(f"Migrated {count} artifacts from {args.json} to {args.db}")
+
+
+if __name__ == "__main__":
+	main()
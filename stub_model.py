@@ -0,0 +1,285 @@
+"""Offline stand-in for the OpenAI model, for benchmarks and development without network.
+
+Select it with `MODEL_PROVIDER=stub`; `LLM_MODEL` stays untouched, so switching back is
+one environment variable. The stub replays a script of turns: by default it calls
+`get_artifact_details` with the user's question, then streams a canned markdown answer
+token by token. Timing is configurable:
+
+	STUB_FIRST_TOKEN_MS     delay before the first event of every model call (default 300)
+	STUB_TOKENS_PER_SECOND  rate of the streamed answer deltas (default 80, 0 = no delay)
+	STUB_ANSWER_TOKENS      length of the default answer in words (default 150)
+	STUB_SCRIPT             JSON file with a custom list of turns, e.g.
+	                        [{"tool": "get_artifact_details", "arguments": {"artifact_name": "{question}"}},
+	                         {"text": "### Summary\\n..."}]
+
+Every call records how many bytes the real API request would have carried
+(instructions, input items and tool schemas) and how long the run spent between
+a tool call and the next model call, see `StubModel.stats`.
+
+Prompt caching is simulated the way the provider documents it: a request whose
+leading tokens (instructions, then tool schemas, then input) match an earlier
+request reports them as `cached_tokens`, counted from 1024 tokens on in steps of
+128. Set STUB_PROMPT_CACHE=0 to turn that off.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from agents import Model, ModelProvider, ModelResponse, Usage
+from openai.types.responses import (
+	Response,
+	ResponseCompletedEvent,
+	ResponseCreatedEvent,
+	ResponseFunctionToolCall,
+	ResponseOutputItemDoneEvent,
+	ResponseOutputMessage,
+	ResponseOutputText,
+	ResponseTextDeltaEvent,
+	ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+# ============================================================================
+# CONSTANTS
+# ============================================================================
+STUB_FIRST_TOKEN_MS = float(os.getenv("STUB_FIRST_TOKEN_MS", "300"))
+STUB_TOKENS_PER_SECOND = float(os.getenv("STUB_TOKENS_PER_SECOND", "80"))
+STUB_ANSWER_TOKENS = int(os.getenv("STUB_ANSWER_TOKENS", "150"))
+STUB_SCRIPT = os.getenv("STUB_SCRIPT")
+STUB_PROMPT_CACHE = os.getenv("STUB_PROMPT_CACHE", "1") == "1"
+
+# Rough size of a token, for the usage numbers the stub reports
+CHARS_PER_TOKEN = 4
+
+# Shortest cacheable prefix and the step cache hits grow in, in tokens
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+# Prefix hashes remembered by the simulated cache
+CACHE_MAX_ENTRIES = 10_000
+
+_FILLER = (
+	"The artifact was recorded during the excavation and its measurements come from the "
+	"repository entry, which also notes the material, the find context and the current location."
+).split()
+
+
+def default_script(answer_tokens=STUB_ANSWER_TOKENS):
+	"""One tool call followed by a markdown answer of `answer_tokens` words."""
+	body = " ".join(_FILLER[i % len(_FILLER)] for i in range(max(answer_tokens - 8, 0)))
+	return [
+		{"tool": "get_artifact_details", "arguments": {"artifact_name": "{question}"}},
+		{"text": "### Summary\nHere is what the repository says about {question}.\n### Facts\n" + body},
+	]
+
+
+def load_script(path=STUB_SCRIPT):
+	if not path:
+		return default_script()
+	return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def _fill(value, question):
+	if isinstance(value, str):
+		return value.replace("{question}", question)
+	if isinstance(value, dict):
+		return {k: _fill(v, question) for k, v in value.items()}
+	return value
+
+
+def _item_type(item):
+	return item.get('type') if isinstance(item, dict) else getattr(item, 'type', None)
+
+
+def _turn_state(input):
+	"""The latest user question and how many tool results followed it."""
+	if isinstance(input, str):
+		return input, 0
+	question, tool_results = "", 0
+	for item in input:
+		if isinstance(item, dict) and item.get('role') == "user":
+			content = item.get('content')
+			question = content if isinstance(content, str) else json.dumps(content, default=str)
+			tool_results = 0
+		elif _item_type(item) == "function_call_output":
+			tool_results += 1
+	return question, tool_results
+
+
+def request_body(system_instructions, input, tools):
+	"""The JSON body the Responses API would receive for this call, in prompt order."""
+	body = {
+		"instructions": system_instructions,
+		"tools": [
+			{"name": tool.name, "description": getattr(tool, 'description', ""), "parameters": getattr(tool, 'params_json_schema', None)}
+			for tool in tools
+		],
+		"input": input,
+	}
+	return json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def request_bytes(system_instructions, input, tools):
+	"""Size of the JSON body the Responses API would receive for this call."""
+	return len(request_body(system_instructions, input, tools))
+
+
+class PrefixCache:
+	"""Simulated provider prompt cache: remembers hashes of request prefixes in 128-token steps."""
+
+	def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+		self.max_entries = max_entries
+		self._seen = {}  # prefix hash -> None, oldest first
+
+	def lookup_and_store(self, body):
+		"""Return how many leading tokens of `body` were cached, then cache its prefixes."""
+		block = CACHE_BLOCK_TOKENS * CHARS_PER_TOKEN
+		digest = hashlib.sha1()
+		cached, hit, end = 0, True, CACHE_MIN_TOKENS * CHARS_PER_TOKEN
+		digest.update(body[:end])
+		while end <= len(body):
+			key = digest.copy().hexdigest()
+			if hit and key in self._seen:
+				cached = end // CHARS_PER_TOKEN
+			else:
+				hit = False
+			self._seen.pop(key, None)
+			self._seen[key] = None
+			digest.update(body[end:end + block])
+			end += block
+		while len(self._seen) > self.max_entries:
+			del self._seen[next(iter(self._seen))]
+		return cached
+
+
+# ============================================================================
+# MODEL
+# ============================================================================
+class StubModel(Model):
+	"""Replays a scripted conversation as Responses API stream events, without network."""
+
+	def __init__(self, script=None, first_token_ms=STUB_FIRST_TOKEN_MS, tokens_per_second=STUB_TOKENS_PER_SECOND):
+		self.script = script if script is not None else load_script()
+		self.first_token_ms = first_token_ms
+		self.tokens_per_second = tokens_per_second
+		self._last_call_ended = None
+		self.prompt_cache = PrefixCache() if STUB_PROMPT_CACHE else None
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.stats = {"requests": 0, "bytes_sent": 0, "cached_tokens": 0, "tool_seconds": 0.0}
+
+	async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, *, previous_response_id=None, conversation_id=None, prompt=None):
+		response = None
+		async for event in self.stream_response(
+			system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+			previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+		):
+			if isinstance(event, ResponseCompletedEvent):
+				response = event.response
+		usage = Usage(
+			requests=1,
+			input_tokens=response.usage.input_tokens,
+			input_tokens_details=response.usage.input_tokens_details,
+			output_tokens=response.usage.output_tokens,
+			total_tokens=response.usage.total_tokens,
+		)
+		return ModelResponse(output=response.output, usage=usage, response_id=response.id)
+
+	async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, *, previous_response_id=None, conversation_id=None, prompt=None):
+		started = time.perf_counter()
+		question, tool_results = _turn_state(input)
+		body = request_body(system_instructions, input, tools)
+		sent = len(body)
+		cached = self.prompt_cache.lookup_and_store(body) if self.prompt_cache is not None else 0
+		self.stats['requests'] += 1
+		self.stats['bytes_sent'] += sent
+		self.stats['cached_tokens'] += cached
+		if tool_results and self._last_call_ended is not None:
+			self.stats['tool_seconds'] += started - self._last_call_ended
+
+		turn = _fill(self.script[min(tool_results, len(self.script) - 1)], question)
+		response_id = f"resp_stub_{uuid.uuid4().hex[:12]}"
+		sequence = 0
+
+		def next_sequence():
+			nonlocal sequence
+			sequence += 1
+			return sequence
+
+		await asyncio.sleep(self.first_token_ms / 1000)
+		yield ResponseCreatedEvent(type="response.created", sequence_number=next_sequence(), response=self._response(response_id, [], 0, 0, 0))
+
+		if "tool" in turn:
+			item = ResponseFunctionToolCall(
+				type="function_call",
+				id=f"fc_{uuid.uuid4().hex[:12]}",
+				call_id=f"call_{uuid.uuid4().hex[:12]}",
+				name=turn['tool'],
+				arguments=json.dumps(turn.get('arguments') or {}),
+				status="completed",
+			)
+			output_tokens = len(item.arguments) // CHARS_PER_TOKEN
+		else:
+			item_id = f"msg_{uuid.uuid4().hex[:12]}"
+			words = turn.get('text', "").split(" ")
+			delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+			for i, word in enumerate(words):
+				if delay:
+					await asyncio.sleep(delay)
+				yield ResponseTextDeltaEvent(
+					type="response.output_text.delta",
+					item_id=item_id,
+					output_index=0,
+					content_index=0,
+					delta=word if i == 0 else " " + word,
+					logprobs=[],
+					sequence_number=next_sequence(),
+				)
+			item = ResponseOutputMessage(
+				type="message",
+				id=item_id,
+				role="assistant",
+				status="completed",
+				content=[ResponseOutputText(type="output_text", text=turn.get('text', ""), annotations=[])],
+			)
+			output_tokens = len(words)
+
+		yield ResponseOutputItemDoneEvent(type="response.output_item.done", item=item, output_index=0, sequence_number=next_sequence())
+		response = self._response(response_id, [item], sent // CHARS_PER_TOKEN, output_tokens, cached)
+		self._last_call_ended = time.perf_counter()
+		yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=next_sequence())
+
+	@staticmethod
+	def _response(response_id, output, input_tokens, output_tokens, cached_tokens):
+		return Response(
+			id=response_id,
+			object="response",
+			created_at=time.time(),
+			model="stub",
+			output=output,
+			parallel_tool_calls=False,
+			tool_choice="auto",
+			tools=[],
+			usage=ResponseUsage(
+				input_tokens=input_tokens,
+				input_tokens_details=InputTokensDetails.model_validate({"cached_tokens": cached_tokens, "cache_write_tokens": 0}),
+				output_tokens=output_tokens,
+				output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+				total_tokens=input_tokens + output_tokens,
+			),
+		)
+
+
+class StubModelProvider(ModelProvider):
+	"""Hands out one shared `StubModel` whatever model name the agent asks for."""
+
+	def __init__(self, model=None):
+		self.model = model or StubModel()
+
+	def get_model(self, model_name):
+		return self.model
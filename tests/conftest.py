@@ -0,0 +1,20 @@
+"""Shared test setup: the modules under test read their configuration at import time.
+
+Every test session gets its own data directory, so no test touches `data/`, and
+traces and the model stay local.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ["ARTIFACT_DATA_DIR"] = tempfile.mkdtemp(prefix="artifact-tests-")
+os.environ["ARTIFACT_BACKEND"] = "json"
+os.environ["TRACE_EXPORT"] = "none"
+os.environ["MODEL_PROVIDER"] = "stub"
+# The stub model answers at once
+os.environ["STUB_FIRST_TOKEN_MS"] = "0"
+os.environ["STUB_TOKENS_PER_SECOND"] = "0"
@@ -0,0 +1,19 @@
+import asyncio
+import json
+
+from agent import run_agent
+from conversation import Conversation
+from privacy import REDACTION
+from tools import STORE
+
+SITE = "Hollow Fen Trench"
+
+
+def test_stored_turns_are_redacted():
+	STORE.apply(adds=[{"name": "Fen Amulet", "details": {"location": SITE, "summary": "An amulet."}}])
+	conversation = Conversation()
+	# The stub echoes the question in its tool call and in its answer
+	answer = asyncio.run(run_agent(f"What was found at {SITE}?", conversation=conversation))
+	assert SITE not in answer and REDACTION in answer
+	stored = json.dumps(conversation.turns[0]['items'][1:])
+	assert SITE not in stored and REDACTION in stored
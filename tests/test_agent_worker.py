@@ -0,0 +1,51 @@
+import concurrent.futures
+
+import pytest
+
+import agent
+from agent import run_agent
+from agent_worker import AgentWorker, WorkerBusy
+
+QUESTION = "Where is the Laufen Lens?"
+
+
+@pytest.fixture
+def slow_model(monkeypatch):
+	"""Make every stub model call wait before its first event, so runs stay in flight."""
+	monkeypatch.setattr(agent.RUN_CONFIG.model_provider.model, "first_token_ms", 300)
+
+
+def test_updates_stream_until_the_answer():
+	worker = AgentWorker(run_agent)
+	job = worker.submit("session", QUESTION)
+	texts = list(job.updates())
+	assert job.error is None and job.answer
+	assert texts and job.answer in texts[-1]
+	assert job.run['question'] == QUESTION and job.run['duration_ms'] > 0
+
+
+def test_a_new_question_cancels_the_sessions_earlier_run(slow_model):
+	worker = AgentWorker(run_agent)
+	first = worker.submit("session", QUESTION)
+	second = worker.submit("session", "What was found at Laufen?")
+	list(first.updates())
+	assert first.answer is None and isinstance(first.error, concurrent.futures.CancelledError)
+	list(second.updates())
+	assert second.error is None and second.answer
+
+
+def test_submit_turns_questions_away_once_max_pending_runs_wait(slow_model):
+	worker = AgentWorker(run_agent, max_concurrent=1, max_pending=2)
+	jobs = [worker.submit("first", QUESTION), worker.submit("second", QUESTION)]
+	with pytest.raises(WorkerBusy):
+		worker.submit("third", QUESTION)
+	# A session asking again replaces its own run, so it is not turned away
+	jobs[1] = worker.submit("second", QUESTION)
+	assert worker.pending == 2
+	for job in jobs:
+		list(job.updates())
+		job._future.result()
+	assert worker.pending == 0
+	job = worker.submit("third", QUESTION)
+	list(job.updates())
+	assert job.answer
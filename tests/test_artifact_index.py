@@ -0,0 +1,88 @@
+import json
+import time
+
+from artifact_index import CHARS_PER_TOKEN, ArtifactIndex, format_response, normalize_name
+from tools import seed_artifacts
+
+
+def names(records):
+	return [a['name'] for a in records]
+
+
+# ============================================================================
+# LOOKUP
+# ============================================================================
+def test_names_are_normalized():
+	assert normalize_name("  Tête-à-Tête  LENS! ") == "tete a tete lens"
+
+
+def test_exact_partial_and_several_names_match():
+	index = ArtifactIndex(seed_artifacts())
+	assert names(index.lookup("laufen lens")[0]) == ["Laufen Lens"]
+	assert names(index.lookup("Tell me about the Hohenfeld Basalt Slab")[0]) == ["Hohenfeld Basalt Slab"]
+	assert names(index.lookup("Laufen Lens and Altbrunn Prism")[0]) == ["Laufen Lens", "Altbrunn Prism"]
+
+
+def test_misspelled_names_match_or_become_candidates():
+	index = ArtifactIndex(seed_artifacts())
+	assert names(index.lookup("Altbrun Prizm")[0]) == ["Altbrunn Prism"]
+	matches, candidates = index.lookup("Zorn kettle of gold")
+	assert matches == [] and candidates == []
+
+
+def test_aliases_and_derived_names_match():
+	index = ArtifactIndex([
+		{"name": "Ember Flute", "aliases": ["Fire Pipe"]},
+		{"name": "Tarn Horn", "details": {"description": "The Great Tarn Horn artifact is carved."}},
+	])
+	assert names(index.lookup("fire pipe")[0]) == ["Ember Flute"]
+	assert names(index.lookup("great tarn horn")[0]) == ["Tarn Horn"]
+
+
+def test_ambiguous_misspellings_are_ranked_candidates():
+	index = ArtifactIndex([{"name": "Lovas Jornev Tablet"}, {"name": "Nevqui Jornev Tablet"}])
+	matches, candidates = index.lookup("Jornevv Tablet")
+	assert matches == []
+	assert names(a for _, a in candidates) == ["Lovas Jornev Tablet", "Nevqui Jornev Tablet"]
+	assert candidates[0][0] >= candidates[1][0]
+
+
+def test_misses_do_not_scan_the_whole_collection():
+	words = ["ka", "lo", "mi", "ren", "tor", "vas", "bel", "dun", "fri", "gha"]
+	records = [
+		{"name": f"{words[i % 10]}{words[i // 10 % 10]}{words[i // 100 % 10]} {words[i // 1000 % 10]}{words[i % 7]} Bowl"}
+		for i in range(10000)
+	]
+	index = ArtifactIndex(records)
+	started = time.perf_counter()
+	index.lookup("Zorn kettle of gold")
+	assert time.perf_counter() - started < 0.25
+
+
+# ============================================================================
+# RESPONSE BUDGET
+# ============================================================================
+def test_response_fits_the_byte_budget_by_shortening_descriptions():
+	artifact = {"name": "Laufen Lens", "details": {"summary": "A lens.", "description": "Ö quartz lens. " * 400}}
+	text = format_response("laufen lens", [artifact], [], max_bytes=1000)
+	response = json.loads(text)
+	assert len(text.encode("utf-8")) <= 1000
+	assert response['truncated'] is True
+	assert response['matches'][0]['details']['description'].endswith("[...]")
+
+
+def test_response_fits_the_token_budget():
+	artifact = {"name": "Laufen Lens", "details": {"description": "word " * 2000}}
+	text = format_response("laufen lens", [artifact], [], max_bytes=100000, max_tokens=300)
+	assert len(text.encode("utf-8")) <= 300 * CHARS_PER_TOKEN
+
+
+def test_candidates_that_do_not_fit_are_dropped():
+	candidates = [(0.8, {"name": f"Find {i}", "details": {"summary": "s" * 50}}) for i in range(50)]
+	response = json.loads(format_response("find", [], candidates, max_bytes=600))
+	assert 0 < len(response['candidates']) < 50 and response['truncated'] is True
+
+
+def test_an_empty_result_says_so():
+	response = json.loads(format_response("zorn kettle", [], []))
+	assert response['note'] and response['matches'] == [] and response['truncated'] is False
@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import artifact_service
+from artifact_service import ArtifactServiceError, RemoteArtifactStore, make_server
+from artifact_store import ArtifactStore
+
+
+def artifact(name, location="Laufen", description=""):
+	return {"name": name, "details": {"summary": f"The {name}.", "location": location, "description": description}}
+
+
+def names(records):
+	return [record['name'] for record in records]
+
+
+@pytest.fixture
+def store(tmp_path):
+	store = ArtifactStore(tmp_path / "service" / "string_list.json")
+	store.apply(adds=[artifact("Laufen Lens", description="Ground from quartz."), artifact("Tarn Horn", "Hollow Fen")])
+	return store
+
+
+@pytest.fixture
+def address(store):
+	"""A service for `store` on a temporary Unix socket (kept short: socket paths are limited)."""
+	directory = tempfile.mkdtemp(prefix="svc-")
+	address = str(Path(directory) / "artifacts.sock")
+	server = make_server(address, store)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield address
+	server.shutdown()
+	server.server_close()
+	shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def worker(address, tmp_path):
+	return RemoteArtifactStore(address, tmp_path / "worker" / "string_list.json")
+
+
+def test_records_come_from_the_service(worker):
+	records = worker.records()
+	assert names(records) == ["Laufen Lens", "Tarn Horn"]
+	# Descriptions are kept in the worker's blob file and read back on demand
+	assert records[0]['details']['description'] == "Ground from quartz."
+	assert worker.records() is records
+
+
+def test_records_are_fetched_in_pages(store, worker, monkeypatch):
+	store.apply(adds=[artifact(f"Find {i}") for i in range(5)])
+	monkeypatch.setattr(artifact_service, "RECORDS_PAGE", 3)
+	pages = []
+	call = worker._call
+
+	def counting_call(name, **kwargs):
+		if name == "records":
+			pages.append(kwargs['offset'])
+		return call(name, **kwargs)
+
+	monkeypatch.setattr(worker, "_call", counting_call)
+	assert len(worker.records()) == 7
+	assert pages == [0, 3, 6]
+
+
+def test_reads_run_in_the_service(worker):
+	assert worker.count(location="hollow") == 1
+	assert names(worker.query(limit=1, offset=1)) == ["Tarn Horn"]
+	assert worker.locations() == ["Hollow Fen", "Laufen"]
+	assert names(worker.lookup("laufen lnes")[0]) == ["Laufen Lens"]
+	assert worker.existing(["tarn horn", "ember flute"]) == {"tarn horn"}
+
+
+def test_writes_apply_to_the_service_store(store, worker, monkeypatch):
+	worker.records()
+	version = worker.version
+	worker.apply(adds=[artifact("Ember Flute")], removes=["tarn horn"])
+	assert worker.version > version
+	store.refresh()
+	assert names(store.records()) == ["Laufen Lens", "Ember Flute"]
+	assert worker.changes(version) == {"version": worker.version, "added": ["ember flute"], "removed": ["tarn horn"]}
+
+	def fetch_all(version):
+		raise AssertionError("the whole collection was fetched again")
+
+	# The worker patches its cached records with just the changed ones
+	monkeypatch.setattr(worker, "_fetch_all", fetch_all)
+	assert names(worker.records()) == ["Laufen Lens", "Ember Flute"]
+
+
+def test_unknown_calls_are_rejected(worker):
+	with pytest.raises(ArtifactServiceError, match="unknown call"):
+		worker._call("drop_everything")
+
+
+def test_a_change_long_poll_wakes_on_a_write(address, worker, tmp_path):
+	state = worker._request("GET", "/state")
+	key = f"{state['epoch']}:{state['version']}"
+	answered = []
+
+	def poll():
+		started = time.monotonic()
+		answered.append((worker._request("GET", f"/changes?since={key}&timeout=10", timeout=20), time.monotonic() - started))
+
+	poller = threading.Thread(target=poll)
+	poller.start()
+	time.sleep(0.2)
+	assert answered == []
+	RemoteArtifactStore(address, tmp_path / "writer" / "string_list.json").apply(adds=[artifact("Ember Flute")])
+	poller.join(timeout=5)
+	(changed, waited), = answered
+	assert waited < 2
+	assert changed['version'] == state['version'] + 1 and changed['added'] == ["ember flute"]
+
+
+def test_a_change_long_poll_returns_unchanged_after_its_timeout(worker):
+	state = worker._request("GET", "/state")
+	key = f"{state['epoch']}:{state['version']}"
+	started = time.monotonic()
+	unchanged = worker._request("GET", f"/changes?since={key}&timeout=0.2")
+	assert unchanged['version'] == state['version'] and time.monotonic() - started < 2
+
+
+def test_subscribers_hear_about_other_workers_writes(address, worker, tmp_path):
+	heard = threading.Event()
+	worker.records()
+	worker.subscribe(lambda version: heard.set())
+	RemoteArtifactStore(address, tmp_path / "writer" / "string_list.json").apply(removes=["laufen lens"])
+	assert heard.wait(5)
+	assert names(worker.records()) == ["Tarn Horn"]
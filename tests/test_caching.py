@@ -0,0 +1,165 @@
+import threading
+import time
+
+from caching import TOOL_CACHES, ResponseCache, TTLCache, memoize_tool
+
+
+def counting_tool(name, version=None, delay=0.0, result="found"):
+	"""A memoized tool that counts how often it really ran."""
+	calls = []
+
+	def tool(artifact_name: str, question: str = "") -> str:
+		calls.append(artifact_name)
+		time.sleep(delay)
+		return result
+
+	tool.__name__ = name
+	return memoize_tool(version=version)(tool), calls
+
+
+def teardown_function():
+	for name in [name for name in TOOL_CACHES if name.startswith("test_")]:
+		del TOOL_CACHES[name]
+
+
+def test_repeated_calls_with_equivalent_arguments_run_once():
+	tool, calls = counting_tool("test_lookup")
+	assert tool("Laufen Lens") == "found"
+	assert tool(artifact_name="  laufen lens ", question="") == "found"
+	assert calls == ["Laufen Lens"]
+	assert tool.cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_a_new_data_version_is_never_served_an_old_result():
+	version = [1]
+	tool, calls = counting_tool("test_versioned", version=lambda: version[0])
+	tool("Laufen Lens")
+	tool("Laufen Lens")
+	version[0] = 2
+	tool("Laufen Lens")
+	assert len(calls) == 2
+
+
+def test_empty_results_are_not_cached():
+	tool, calls = counting_tool("test_empty", result="")
+	tool("Unknown")
+	tool("Unknown")
+	assert len(calls) == 2
+
+
+def test_concurrent_calls_compute_once():
+	tool, calls = counting_tool("test_single_flight", delay=0.2)
+	start = threading.Barrier(8)
+	results = []
+
+	def ask():
+		start.wait()
+		results.append(tool("Laufen Lens"))
+
+	threads = [threading.Thread(target=ask) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert results == ["found"] * 8
+	assert calls == ["Laufen Lens"]
+	assert tool.cache_stats()['hits'] == 7
+
+
+def test_waiters_compute_themselves_when_the_first_call_fails():
+	failures = [True]
+
+	def flaky(artifact_name: str) -> str:
+		time.sleep(0.1)
+		if failures and failures.pop():
+			raise RuntimeError("lost the store")
+		return "found"
+
+	flaky.__name__ = "test_flaky"
+	tool = memoize_tool()(flaky)
+	errors, results = [], []
+
+	def ask():
+		try:
+			results.append(tool("Laufen Lens"))
+		except RuntimeError as exc:
+			errors.append(exc)
+
+	first = threading.Thread(target=ask)
+	first.start()
+	time.sleep(0.02)
+	second = threading.Thread(target=ask)
+	second.start()
+	first.join()
+	second.join()
+	assert len(errors) == 1 and results == ["found"]
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+	cache = TTLCache(max_entries=2, ttl=0.05)
+	cache.set("a", 1)
+	cache.set("b", 2)
+	cache.get("a")
+	cache.set("c", 3)
+	assert cache.get("b") is None and cache.get("a") == 1
+	time.sleep(0.06)
+	assert cache.get("a") is None
+
+
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+def answer_key(question, data_version="v1"):
+	return ResponseCache.key(question, "stub-model", "You answer questions.", data_version)
+
+
+def test_response_cache_hits_equivalent_questions():
+	cache = ResponseCache()
+	assert cache.get(answer_key("Where is the Laufen Lens?"), "v1") is None
+	cache.set(answer_key("Where is the Laufen Lens?"), "v1", "In Laufen.")
+	assert cache.get(answer_key("  where is the laufen lens? "), "v1") == "In Laufen."
+	assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_response_cache_entries_expire(tmp_path):
+	cache = ResponseCache(ttl=0.05, disk_path=tmp_path / "responses.db")
+	cache.set(answer_key("Where is the Laufen Lens?"), "v1", "In Laufen.")
+	time.sleep(0.06)
+	assert cache.get(answer_key("Where is the Laufen Lens?"), "v1") is None
+
+
+def test_response_cache_is_cleared_when_the_data_changes(tmp_path):
+	cache = ResponseCache(disk_path=tmp_path / "responses.db")
+	old = answer_key("Where is the Laufen Lens?", "v1")
+	cache.set(old, "v1", "In Laufen.")
+	assert cache.get(answer_key("Where is the Laufen Lens?", "v2"), "v2") is None
+	# Even a key built for the old version is not served once the data moved on
+	assert cache.get(old, "v2") is None
+	assert len(cache.memory) == 0
+	assert ResponseCache(disk_path=tmp_path / "responses.db").get(old, "v1") is None
+
+
+def test_response_cache_answers_survive_a_restart(tmp_path):
+	ResponseCache(disk_path=tmp_path / "responses.db").set(answer_key("Where is the Laufen Lens?"), "v1", "In Laufen.")
+	cache = ResponseCache(disk_path=tmp_path / "responses.db")
+	assert cache.get(answer_key("Where is the Laufen Lens?"), "v1") == "In Laufen."
+	assert cache.hits == 1
+
+
+def test_response_cache_counts_concurrent_lookups():
+	cache = ResponseCache()
+	cache.set(answer_key("Where is the Laufen Lens?"), "v1", "In Laufen.")
+	start = threading.Barrier(8)
+
+	def ask():
+		start.wait()
+		for _ in range(500):
+			cache.get(answer_key("Where is the Laufen Lens?"), "v1")
+			cache.get(answer_key("Where is the Tarn Horn?"), "v1")
+
+	threads = [threading.Thread(target=ask) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert (cache.hits, cache.misses) == (4000, 4000)
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import fact_sheets
+from artifact_store import ArtifactStore
+from fact_sheets import FactSheets, build_sheet, location_is_public
+
+LENS = {
+	"name": "Laufen Lens",
+	"details": {
+		"summary": "A quartz lens.",
+		"location": "Laufen Village Museum",
+		"description": "Uncovered in 1911 near Laufen, the lens measures 12.6 cm across. It was made of quartz and used for divination.",
+	},
+}
+
+
+def edited(artifact, **details):
+	return dict(artifact, details=dict(artifact['details'], **details))
+
+
+@pytest.fixture
+def builds(monkeypatch):
+	"""Count the sheets actually built."""
+	built = []
+
+	def build(artifact):
+		built.append(artifact['name'])
+		return build_sheet(artifact)
+
+	monkeypatch.setattr(fact_sheets, "build_sheet", build)
+	return built
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+def test_sheets_hold_the_extracted_facts():
+	sheet = build_sheet(LENS)
+	assert sheet['measurements'] == ["the lens measures 12.6 cm across"]
+	assert sheet['excavation_years'] == ["1911"] and sheet['materials'] == ["quartz"]
+	assert sheet['proposed_uses'] == ["divination"]
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+def test_sheets_are_cached_on_disk_by_content_hash(tmp_path, builds):
+	sheets = FactSheets(tmp_path / "string_list.json")
+	assert sheets.update([LENS]) == 1
+	cached = json.loads((tmp_path / "string_list.facts.json").read_text(encoding="utf-8"))
+	assert list(cached) == ["laufen lens"]
+
+	reloaded = FactSheets(tmp_path / "string_list.json")
+	assert reloaded.update([LENS]) == 0
+	assert reloaded.sheet(LENS)['materials'] == ["quartz"]
+	assert builds == ["Laufen Lens"]
+
+
+def test_only_a_new_summary_or_description_rebuilds_a_sheet(tmp_path, builds):
+	sheets = FactSheets(tmp_path / "string_list.json")
+	sheets.update([LENS])
+	assert sheets.update([edited(LENS, location="Storage")]) == 0
+	assert sheets.update([edited(LENS, summary="A basalt lens.")]) == 1
+	assert sheets.update([edited(LENS, summary="A basalt lens.", description="Carved from basalt.")]) == 1
+	assert sheets.sheet(edited(LENS, summary="A basalt lens.", description="Carved from basalt."))['materials'] == ["basalt"]
+	assert len(builds) == 3
+
+
+def test_an_unreadable_cache_is_rebuilt(tmp_path):
+	(tmp_path / "string_list.facts.json").write_text("{not json", encoding="utf-8")
+	sheets = FactSheets(tmp_path / "string_list.json")
+	assert len(sheets) == 0 and sheets.update([LENS]) == 1
+
+
+def test_refresh_follows_the_store_changes(tmp_path, builds):
+	store = ArtifactStore(tmp_path / "string_list.json")
+	store.apply(adds=[LENS, {"name": "Tarn Horn", "details": {"summary": "A bone horn."}}])
+	sheets = FactSheets(store.path)
+	sheets.refresh(store)
+	assert len(sheets) == 2
+	store.apply(removes=["tarn horn"])
+	sheets.refresh(store)
+	assert len(sheets) == 1 and builds == ["Laufen Lens", "Tarn Horn"]
+
+
+# ============================================================================
+# LOCATIONS
+# ============================================================================
+@pytest.mark.parametrize("details, metadata, public", [
+	({"location": "Laufen Village Museum"}, {}, True),
+	({"location": "On display at the Hohenfeld gallery"}, {}, True),
+	({"location": "Trench 4, Hollow Fen"}, {}, False),
+	({"location": "Private collection, Zurich"}, {}, False),
+	({}, {}, False),
+	({"location": "Trench 4", "location_public": True}, {}, True),
+	({"location": "Trench 4"}, {"location_public": "yes"}, True),
+	# An explicit flag wins over the wording of the location
+	({"location": "Laufen Village Museum", "location_public": False}, {}, False),
+	({"location": "Laufen Village Museum"}, {"location_public": "false"}, False),
+])
+def test_location_is_public(details, metadata, public):
+	assert location_is_public({"name": "Find", "details": details, "metadata": metadata}) is public
+
+
+def test_served_sheets_show_only_public_locations(tmp_path):
+	sheets = FactSheets(tmp_path / "string_list.json")
+	assert sheets.sheet(LENS)['location'] == "Laufen Village Museum"
+	hidden = sheets.sheet(edited(LENS, location="Trench 4, Hollow Fen"))
+	assert hidden['location_public'] is False and 'location' not in hidden
@@ -0,0 +1,98 @@
+import io
+import json
+
+import pytest
+
+from artifact_store import ArtifactStore
+from importer import InvalidRecord, import_stream, normalize_record
+
+
+def jsonl(*records):
+	return io.StringIO("".join((r if isinstance(r, str) else json.dumps(r)) + "\n" for r in records))
+
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+def test_flat_and_nested_fields_are_merged():
+	artifact = normalize_record({
+		"name": "  Laufen   Lens ", "summary": "A lens.", "details": {"location": "Laufen"},
+		"metadata": {"layer": "3"}, "museum": "Basel",
+	})
+	assert artifact == {
+		"name": "Laufen Lens",
+		"details": {"location": "Laufen", "summary": "A lens."},
+		"metadata": {"layer": "3", "museum": "Basel"},
+	}
+
+
+def test_legacy_strings_use_the_first_line_as_name():
+	artifact = normalize_record("Laufen Lens\nA quartz lens.")
+	assert artifact['name'] == "Laufen Lens"
+	assert artifact['details']['description'] == "Laufen Lens\nA quartz lens."
+
+
+@pytest.mark.parametrize("raw, reason", [
+	(["Laufen Lens"], "expected an object"),
+	({"summary": "no name"}, "missing name"),
+	({"name": "!!!"}, "no letters or digits"),
+	({"name": "x" * 201}, "longer than"),
+	({"name": "Lens", "summary": 3}, "summary must be text"),
+	({"name": "Lens", "aliases": "Lens of Laufen"}, "aliases"),
+	({"name": "Lens", "details": "found in Laufen"}, "details must be an object"),
+	({"name": "Lens", "details": ["Laufen"]}, "details must be an object"),
+	({"name": "Lens", "metadata": "layer 3"}, "metadata must be an object"),
+])
+def test_invalid_records_say_why(raw, reason):
+	with pytest.raises(InvalidRecord, match=reason):
+		normalize_record(raw)
+
+
+def test_input_metadata_is_not_modified():
+	metadata = {"layer": "3"}
+	normalize_record({"name": "Lens", "metadata": metadata, "museum": "Basel"})
+	assert metadata == {"layer": "3"}
+
+
+# ============================================================================
+# IMPORT
+# ============================================================================
+def test_report_counts_imported_duplicate_and_rejected_rows(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	store.apply(adds=[{"name": "Hohenfeld Basalt Slab"}])
+	stream = jsonl(
+		{"name": "Laufen Lens"},
+		"{not json",
+		{"name": "Laufen  Lens"},
+		{"name": "Hohenfeld Basalt Slab"},
+		{"name": "Ember Flute", "details": "a flute"},
+		{"name": "Tarn Horn", "metadata": ["bone"]},
+		{"name": "Ember Flute"},
+	)
+	report = import_stream(stream, "jsonl", store=store, batch_size=2, update_index=False)
+	assert (report.read, report.imported, report.duplicates, report.invalid) == (7, 2, 2, 3)
+	assert [number for number, _ in report.errors] == [2, 5, 6]
+	assert sorted(a['name'] for a in ArtifactStore(tmp_path / "list.json").records()) == [
+		"Ember Flute", "Hohenfeld Basalt Slab", "Laufen Lens",
+	]
+
+
+def test_replace_overwrites_existing_artifacts(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	store.apply(adds=[{"name": "Laufen Lens", "details": {"summary": "old"}}])
+	report = import_stream(
+		jsonl({"name": "Laufen Lens", "summary": "new"}), "jsonl",
+		store=store, replace=True, update_index=False,
+	)
+	assert report.imported == 1
+	assert store.by_ids(["laufen lens"])["laufen lens"]['details']['summary'] == "new"
+
+
+def test_csv_columns_become_fields_and_metadata(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	stream = io.StringIO("Name,Summary,Aliases,Museum\nLaufen Lens,A lens.,Lens of Laufen; LL,Basel\n,no name,,\n")
+	report = import_stream(stream, "csv", store=store, update_index=False)
+	assert (report.imported, report.invalid) == (1, 1)
+	artifact = store.by_ids(["laufen lens"])["laufen lens"]
+	assert artifact['aliases'] == ["Lens of Laufen", "LL"]
+	assert artifact['metadata'] == {"museum": "Basel"}
@@ -0,0 +1,53 @@
+import json
+import threading
+
+from instrumentation import capture_runs, export, last_run, span, summary
+
+
+def finished_trace(name="agent.run", **attributes):
+	trace = []
+	with span(name, **attributes) as root:
+		with span("tool.get_artifact_details"):
+			pass
+		trace = root.trace
+	return trace
+
+
+def test_child_spans_share_the_root_trace():
+	trace = finished_trace()
+	assert [s.name for s in trace] == ["tool.get_artifact_details", "agent.run"]
+	assert trace[0].parent_id == trace[1].span_id and trace[0].trace_id == trace[1].trace_id
+	assert any(row['span'] == "agent.run" for row in summary())
+
+
+def test_capture_runs_sees_only_the_runs_of_its_own_context():
+	with capture_runs() as runs:
+		finished_trace(question="mine")
+		# Another thread (another session) finishing a run meanwhile
+		other = threading.Thread(target=finished_trace, kwargs={"question": "theirs"})
+		other.start()
+		other.join()
+	assert [run['question'] for run in runs] == ["mine"]
+	assert last_run()['question'] == "theirs"
+	finished_trace()
+	assert len(runs) == 1
+
+
+def test_export_rotates_the_file_when_it_is_full(tmp_path):
+	path = tmp_path / "traces.jsonl"
+	for _ in range(30):
+		export(finished_trace(), mode="jsonl", path=path, max_bytes=2000)
+	assert path.stat().st_size <= 2000
+	assert (tmp_path / "traces.jsonl.1").exists()
+	assert not (tmp_path / "traces.jsonl.4").exists()
+	for line in path.read_text().splitlines():
+		json.loads(line)
+
+
+def test_sampling_skips_traces_but_keeps_errors(tmp_path):
+	path = tmp_path / "traces.jsonl"
+	for _ in range(20):
+		export(finished_trace(), mode="jsonl", path=path, rate=0)
+	assert not path.exists()
+	export(finished_trace(error="RuntimeError"), mode="jsonl", path=path, rate=0)
+	assert len(path.read_text().splitlines()) == 2
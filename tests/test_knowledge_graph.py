@@ -0,0 +1,66 @@
+import pytest
+
+from artifact_store import ArtifactStore
+from knowledge_graph import MADE_OF, KnowledgeGraph
+
+SEED = {"name": "Laufen Lens", "details": {"summary": "A quartz lens.", "description": "A lens ground from quartz."}}
+
+
+def artifact(name, material):
+	return {"name": name, "details": {"summary": f"A {material} find.", "description": f"Carved from {material}."}}
+
+
+def names(matches):
+	return [a['name'] for a in matches]
+
+
+@pytest.fixture
+def store(tmp_path):
+	store = ArtifactStore(tmp_path / "string_list.json")
+	store.apply(adds=[artifact("Tarn Horn", "bone"), artifact("Hohenfeld Slab", "basalt")])
+	return store
+
+
+def test_refresh_applies_only_the_store_changes(store, monkeypatch):
+	graph = KnowledgeGraph()
+	graph.refresh([SEED], store)
+	assert names(graph.mentioned("Is the Tarn Horn old?")[0]) == ["Tarn Horn"]
+
+	def records():
+		raise AssertionError("the whole store was read")
+
+	monkeypatch.setattr(store, "records", records)
+	store.apply(adds=[artifact("Ember Flute", "bone")], removes=["tarn horn"])
+	graph.refresh([SEED], store)
+	assert names(graph.mentioned("Is the Ember Flute old?")[0]) == ["Ember Flute"]
+	assert graph.mentioned("Is the Tarn Horn old?")[0] == []
+	facts = graph.query("What is the Ember Flute made of?")['facts']
+	assert ["Ember Flute", MADE_OF, "bone"] in facts
+
+
+def test_a_changed_artifact_replaces_its_old_facts(store):
+	graph = KnowledgeGraph()
+	graph.refresh([SEED], store)
+	store.apply(adds=[artifact("Hohenfeld Slab", "granite")])
+	graph.refresh([SEED], store)
+	assert graph.query("What is the Hohenfeld Slab made of?")['facts'] == [["Hohenfeld Slab", MADE_OF, "granite"]]
+	assert "material:basalt" not in graph.nodes
+
+
+def test_removing_a_stored_seed_falls_back_to_the_seed(store):
+	graph = KnowledgeGraph()
+	store.apply(adds=[dict(SEED, details={"summary": "A glass lens.", "description": "Blown from glass."})])
+	graph.refresh([SEED], store)
+	store.apply(removes=["laufen lens"])
+	graph.refresh([SEED], store)
+	assert graph.query("What is the Laufen Lens made of?")['facts'] == [["Laufen Lens", MADE_OF, "quartz"]]
+
+
+def test_a_large_overlay_is_folded_into_the_name_index(store, monkeypatch):
+	monkeypatch.setattr("knowledge_graph.NAME_OVERLAY_SIZE", 2)
+	graph = KnowledgeGraph()
+	graph.refresh([SEED], store)
+	store.apply(adds=[artifact(f"Cedar Drum {i}", "wood") for i in range(3)])
+	graph.refresh([SEED], store)
+	assert graph._recent == {} and len(graph._names) == 6
+	assert names(graph.mentioned("Who played Cedar Drum 2?")[0]) == ["Cedar Drum 2"]
@@ -0,0 +1,150 @@
+import json
+
+from artifact_store import ArtifactStore, artifact_id
+from persistence import (
+	COMPACT_EVERY,
+	ChangeLog,
+	add_op,
+	append_journal,
+	compact,
+	fold_changes,
+	journal_path,
+	read_journal,
+	remove_op,
+	replay,
+	should_compact,
+)
+from records import as_dict
+
+
+def artifact(name, summary=""):
+	return {"name": name, "details": {"summary": summary}}
+
+
+def names(store):
+	return [record['name'] for record in store.records()]
+
+
+# ============================================================================
+# JOURNAL
+# ============================================================================
+def test_replay_moves_added_artifacts_to_the_end():
+	records = {"a": {"name": "A"}, "b": {"name": "B"}}
+	ops = [add_op("a", {"name": "A", "v": 2}), remove_op("b"), add_op("c", {"name": "C"})]
+	replay(records, ops, artifact_id)
+	assert list(records) == ["a", "c"]
+	assert records["a"]["v"] == 2
+
+
+def test_replay_skips_malformed_operations():
+	records = {"a": {"name": "A"}}
+	replay(records, ["junk", {"op": "add", "id": "x"}, {"op": "rename", "id": "a"}], artifact_id)
+	assert records == {"a": {"name": "A"}}
+
+
+def test_read_journal_ignores_a_torn_last_line(tmp_path):
+	path = tmp_path / "list.json"
+	append_journal(path, [add_op("a", {"name": "A"})])
+	with open(journal_path(path), "a", encoding="utf-8") as fh:
+		fh.write('{"op": "add", "id": "b", "artif')
+	assert read_journal(path) == [add_op("a", {"name": "A"})]
+
+
+def test_store_loads_a_journal_with_malformed_lines(tmp_path):
+	path = tmp_path / "list.json"
+	append_journal(path, [add_op("alpha", artifact("Alpha"))])
+	with open(journal_path(path), "a", encoding="utf-8") as fh:
+		fh.write('123\n"junk"\n[1, 2]\n{"op": "add"}\n')
+	append_journal(path, [add_op("beta", artifact("Beta"))])
+	assert names(ArtifactStore(path)) == ["Alpha", "Beta"]
+
+
+def test_store_writes_are_journaled_and_seen_by_other_instances(tmp_path):
+	path = tmp_path / "list.json"
+	writer = ArtifactStore(path)
+	writer.apply(adds=[artifact("Alpha"), artifact("Beta")])
+	writer.apply(removes=["alpha"], compact_journal=False)
+	assert not path.exists() or json.loads(path.read_text()) == []
+	assert len(read_journal(path)) == 3
+	assert names(ArtifactStore(path)) == ["Beta"]
+
+
+# ============================================================================
+# COMPACTION
+# ============================================================================
+def test_should_compact_after_many_operations(tmp_path):
+	path = tmp_path / "list.json"
+	assert not should_compact(path, COMPACT_EVERY - 1)
+	assert should_compact(path, COMPACT_EVERY)
+
+
+def test_should_compact_once_the_journal_outgrows_the_snapshot(tmp_path):
+	path = tmp_path / "list.json"
+	path.write_text("[]")
+	append_journal(path, [add_op("a", {"name": "A"})])
+	assert not should_compact(path, 1)
+	append_journal(path, [add_op(f"n{i}", {"name": "x" * 100}) for i in range(60)])
+	assert should_compact(path, 2)
+
+
+def test_compact_folds_the_journal_into_the_snapshot(tmp_path):
+	path = tmp_path / "list.json"
+	store = ArtifactStore(path)
+	store.apply(adds=[artifact("Alpha", "first"), artifact("Beta")], compact_journal=False)
+	store.compact()
+	assert read_journal(path) == []
+	assert [a['name'] for a in json.loads(path.read_text())] == ["Alpha", "Beta"]
+	assert names(ArtifactStore(path)) == ["Alpha", "Beta"]
+
+
+def test_replaying_the_old_journal_over_a_new_snapshot_is_harmless(tmp_path):
+	# A crash between writing the snapshot and emptying the journal leaves both behind
+	path = tmp_path / "list.json"
+	ops = [add_op("alpha", artifact("Alpha")), add_op("beta", artifact("Beta")), remove_op("alpha")]
+	append_journal(path, ops)
+	records = [as_dict(r) for r in ArtifactStore(path).records()]
+	compact(path, records)
+	append_journal(path, ops)
+	assert names(ArtifactStore(path)) == ["Beta"]
+
+
+# ============================================================================
+# CHANGE FEED
+# ============================================================================
+def test_fold_changes_keeps_the_net_effect():
+	steps = [(["a", "b"], []), ([], ["a"]), (["c"], ["b"]), (["b"], [])]
+	assert fold_changes(steps) == (["c", "b"], ["a"])
+
+
+def test_change_log_folds_the_versions_after_since():
+	log = ChangeLog()
+	log.reset(1)
+	log.record(2, ["a"])
+	log.record(3, ["b"], ["a"])
+	log.record(4, ["a"])
+	assert log.since(1, 4) == {"version": 4, "added": ["b", "a"], "removed": []}
+	assert log.since(2, 3) == {"version": 3, "added": ["b"], "removed": ["a"]}
+	assert log.since(4, 4) == {"version": 4, "added": [], "removed": []}
+
+
+def test_change_log_cannot_answer_for_unknown_or_forgotten_versions():
+	log = ChangeLog(limit=3)
+	log.reset(1)
+	for version in range(2, 6):
+		log.record(version, [str(version)])
+	assert log.since(0, 5) is None  # before the reset
+	assert log.since(1, 5) is None  # version 2 fell out of the log
+	assert log.since(2, 5) == {"version": 5, "added": ["3", "4", "5"], "removed": []}
+	assert log.since(6, 5) is None
+
+
+def test_store_changes_cover_writes_of_other_processes(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	store.apply(adds=[artifact("A"), artifact("B")])
+	seen = store.version
+	other = ArtifactStore(tmp_path / "list.json")
+	other.apply(removes=["a"])
+	other.apply(adds=[artifact("C"), artifact("B", "edited")])
+	delta = store.changes(seen)
+	assert delta['added'] == ["c", "b"] and delta['removed'] == ["a"]
+	assert store.changes(delta['version']) == {"version": delta['version'], "added": [], "removed": []}
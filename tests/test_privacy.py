@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from artifact_store import ArtifactStore
+from privacy import REDACTION, PrivacyFilter
+
+SITE = "Hollow Fen Trench"
+ANSWER = f"The amulet was dug up at {SITE} in 1998; hollow fen trench finds are rare."
+
+
+@pytest.fixture
+def privacy(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	store.apply(adds=[
+		{"name": "Fen Amulet", "details": {"location": SITE}},
+		{"name": "Laufen Lens", "details": {"location": "Basel History Museum"}},
+	])
+	return PrivacyFilter().refresh(store=store)
+
+
+def streamed(privacy, chunks):
+	redactor = privacy.stream()
+	return "".join(redactor.feed(chunk) for chunk in chunks) + redactor.finish()
+
+
+# ============================================================================
+# TERMS
+# ============================================================================
+def test_only_non_public_locations_are_terms(privacy):
+	assert privacy.terms == {SITE}
+	assert privacy.redact(ANSWER) == f"The amulet was dug up at {REDACTION} in 1998; {REDACTION} finds are rare."
+	assert privacy.redact(f"{SITE}s and Hollow  Fen\nTrench") == f"{SITE}s and {REDACTION}"
+
+
+def test_tool_output_drops_sensitive_location_fields(privacy):
+	output = json.dumps({"name": "Fen Amulet", "location": SITE, "summary": f"Found at {SITE}."})
+	assert json.loads(privacy.filter_output(output)) == {"name": "Fen Amulet", "summary": f"Found at {REDACTION}."}
+
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+def test_a_term_split_across_chunks_is_redacted(privacy):
+	expected = privacy.redact(ANSWER)
+	start = ANSWER.index(SITE)
+	for cut in range(start + 1, start + len(SITE)):
+		assert streamed(privacy, [ANSWER[:cut], ANSWER[cut:]]) == expected
+
+
+def test_a_term_streamed_one_character_at_a_time_is_redacted(privacy):
+	chunks = list(ANSWER)
+	redactor = privacy.stream()
+	shown = ""
+	for chunk in chunks:
+		shown += redactor.feed(chunk)
+		# The term is never shown, not even before the stream ends
+		assert SITE.lower() not in shown.lower()
+	assert shown + redactor.finish() == privacy.redact(ANSWER)
+
+
+def test_text_without_terms_streams_through_unchanged(privacy):
+	text = "The Laufen Lens is a polished quartz disc. " * 5
+	redactor = privacy.stream()
+	first = redactor.feed(text)
+	assert text.startswith(first) and len(first) >= len(text) - privacy.max_span
+	assert first + redactor.finish() == text
@@ -0,0 +1,59 @@
+from artifact_store import ArtifactStore
+from records import ArtifactRecord, DescriptionBlobs, as_dict, record_fingerprint
+
+
+def artifact(name, description):
+	return {"name": name, "details": {"summary": f"{name}.", "description": description}, "metadata": {"layer": 3}}
+
+
+# ============================================================================
+# RECORDS
+# ============================================================================
+def test_records_read_the_description_from_the_blob_file(tmp_path):
+	blobs = DescriptionBlobs(tmp_path / "d.blobs")
+	record = ArtifactRecord(artifact("Lens", "A quartz lens."), blobs)
+	assert record['details']['description'] == "A quartz lens."
+	assert as_dict(record) == artifact("Lens", "A quartz lens.")
+	# Another reader of the same file finds it too
+	assert DescriptionBlobs(tmp_path / "d.blobs").get(record.description_key) == "A quartz lens."
+
+
+def test_dated_copies_share_the_description(tmp_path):
+	blobs = DescriptionBlobs(tmp_path / "d.blobs")
+	record = ArtifactRecord(artifact("Lens", "A quartz lens."), blobs)
+	dated = record.dated("2026-01-02 03:04:05")
+	assert dated['discovered_date'] == "2026-01-02 03:04:05" and 'discovered_date' not in record
+	assert dated.description_key == record.description_key
+	assert record_fingerprint(dated) != record_fingerprint(record)
+	assert as_dict(dated)['details'] == as_dict(record)['details']
+
+
+# ============================================================================
+# BLOB COMPACTION
+# ============================================================================
+def test_compact_keeps_only_the_given_entries(tmp_path):
+	blobs = DescriptionBlobs(tmp_path / "d.blobs")
+	keys = [blobs.put(f"description {i} " * 50) for i in range(4)]
+	assert blobs.stale_bytes(keys) == 0
+	stale = blobs.stale_bytes(keys[:1])
+	assert blobs.compact(keys[:1]) == stale > 0
+	assert blobs.get(keys[0]).startswith("description 0")
+	assert blobs.stale_bytes(keys[:1]) == 0
+	# A reader that indexed the old file notices the new one
+	other = DescriptionBlobs(tmp_path / "d.blobs")
+	assert other.size() == blobs.size()
+
+
+def test_store_drops_descriptions_of_removed_artifacts_when_folding(tmp_path):
+	store = ArtifactStore(tmp_path / "list.json")
+	store.apply(adds=[artifact(f"Find {i}", f"text {i} " * 100) for i in range(10)])
+	full = store.blobs.size()
+	store.apply(removes=[f"find {i}" for i in range(3)])
+	store.compact()
+	# Under half of the file is stale: it is left alone
+	assert store.blobs.size() == full
+	store.apply(removes=[f"find {i}" for i in range(3, 8)])
+	store.compact()
+	assert store.blobs.size() < full / 2
+	fresh = ArtifactStore(tmp_path / "list.json")
+	assert [r['details']['description'][:6] for r in fresh.records()] == ["text 8", "text 9"]
@@ -0,0 +1,85 @@
+import pytest
+
+import router
+from router import (
+	ROUTE_GUARDED,
+	ROUTE_LOOKUP,
+	ROUTE_SYNTHESIS,
+	TIER_LARGE,
+	TIER_SMALL,
+	classify,
+	route,
+)
+from tools import seed_artifacts
+
+
+# ============================================================================
+# CLASSIFICATION
+# ============================================================================
+@pytest.mark.parametrize("question, has_history, expected", [
+	("How big is the Laufen Lens?", False, ROUTE_LOOKUP),
+	("How big is the Lauffen Lenz?", False, ROUTE_LOOKUP),
+	("What do the Laufen Lens and the Altbrunn Prism have in common?", False, ROUTE_SYNTHESIS),
+	("Compare the Laufen Lens with the others", False, ROUTE_SYNTHESIS),
+	("Which artifacts were carved?", False, ROUTE_SYNTHESIS),
+	("Where is the Hohenfeld Basalt Slab kept?", False, ROUTE_GUARDED),
+	("Tell me about the Golden Kettle of Zorn", False, ROUTE_GUARDED),
+	("How old is it?", True, ROUTE_LOOKUP),
+	# Location wording wins over comparison wording and over several names
+	("Where are the artifacts kept?", False, ROUTE_GUARDED),
+	("Where are the Laufen Lens and the Altbrunn Prism stored?", False, ROUTE_GUARDED),
+	# Cues are whole words: neither "artifacts" alone nor "vs" as a prefix means a comparison
+	("Tell me about the artifacts of Vsevolod", False, ROUTE_GUARDED),
+	("How were the artifacts of the Laufen Lens site cleaned?", False, ROUTE_LOOKUP),
+	("How does the Laufen Lens compare to the other lenses?", False, ROUTE_SYNTHESIS),
+	("Laufen Lens vs. Altbrunn Prism", False, ROUTE_SYNTHESIS),
+])
+def test_questions_get_the_route_they_need(question, has_history, expected):
+	name, confidence, reason = classify(question, has_history, seed_artifacts())
+	assert name == expected, reason
+	assert 0 < confidence <= 1
+
+
+def test_long_questions_lose_confidence():
+	short = classify("How big is the Laufen Lens?", False, seed_artifacts())
+	long = classify("How big is the Laufen Lens? " + "Please be very detailed and precise. " * 6, False, seed_artifacts())
+	assert long[0] == short[0] and long[1] == pytest.approx(short[1] - 0.2)
+	assert long[2].endswith("long question")
+
+
+# ============================================================================
+# TIERS
+# ============================================================================
+def test_lookups_and_guarded_questions_use_the_small_model():
+	for question in ("How big is the Laufen Lens?", "Where is the Altbrunn Prism stored?"):
+		decision = route(question, False, seed_artifacts(), "big-model")
+		assert decision['tier'] == TIER_SMALL and decision['model'] == router.ROUTER_SMALL_MODEL
+		assert not decision['escalated']
+
+
+def test_synthesis_uses_the_large_model():
+	decision = route("What do the Laufen Lens and the Altbrunn Prism share?", False, seed_artifacts(), "big-model")
+	assert decision['route'] == ROUTE_SYNTHESIS
+	assert (decision['tier'], decision['model'], decision['escalated']) == (TIER_LARGE, "big-model", False)
+
+
+def test_unsure_small_tier_decisions_are_escalated():
+	decision = route("And then?", True, seed_artifacts(), "big-model")
+	assert decision['route'] == ROUTE_LOOKUP and decision['confidence'] < router.ROUTER_MIN_CONFIDENCE
+	assert (decision['tier'], decision['model'], decision['escalated']) == (TIER_LARGE, "big-model", True)
+
+
+def test_classifier_errors_fall_back_to_the_large_model(monkeypatch):
+	def broken(*args):
+		raise RuntimeError("boom")
+
+	monkeypatch.setattr(router, "classify", broken)
+	decision = route("How big is the Laufen Lens?", False, seed_artifacts(), "big-model")
+	assert (decision['route'], decision['tier'], decision['model']) == (None, TIER_LARGE, "big-model")
+
+
+def test_with_the_router_off_everything_goes_to_the_default_model(monkeypatch):
+	monkeypatch.setattr(router, "MODEL_ROUTER", False)
+	decision = route("How big is the Laufen Lens?", False, seed_artifacts(), "big-model")
+	assert (decision['route'], decision['tier'], decision['model']) == (None, TIER_LARGE, "big-model")
+	assert router.tier_models("big-model") == {TIER_LARGE: "big-model"}
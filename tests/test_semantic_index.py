@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import semantic_index
+from semantic_index import SemanticIndex, embed, embed_sparse
+
+
+@pytest.fixture(autouse=True)
+def save_on_demand(monkeypatch):
+	# Tests call `save` themselves instead of waiting for the background timer
+	monkeypatch.setattr(semantic_index, "INDEX_SAVE_SECONDS", 3600)
+
+
+def artifact(name, description):
+	return {"name": name, "details": {"description": description}}
+
+
+LENS = artifact("Laufen Lens", "A polished quartz lens found near the river. It focuses sunlight onto a small point.")
+SLAB = artifact("Hohenfeld Basalt Slab", "A basalt slab carved with star charts. The engravings map the winter sky.")
+PRISM = artifact("Altbrunn Prism", "A glass prism that splits light into colours. It was kept in a wooden case.")
+
+
+def shard_files(index):
+	return sorted(path.name for path in index.directory.glob("*.npz"))
+
+
+def test_sparse_embedding_matches_the_dense_one():
+	texts = ["quartz lens focusing sunlight", "basalt star charts", ""]
+	indptr, columns, values = embed_sparse(texts)
+	dense = np.zeros((len(texts), semantic_index.DIMENSIONS), dtype=np.float32)
+	for row in range(len(texts)):
+		dense[row, columns[indptr[row]:indptr[row + 1]]] = values[indptr[row]:indptr[row + 1]]
+	assert np.allclose(dense, embed(texts), atol=1e-3)
+
+
+def test_top_k_finds_the_relevant_passage(tmp_path):
+	index = SemanticIndex(tmp_path / "list.json")
+	index.sync([LENS, SLAB, PRISM])
+	score, passage = index.top_k("which artifact maps the sky with star charts", k=1)[0]
+	assert passage['name'] == "Hohenfeld Basalt Slab"
+	assert "star charts" in passage['text']
+	assert index.top_k("star charts", ids={"laufen lens"}) == []
+	assert {p['name'] for _, p in index.top_k("light", ids={"altbrunn prism"})} == {"Altbrunn Prism"}
+
+
+def test_saved_index_loads_with_texts_read_from_the_blob_file(tmp_path):
+	index = SemanticIndex(tmp_path / "list.json")
+	index.sync([LENS, SLAB])
+	index.save()
+	loaded = SemanticIndex(tmp_path / "list.json")
+	assert len(loaded) == len(index)
+	assert loaded.top_k("quartz lens sunlight", k=1)[0][1]['text'].startswith("A polished quartz lens")
+	assert loaded.sync([LENS, SLAB]) == 0
+
+
+def test_a_change_appends_a_shard_without_rewriting_the_others(tmp_path):
+	index = SemanticIndex(tmp_path / "list.json")
+	index.sync([LENS, SLAB] + [artifact(f"Find {i}", f"Shard number {i} of a clay pot.") for i in range(20)])
+	index.save()
+	first = shard_files(index)
+	first_mtime = (index.directory / first[0]).stat().st_mtime_ns
+	index.apply_changes([PRISM])
+	index.save()
+	files = shard_files(index)
+	assert len(files) == 2 and first[0] in files
+	assert (index.directory / first[0]).stat().st_mtime_ns == first_mtime
+
+
+def test_removals_are_logged_and_stale_rows_compacted(tmp_path):
+	index = SemanticIndex(tmp_path / "list.json")
+	index.sync([LENS, SLAB, PRISM])
+	index.save()
+	index.apply_changes([], removed=["hohenfeld basalt slab"])
+	index.save()
+	assert [p['name'] for _, p in SemanticIndex(tmp_path / "list.json").top_k("basalt star charts")] != ["Hohenfeld Basalt Slab"]
+	index.apply_changes([], removed=["laufen lens", "altbrunn prism"])
+	index.save()
+	assert len(SemanticIndex(tmp_path / "list.json")) == 0
+	assert len(shard_files(index)) <= 1
+	assert index.blobs.size() == 0
+
+
+def test_shards_stay_few_as_changes_pile_up(tmp_path):
+	index = SemanticIndex(tmp_path / "list.json")
+	index.sync([LENS])
+	index.save()
+	for i in range(40):
+		index.apply_changes([artifact(f"Find {i}", f"Fragment {i} of a bronze pin.")])
+		index.save()
+	assert len(shard_files(index)) <= 8
+	loaded = SemanticIndex(tmp_path / "list.json")
+	assert len(loaded) == len(index)
+	assert loaded.top_k("fragment 17 bronze pin", k=1)[0][1]['name'] == "Find 17"
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+import session_artifacts
+from session_artifacts import SessionArtifacts
+
+LENS = {"name": "Laufen Lens", "details": {"summary": "A quartz lens.", "location": "Laufen"}}
+SLAB = {"name": "Hohenfeld Basalt Slab", "details": {"summary": "A basalt slab.", "location": "Hohenfeld"}}
+
+
+@pytest.fixture
+def store():
+	"""The shared store, emptied."""
+	from tools import STORE
+
+	STORE.replace([])
+	return STORE
+
+
+@pytest.fixture
+def writes(store, monkeypatch):
+	"""Record the batches SessionArtifacts writes instead of writing them."""
+	batches = []
+
+	def persist_changes(adds=(), removes=()):
+		batches.append(([a['name'] for a in adds], list(removes)))
+		return True
+
+	monkeypatch.setattr(session_artifacts, "persist_changes", persist_changes)
+	return batches
+
+
+def names(artifacts, **filters):
+	return [a['name'] for a in artifacts.page(**filters)[1]]
+
+
+def test_toggles_are_written_together_after_the_debounce(writes):
+	artifacts = SessionArtifacts(debounce=0.1)
+	assert artifacts.toggle(LENS) is True
+	assert artifacts.toggle(SLAB) is True
+	assert LENS in artifacts and len(artifacts) == 2
+	assert writes == [] and artifacts.pending == 2
+	time.sleep(0.3)
+	assert writes == [(["Laufen Lens", "Hohenfeld Basalt Slab"], [])]
+	assert artifacts.pending == 0
+
+
+def test_only_the_last_toggle_of_an_artifact_is_written(store, writes):
+	store.apply(adds=[SLAB])
+	artifacts = SessionArtifacts(debounce=10)
+	artifacts.toggle(LENS)
+	artifacts.toggle(LENS)
+	artifacts.toggle(SLAB)
+	assert len(artifacts) == 0
+	assert artifacts.flush() is True
+	assert writes == [([], ["laufen lens", "hohenfeld basalt slab"])]
+
+
+def test_a_full_batch_is_written_without_waiting(writes):
+	artifacts = SessionArtifacts(debounce=10, max_batch=3)
+	for i in range(3):
+		artifacts.toggle({"name": f"Find {i}"})
+	assert writes == [(["Find 0", "Find 1", "Find 2"], [])]
+
+
+def test_failed_writes_are_reported_once(store, monkeypatch):
+	monkeypatch.setattr(session_artifacts, "persist_changes", lambda adds=(), removes=(): False)
+	artifacts = SessionArtifacts(debounce=10)
+	artifacts.toggle(LENS)
+	assert artifacts.flush() is False
+	errors = artifacts.take_errors()
+	assert len(errors) == 1 and "Laufen Lens" in errors[0]
+	assert artifacts.take_errors() == []
+
+
+def test_toggled_records_are_stamped_with_the_time_they_were_added(writes):
+	artifacts = SessionArtifacts(debounce=10)
+	artifacts.toggle(LENS)
+	record = artifacts.page()[1][0]
+	assert record['discovered_date'] and 'discovered_date' not in LENS
+
+
+def test_toggling_a_stored_record_writes_it_back(store):
+	store.apply(adds=[{"name": "Tarn Horn", "details": {"description": "A horn from the tarn."}}])
+	artifacts = SessionArtifacts(debounce=10)
+	record = artifacts.page()[1][0]
+	artifacts.toggle(record)
+	artifacts.toggle(record)
+	assert artifacts.flush() is True and artifacts.take_errors() == []
+	stored = store.by_ids(["tarn horn"])["tarn horn"]
+	assert stored['discovered_date'] and stored['details']['description'] == "A horn from the tarn."
+
+
+def test_pages_are_queried_from_the_store(tmp_path, monkeypatch):
+	import tools
+	from sqlite_store import SqliteArtifactStore
+
+	store = SqliteArtifactStore(tmp_path / "artifacts.db")
+	store.apply(adds=[{"name": f"Find {i}", "details": {"location": "North" if i % 2 else "South"}} for i in range(10)])
+	monkeypatch.setattr(tools, "STORE", store)
+
+	def records():
+		raise AssertionError("the whole list was loaded")
+
+	monkeypatch.setattr(store, "records", records)
+	artifacts = SessionArtifacts(debounce=10)
+	assert len(artifacts) == 10
+	assert names(artifacts, limit=3, offset=3) == ["Find 3", "Find 4", "Find 5"]
+	assert artifacts.page(location="North", limit=2, offset=2) == (5, list(store.by_ids(["find 5", "find 7"]).values()))
+	assert artifacts.locations() == ["North", "South"]
+
+
+def test_pages_show_the_toggles_not_saved_yet(store, writes):
+	store.apply(adds=[{"name": f"Find {i}", "details": {"location": "North"}} for i in range(5)])
+	artifacts = SessionArtifacts(debounce=10)
+	artifacts.toggle({"name": "Find 1"})
+	artifacts.toggle(LENS)
+	assert len(artifacts) == 5
+	# The removed artifact leaves a gap in its page until the removal is saved
+	assert names(artifacts, limit=3) == ["Find 0", "Find 2"]
+	assert names(artifacts, limit=3, offset=3) == ["Find 3", "Find 4", "Laufen Lens"]
+	assert names(artifacts, text="lens") == ["Laufen Lens"]
+	assert artifacts.locations() == ["Laufen", "North"]
+	assert {"name": "Find 1"} not in artifacts and LENS in artifacts
+
+
+def test_refresh_notices_other_writers(store):
+	from artifact_store import ArtifactStore
+
+	store.apply(adds=[{"name": "Ember Flute"}, {"name": "Reed Pipe"}])
+	artifacts = SessionArtifacts(debounce=10)
+	revision = artifacts.revision
+	assert artifacts.refresh() is False and artifacts.revision == revision
+	other = ArtifactStore(store.path)
+	other.apply(removes=["ember flute"])
+	other.apply(adds=[{"name": "Bone Whistle"}])
+	artifacts.toggle({"name": "Cedar Drum"})
+	assert artifacts.refresh() is True and artifacts.revision > revision
+	assert names(artifacts) == ["Reed Pipe", "Bone Whistle", "Cedar Drum"]
+	assert artifacts.pending == 1
+	artifacts.flush()
@@ -0,0 +1,147 @@
+import sqlite3
+
+import pytest
+
+import sqlite_store
+from artifact_store import ArtifactStore
+from sqlite_store import SqliteArtifactStore, migrate
+
+
+def artifact(name, summary="", location=None, description=""):
+	details = {"summary": summary, "description": description}
+	if location:
+		details["location"] = location
+	return {"name": name, "details": details}
+
+
+def names(records):
+	return [record['name'] for record in records]
+
+
+@pytest.fixture
+def store(tmp_path):
+	return SqliteArtifactStore(tmp_path / "artifacts.db")
+
+
+# ============================================================================
+# ROWS
+# ============================================================================
+def test_records_keep_the_order_of_writes(store):
+	store.apply(adds=[artifact("Lens"), artifact("Slab"), artifact("Horn")])
+	store.apply(adds=[artifact("Lens", "A quartz lens.")], removes=["slab"])
+	assert names(store.records()) == ["Horn", "Lens"]
+	assert store.records()[-1]['details']['summary'] == "A quartz lens."
+
+
+def test_descriptions_are_stored_once(store):
+	store.apply(adds=[artifact("Lens", description="Ground from one quartz crystal.")])
+	data, description = sqlite3.connect(store.path).execute("SELECT data, description FROM artifacts").fetchone()
+	assert "quartz crystal" not in data and description == "Ground from one quartz crystal."
+	assert store.by_ids(["lens"])["lens"] == artifact("Lens", description="Ground from one quartz crystal.")
+	assert store.records()[0]['details']['description'] == "Ground from one quartz crystal."
+
+
+def test_legacy_top_level_descriptions_are_kept_where_they_were(store):
+	legacy = {"name": "Slab", "description": "A basalt slab."}
+	store.apply(adds=[legacy])
+	assert store.by_ids(["slab"])["slab"] == legacy
+
+
+def test_replace_writes_only_the_difference(store):
+	store.apply(adds=[artifact("Lens", description="Quartz."), artifact("Slab")])
+	version = store.version
+	store.replace([artifact("Lens", description="Quartz."), artifact("Slab")])
+	assert store.version == version
+	store.replace([artifact("Lens", description="Quartz.")])
+	assert store.version == version + 1 and names(store.records()) == ["Lens"]
+
+
+def test_writes_are_seen_by_other_connections(store):
+	other = SqliteArtifactStore(store.path)
+	store.apply(adds=[artifact("Lens")])
+	assert other.refresh() is True
+	assert other.version == store.version and names(other.records()) == ["Lens"]
+
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+def test_query_and_count_filter_and_page_in_sql(store, monkeypatch):
+	store.apply(adds=[artifact(f"Find {i}", "bronze" if i % 3 == 0 else "flint", "North" if i % 2 else "South") for i in range(12)])
+
+	def records():
+		raise AssertionError("the whole table was loaded")
+
+	monkeypatch.setattr(store, "records", records)
+	assert store.count() == 12
+	assert names(store.query(limit=3, offset=3)) == ["Find 3", "Find 4", "Find 5"]
+	assert store.count("bronze") == 4 and names(store.query("BRONZE", limit=2, offset=1)) == ["Find 3", "Find 6"]
+	assert names(store.query("bronze", "north")) == ["Find 3", "Find 9"]
+	assert store.count(location="South") == 6
+	assert store.locations() == ["North", "South"]
+
+
+def test_search_and_lookup(store):
+	store.apply(adds=[
+		artifact("Laufen Lens", "A quartz lens.", description="Polished by river sand."),
+		artifact("Hohenfeld Basalt Slab", "A basalt slab."),
+	])
+	assert names(record for _, record in store.search("river sand")) == ["Laufen Lens"]
+	matches, _ = store.lookup("laufen lnes")
+	assert names(matches) == ["Laufen Lens"]
+	assert store.existing(["laufen lens", "tarn horn"]) == {"laufen lens"}
+
+
+# ============================================================================
+# CHANGE FEED
+# ============================================================================
+def test_changes_fold_the_versions_since(store):
+	store.apply(adds=[artifact("Lens"), artifact("Slab")])
+	since = store.version
+	store.apply(adds=[artifact("Horn")], removes=["lens"])
+	store.apply(adds=[artifact("Lens")], removes=["horn"])
+	delta = store.changes(since)
+	assert delta['version'] == store.version
+	assert delta['added'] == ["lens"] and delta['removed'] == ["horn"]
+	assert store.changes(store.version) == {"version": store.version, "added": [], "removed": []}
+
+
+def test_changes_cannot_answer_for_pruned_or_future_versions(store, monkeypatch):
+	monkeypatch.setattr(sqlite_store, "CHANGE_LOG_SIZE", 2)
+	for i in range(4):
+		store.apply(adds=[artifact(f"Find {i}")])
+	assert store.changes(0) is None
+	assert store.changes(store.version + 1) is None
+	assert store.changes(store.version - 2)['added'] == ["find 2", "find 3"]
+	assert sqlite3.connect(store.path).execute("SELECT COUNT(*) FROM changes").fetchone()[0] == 2
+
+
+def test_records_are_patched_from_the_change_feed(store, monkeypatch):
+	store.apply(adds=[artifact("Lens"), artifact("Slab")])
+	store.records()
+	other = SqliteArtifactStore(store.path)
+	other.apply(adds=[artifact("Lens", "moved")], removes=["slab"])
+
+	def select(*args, **kwargs):
+		raise AssertionError("the whole table was reloaded")
+
+	monkeypatch.setattr(store, "_select", select)
+	assert names(store.records()) == ["Lens"]
+	assert store.records()[0]['details']['summary'] == "moved"
+
+
+# ============================================================================
+# MIGRATION
+# ============================================================================
+def test_migrate_copies_the_json_store(tmp_path):
+	source = ArtifactStore(tmp_path / "string_list.json")
+	source.apply(adds=[artifact("Lens", description="Quartz."), artifact("Slab"), artifact("Horn")])
+	source.apply(removes=["slab"])
+	assert migrate(tmp_path / "string_list.json", tmp_path / "artifacts.db") == 2
+	target = SqliteArtifactStore(tmp_path / "artifacts.db")
+	assert names(target.records()) == ["Lens", "Horn"]
+	assert target.by_ids(["lens"])["lens"]['details']['description'] == "Quartz."
+	# Running it again changes nothing
+	version = target.version
+	migrate(tmp_path / "string_list.json", tmp_path / "artifacts.db")
+	assert target.refresh() is False and target.version == version